@@ -1,9 +1,8 @@
 import os
-import bleach
-import markdown
 from flask import Flask, flash, redirect, url_for
 from config import Config
 from app.extensions import db, login_manager, migrate, mail
+from app.rendering import render_markdown
 
 
 def create_app(config_class=Config):
@@ -12,6 +11,7 @@ def create_app(config_class=Config):
 
     # Ordner erstellen
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['CACHE_DIR'], exist_ok=True)
 
     # Extensions init
     db.init_app(app)
@@ -20,6 +20,13 @@ def create_app(config_class=Config):
     migrate.init_app(app, db, render_as_batch=True)
     mail.init_app(app)
 
+    # Mails gehen über die Outbox (Versand im Hintergrund, siehe app/outbox.py)
+    from app import outbox
+    outbox.init_app(app)
+
+    # User-Loader mit Cache registrieren (siehe app/user_cache.py)
+    from app import user_cache  # noqa: F401
+
     # --- BLUEPRINTS REGISTRIEREN ---
 
     # 1. Main (Root / Dashboard)
@@ -62,34 +69,31 @@ def create_app(config_class=Config):
     from app.onboarding import bp as onboarding_bp
     app.register_blueprint(onboarding_bp, url_prefix='/onboarding')
 
+    # 11. Volltextsuche -> /search
+    from app.search import bp as search_bp
+    app.register_blueprint(search_bp, url_prefix='/search')
+
     # --- CONTEXT PROCESSORS & FILTERS ---
 
     @app.context_processor
     def inject_roadmap_meta():
         from app.models import SiteContent
-        meta = db.session.get(SiteContent, 'roadmap')
-        return dict(roadmap_meta=meta)
+        return dict(roadmap_meta=SiteContent.cached('roadmap'))
 
     @app.template_filter('markdown')
     def markdown_filter(text):
-        if not text: return ""
-        allowed_tags = list(bleach.sanitizer.ALLOWED_TAGS) + [
-            'p', 'br', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
-            'ul', 'ol', 'li', 'pre', 'code', 'table', 'thead',
-            'tbody', 'tr', 'th', 'td', 'blockquote', 'hr',
-            'strong', 'em', 'a', 'img'
-        ]
-        allowed_attrs = {'*': ['class'], 'a': ['href', 'rel'], 'img': ['src', 'alt', 'style']}
-        html = markdown.markdown(text, extensions=['fenced_code', 'tables'])
-        return bleach.clean(html, tags=allowed_tags, attributes=allowed_attrs)
+        # Gecacht über den Hash des Textes (siehe app/rendering.py)
+        return render_markdown(text)
 
     @app.context_processor
     def inject_globals():
         from flask import request
         from app.models import SiteContent, Permission
 
+        # SiteContent & Permissions kommen aus dem Prozess-Cache (keine Query pro Render)
+
         # 1. Globales Bild
-        global_bg_meta = db.session.get(SiteContent, 'background')
+        global_bg_meta = SiteContent.cached('background')
         current_bg = global_bg_meta.content if (global_bg_meta and global_bg_meta.content) else 'background.png'
 
         # 2. Blueprint-spezifisches Bild (Logik angepasst auf neue Namen)
@@ -104,13 +108,13 @@ def create_app(config_class=Config):
             if request.blueprint == 'formbuilder': lookup_slug = 'immo_admin'
 
             # A. Versuch: Exakter Match oder B. Fuzzy Match
-            svc = Permission.query.filter(Permission.slug.contains(lookup_slug)).first()
+            svc_background = Permission.background_for(lookup_slug)
 
-            if svc and svc.background_image:
-                current_bg = svc.background_image
+            if svc_background:
+                current_bg = svc_background
 
-        roadmap = db.session.get(SiteContent, 'roadmap')
-        req_meta = db.session.get(SiteContent, 'requirements')
+        roadmap = SiteContent.cached('roadmap')
+        req_meta = SiteContent.cached('requirements')
         return dict(roadmap_meta=roadmap, current_background_image=current_bg, requirements_meta=req_meta)
 
     from app.commands import cmd_bp
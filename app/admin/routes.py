@@ -5,14 +5,17 @@ from werkzeug.utils import secure_filename
 from flask import render_template, redirect, url_for, request, flash, current_app, Blueprint
 from flask_login import login_required, current_user
 from app.extensions import db
-from app.models import Permission, ImmoSetting, DashboardTile, ImmoQuestion, ImmoSection, SiteContent
+from app.models import Permission, DashboardTile, SiteContent
 from app.decorators import permission_required
+from app import settings
+from app.rendering import render_markdown
+from app.main import dashboard
+from app.formbuilder import schema
 from app.admin import bp
 
 
 def get_setting(key, default=""):
-    s = db.session.get(ImmoSetting, key)
-    return s.value if s else default
+    return settings.get(key, default, scope=settings.IMMO)
 
 
 # --- GLOBAL SETTINGS ---
@@ -48,13 +51,10 @@ def global_settings_save():
 
     # 1. E-Mail Receiver
     if 'email_receiver' in request.form:
-        s = db.session.get(ImmoSetting, 'email_receiver') or ImmoSetting(key='email_receiver')
-        s.value = request.form['email_receiver']
-        db.session.add(s)
+        settings.set_many({'email_receiver': request.form['email_receiver']}, scope=settings.IMMO)
 
     # HIER WURDE DER HINTERGRUND-CODE ENTFERNT (jetzt in save_backgrounds)
 
-    db.session.commit()
     flash("Basiseinstellungen gespeichert.", "success")
     return redirect(url_for('admin.global_settings_view'))
 
@@ -91,6 +91,7 @@ def save_backgrounds():
                 perm.background_image = selected_bg
 
     db.session.commit()
+    Permission.invalidate_flags()
     flash("Design-Einstellungen aktualisiert.", "success")
     return redirect(url_for('admin.global_settings_view'))
 
@@ -129,6 +130,7 @@ def save_tiles():
                 tile.required_permission_id = None
 
     db.session.commit()
+    dashboard.invalidate_tiles()
     flash("Dashboard-Kacheln aktualisiert.", "success")
     return redirect(url_for('admin.global_settings_view'))
 
@@ -152,6 +154,7 @@ def save_permissions():
             # Slug ändern wir NICHT, da der Code darauf basiert!
 
     db.session.commit()
+    Permission.invalidate_flags()
     flash("Berechtigungs-Texte aktualisiert.", "success")
     return redirect(url_for('admin.global_settings_view'))
 
@@ -170,71 +173,13 @@ def perform_question_import():
         with open(json_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
 
-        # Optional: Alles löschen vor Import?
-        # db.session.query(ImmoQuestion).delete()
-        # db.session.query(ImmoSection).delete()
-        # Besser: Update or Create (Upsert)
-
-        section_count = 0
-        question_count = 0
-
-        for sec_idx, sec_data in enumerate(data):
-            # 1. Sektion anlegen/updaten
-            # Falls ID leer ist, generieren wir eine (sollte im JSON aber da sein)
-            sec_id = sec_data.get('id', f"sec_{sec_idx}")
-
-            section = db.session.get(ImmoSection, sec_id)
-            if not section:
-                section = ImmoSection(id=sec_id)
-                db.session.add(section)
-
-            section.title = sec_data.get('title', 'Unbenannt')
-            section.order = sec_idx  # Reihenfolge aus JSON übernehmen
-
-            section_count += 1
-
-            # 2. Fragen der Sektion verarbeiten
-            if 'content' in sec_data:
-                for q_idx, q_data in enumerate(sec_data['content']):
-                    q_id = q_data.get('id')
-
-                    # Überspringe Fragen ohne ID (oder generiere eine, falls nötig)
-                    if not q_id:
-                        # Fallback für Header/Infos ohne ID in deinem JSON
-                        q_id = f"{sec_id}_q_{q_idx}"
-
-                    question = db.session.get(ImmoQuestion, q_id)
-                    if not question:
-                        question = ImmoQuestion(id=q_id)
-                        db.session.add(question)
-
-                    # Felder mappen
-                    question.section_id = sec_id
-                    question.label = q_data.get('label')
-                    question.type = q_data.get('type')
-                    question.width = q_data.get('width', 'full')
-                    question.tooltip = q_data.get('tooltip', '')
-                    question.order = q_idx
-                    question.is_required = q_data.get('required', False)
-                    question.is_metadata = q_data.get('metadata', False)
-
-                    p_val = q_data.get('is_print')
-                    if p_val is None: p_val = True  # Default True
-                    question.is_print = p_val
-
-                    # JSON Listen konvertieren
-                    # options -> options_json
-                    options_list = q_data.get('options', [])
-                    question.options_json = json.dumps(options_list) if options_list else None
-
-                    # types -> types_json
-                    types_list = q_data.get('types', [])
-                    question.types_json = json.dumps(types_list) if types_list else None
-
-                    question_count += 1
-
+        # Update or Create (Upsert) - nur geänderte Zeilen werden geschrieben,
+        # Fragen, die nicht (mehr) in der Datei stehen, bleiben erhalten
+        changes = schema.apply(data, source=schema.SOURCE_QUESTIONS_JSON, delete_missing=False)
         db.session.commit()
-        return True, f"Import erfolgreich: {section_count} Sektionen, {question_count} Fragen."
+        if changes.changed:
+            schema.bump_revision()
+        return True, f"Import erfolgreich: {changes.summary()}."
 
     except Exception as e:
         db.session.rollback()
@@ -273,9 +218,11 @@ def save_requirements():
         db.session.add(entry)
 
     entry.content = content
-    entry.author = current_user
+    entry.user_id = current_user.id
     entry.updated_at = datetime.datetime.utcnow()
 
     db.session.commit()
+    SiteContent.invalidate_cache()
+    render_markdown(content)  # Cache vorwärmen
     flash("Anforderungen erfolgreich aktualisiert.", "success")
     return redirect(url_for('admin.global_settings_view'))
@@ -0,0 +1,144 @@
+"""
+Export von Vereinen, Anbaustellen und Abgabestellen als CSV oder JSON-Lines.
+
+Die Zeilen werden gestreamt (yield_per + Eager Loading der Relationen pro Batch),
+der Speicherbedarf bleibt also auch beim kompletten Netzwerk konstant.
+Die Spaltennamen entsprechen den Feldern des Imports - eine exportierte Datei
+kann direkt wieder importiert werden und ändert dann nichts. Verweise stehen als
+Namen in der Datei (Anbaustelle, Manager-Usernames, Verein), der Statusname nur
+als Ausweich, wenn status_id fehlt. Die Zuordnung Verein -> Anbaustelle steht
+nur im Vereins-Export (Spalte anbaustelle).
+"""
+import csv
+import io
+import json
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+from app.extensions import db
+from app.models import Verein, Anbaustelle, Ausgabestelle, StatusDefinition, verein_bereichsleitung
+
+FORMAT_CSV = 'csv'
+FORMAT_JSONL = 'jsonl'
+FORMATS = {FORMAT_CSV: 'text/csv', FORMAT_JSONL: 'application/x-ndjson'}
+
+YIELD_PER = 500
+# Trenner für Listen (Manager) in der CSV
+LIST_SEPARATOR = '; '
+
+
+def _verein_row(v):
+    return {
+        'name': v.name,
+        'city': v.city,
+        'zip_code': v.zip_code,
+        'state_seat': v.state_seat,
+        'state_dist': v.state_dist,
+        'status_id': v.status_id,
+        'status': StatusDefinition.label_for(v.status_id),
+        'is_ev': bool(v.is_ev),
+        'board_member': v.board_member,
+        'prev_officer': v.prev_officer,
+        'anbaustelle': v.anbaustelle.name if v.anbaustelle else None,
+        'managers': [m.username for m in v.managers],
+    }
+
+
+def _anbau_row(a):
+    return {
+        'name': a.name,
+        'address': a.address,
+        'state': a.state,
+        'type': a.anbau_type,
+        'status_id': a.status_id,
+        'status': StatusDefinition.label_for(a.status_id),
+    }
+
+
+def _abgabe_row(aus):
+    return {
+        'verein_name': aus.verein.name if aus.verein else None,
+        'name': aus.name,
+        'address': aus.address,
+        'state': aus.state,
+        'status_id': aus.status_id,
+        'status': StatusDefinition.label_for(aus.status_id),
+    }
+
+
+class ExportType:
+    def __init__(self, model, to_row, columns, options, order_by):
+        self.model = model
+        self.to_row = to_row
+        self.columns = columns
+        self.options = options  # callable -> Loader-Optionen (Backrefs gibt es erst nach dem Mapper-Setup)
+        self.order_by = order_by
+
+
+TYPES = {
+    'vereine': ExportType(
+        Verein, _verein_row,
+        ('name', 'city', 'zip_code', 'state_seat', 'state_dist', 'status_id', 'status', 'is_ev',
+         'board_member', 'prev_officer', 'anbaustelle', 'managers'),
+        lambda: (joinedload(Verein.anbaustelle), selectinload(Verein.managers)),
+        Verein.name,
+    ),
+    'anbau': ExportType(
+        Anbaustelle, _anbau_row,
+        ('name', 'address', 'state', 'type', 'status_id', 'status'),
+        lambda: (),
+        Anbaustelle.name,
+    ),
+    'abgabe': ExportType(
+        Ausgabestelle, _abgabe_row,
+        ('verein_name', 'name', 'address', 'state', 'status_id', 'status'),
+        lambda: (joinedload(Ausgabestelle.verein),),
+        Ausgabestelle.id,
+    ),
+}
+
+
+def _query(spec, user_id=None):
+    query = db.session.query(spec.model).options(*spec.options())
+    if user_id is not None:
+        # BL: nur die eigenen Vereine (+ was daran hängt)
+        own = select(verein_bereichsleitung.c.verein_id).where(verein_bereichsleitung.c.user_id == user_id)
+        if spec.model is Verein:
+            query = query.filter(Verein.id.in_(own))
+        elif spec.model is Ausgabestelle:
+            query = query.filter(Ausgabestelle.verein_id.in_(own))
+        else:
+            query = query.filter(Anbaustelle.id.in_(select(Verein.anbaustelle_id).where(Verein.id.in_(own))))
+    return query.order_by(spec.order_by).yield_per(YIELD_PER)
+
+
+def iter_rows(type, user_id=None):
+    spec = TYPES[type]
+    for obj in _query(spec, user_id):
+        yield spec.to_row(obj)
+
+
+def stream(type, fmt, user_id=None):
+    """Generator über die Datei (Stück für Stück, für eine gestreamte Response)."""
+    if type not in TYPES:
+        raise ValueError(f"Unbekannter Export-Typ: {type}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unbekanntes Format: {fmt}")
+
+    rows = iter_rows(type, user_id)
+    if fmt == FORMAT_JSONL:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+        return
+
+    buf = io.StringIO()
+    buf.write('\ufeff')  # BOM, damit Excel die Umlaute erkennt (der Import ignoriert ihn)
+    writer = csv.DictWriter(buf, fieldnames=TYPES[type].columns)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({k: LIST_SEPARATOR.join(v) if isinstance(v, list) else v for k, v in row.items()})
+        # Puffer pro Zeile leeren
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
@@ -0,0 +1,428 @@
+"""
+Import von Vereinen, Anbaustellen und Abgabestellen.
+
+- Die Datei wird gestreamt gelesen (JSON-Array, JSON-Lines oder CSV mit Kopfzeile,
+  z.B. aus dem Export) - nie komplett im Speicher.
+- Bestehende Einträge werden vorab mit EINER Abfrage pro Tabelle geladen (Schlüssel -> Zeile).
+  Schlüssel: Name (Vereine, Anbaustellen) bzw. Verein + Name, ohne Name Verein + Adresse
+  (Abgabestellen). Ein erneuter Import derselben Datei ändert also nichts.
+- Verweise kommen als Namen (Verein, Anbaustelle, Manager-Usernames, Status) und
+  werden über vorab geladene Tabellen aufgelöst - jede Spalte des Exports wird gelesen.
+- Geschrieben wird per Bulk-INSERT/UPDATE in Batches, mit Commit pro Batch.
+  So blockiert ein großer Import die SQLite-Schreibsperre nie lange am Stück.
+- Dry-Run: gleicher Ablauf ohne Schreiben, liefert nur den Diff-Bericht.
+"""
+import codecs
+import csv
+import json
+from sqlalchemy import insert, update
+from app.extensions import db
+from app.models import Verein, Anbaustelle, Ausgabestelle, StatusDefinition, User, verein_bereichsleitung
+
+FORMAT_JSON = 'json'
+FORMAT_CSV = 'csv'
+
+READ_SIZE = 64 * 1024
+DEFAULT_BATCH_SIZE = 500
+# So viele Einzelzeilen landen maximal im Diff-Bericht (die Zähler sind immer vollständig)
+MAX_REPORT_ROWS = 200
+# Trenner für Listen in der CSV (wie im Export)
+LIST_SEPARATOR = ';'
+TRUE_VALUES = ('1', 'true', 'ja', 'yes', 'x')
+
+_decoder = json.JSONDecoder()
+
+
+def iter_records(stream, read_size=READ_SIZE):
+    """
+    Liefert die Einträge einer Datei einzeln.
+    Erlaubt sind ein JSON-Array ([{...}, {...}]) oder JSON-Lines ({...} pro Zeile).
+    """
+    text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    buf, pos, eof = '', 0, False
+    in_array = None  # None = Format noch unbekannt
+
+    def read_more():
+        nonlocal buf, pos, eof
+        chunk = stream.read(read_size)
+        eof = not chunk
+        buf = buf[pos:] + text_decoder.decode(chunk or b'', final=eof)
+        pos = 0
+
+    while True:
+        # Leerraum (im Array auch Kommas) überspringen, bei Bedarf nachlesen
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or (in_array and buf[pos] == ',')):
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            read_more()
+
+        if pos >= len(buf):
+            if in_array:
+                raise ValueError("JSON-Array ist nicht abgeschlossen.")
+            return
+
+        if in_array is None:
+            in_array = buf[pos] == '['
+            if in_array:
+                pos += 1
+                continue
+        if in_array and buf[pos] == ']':
+            return
+
+        # Nächsten Wert dekodieren. Endet er genau am Pufferende, könnte er
+        # abgeschnitten sein -> nachlesen und erneut versuchen.
+        try:
+            value, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            read_more()
+            continue
+        if end == len(buf) and not eof:
+            read_more()
+            continue
+
+        pos = end
+        if not isinstance(value, dict):
+            raise ValueError(f"Ungültiger Eintrag (Objekt erwartet): {value!r}")
+        yield value
+
+
+def iter_csv_records(stream):
+    """
+    Liefert die Zeilen einer CSV (mit Kopfzeile) als Dicts.
+    Leere Zellen fehlen im Dict - wie ein fehlendes Feld im JSON.
+    """
+    reader = csv.DictReader(codecs.iterdecode(stream, 'utf-8-sig'))
+    for row in reader:
+        entry = {k: v for k, v in row.items() if k and v not in (None, '')}
+        if 'status_id' in entry:
+            try:
+                entry['status_id'] = int(entry['status_id'])
+            except ValueError:
+                raise ValueError(f"Ungültige status_id in Zeile {reader.line_num}: {entry['status_id']!r}")
+        if 'managers' in entry:
+            entry['managers'] = [m.strip() for m in entry['managers'].split(LIST_SEPARATOR) if m.strip()]
+        yield entry
+
+
+# ==============================================================================
+# FELD-MAPPING JSON -> DB
+# ==============================================================================
+# Verweise bleiben hier Namen (verein_name, anbaustelle_name, manager_names, status_name),
+# aufgelöst werden sie im Importer. Optionale Spalten werden nur übernommen, wenn sie in
+# der Datei stehen - ältere Importdateien ohne diese Spalten überschreiben also nichts.
+
+def _bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_VALUES
+    return bool(value)
+
+
+def _common(entry, row):
+    if 'status_id' in entry: row['status_id'] = entry['status_id']
+    elif entry.get('status'): row['status_name'] = entry['status']
+    return row
+
+
+def _verein_row(entry):
+    row = {
+        'name': entry.get('name'),
+        'city': entry.get('city'),
+        'zip_code': entry.get('zip_code'),
+        'state_seat': entry.get('state_seat'),
+    }
+    for field in ('state_dist', 'board_member', 'prev_officer'):
+        if field in entry: row[field] = entry[field]
+    if 'is_ev' in entry: row['is_ev'] = _bool(entry['is_ev'])
+    if 'anbaustelle' in entry: row['anbaustelle_name'] = entry['anbaustelle']
+    if 'managers' in entry: row['manager_names'] = entry['managers'] or []
+    return _common(entry, row)
+
+
+def _anbau_row(entry):
+    row = {
+        'name': entry.get('name'),
+        'address': entry.get('address'),
+        'state': entry.get('state'),
+        'anbau_type': entry.get('type', Anbaustelle.TYPE_SINGLE),
+    }
+    return _common(entry, row)
+
+
+def _abgabe_row(entry):
+    row = {
+        'verein_name': entry.get('verein_name'),
+        'address': entry.get('address'),
+        'state': entry.get('state'),
+    }
+    if 'name' in entry: row['name'] = entry['name']
+    return _common(entry, row)
+
+
+def _name_key(row):
+    return row.get('name')
+
+
+def _abgabe_key(row):
+    # Abgabestellen haben keinen eindeutigen Namen -> Verein + Name (ohne Name: Adresse)
+    label = row.get('name') or row.get('address')
+    return (row.get('verein_id'), label) if label else None
+
+
+class ImportType:
+    def __init__(self, model, status_context, to_row, fields, key=_name_key, key_columns=('name',)):
+        self.model = model
+        self.status_context = status_context
+        self.to_row = to_row
+        self.fields = fields            # Spalten, die verglichen/geschrieben werden
+        self.key = key                  # Zeile -> Abgleichschlüssel (None = Eintrag unvollständig)
+        self.key_columns = key_columns  # Spalten, aus denen der Schlüssel besteht
+
+
+TYPES = {
+    'vereine': ImportType(Verein, StatusDefinition.CONTEXT_VEREIN, _verein_row,
+                          ('name', 'city', 'zip_code', 'state_seat', 'state_dist', 'status_id', 'is_ev',
+                           'board_member', 'prev_officer', 'anbaustelle_id')),
+    'anbau': ImportType(Anbaustelle, StatusDefinition.CONTEXT_ANBAU, _anbau_row,
+                        ('name', 'address', 'state', 'anbau_type', 'status_id')),
+    'abgabe': ImportType(Ausgabestelle, StatusDefinition.CONTEXT_AUSGABE, _abgabe_row,
+                         ('verein_id', 'name', 'address', 'state', 'status_id'),
+                         key=_abgabe_key, key_columns=('verein_id', 'name', 'address')),
+}
+
+
+# ==============================================================================
+# IMPORT
+# ==============================================================================
+
+class ImportReport:
+    """Zähler + (gekürzter) Diff. Wird auch bei einem Abbruch befüllt."""
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.batches = 0
+        self.rows = []  # (Aktion, Bezeichnung, Details)
+
+    def add_row(self, action, label, details=None):
+        if len(self.rows) < MAX_REPORT_ROWS:
+            self.rows.append((action, label, details))
+
+    @property
+    def truncated(self):
+        return len(self.rows) >= MAX_REPORT_ROWS
+
+    def summary(self):
+        return (f"{self.processed} Einträge: {self.created} neu, {self.updated} geändert, "
+                f"{self.unchanged} unverändert, {self.skipped} übersprungen")
+
+
+class Importer:
+    """
+    Führt einen Import aus. Nach einer Exception zeigt self.report, wie weit er gekommen ist
+    (bereits committete Batches bleiben erhalten).
+    """
+
+    def __init__(self, type, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, progress=None):
+        if type not in TYPES:
+            raise ValueError(f"Unbekannter Import-Typ: {type}")
+        self.spec = TYPES[type]
+        self.batch_size = max(int(batch_size), 1)
+        self.dry_run = dry_run
+        self.progress = progress  # callback(report) nach jedem Batch
+        self.report = ImportReport(dry_run)
+
+        registry = StatusDefinition.status_registry(self.spec.status_context)
+        self.default_status_id = registry['ids'][0] if registry['ids'] else None
+        # Statusname -> ID (für Dateien ohne status_id); "Kein Status" aus dem Export = None
+        self._status_ids = {StatusDefinition.NO_STATUS_LABEL: None}
+        self._status_ids.update({name: s_id for s_id, name in registry['names'].items()})
+
+        self._lookups = {}
+        self._inserts = []
+        self._updates = {}   # id -> geänderte Spalten
+        self._managers = {}  # Schlüssel -> neue Manager (User-IDs), nur Vereine
+
+    def run(self, stream, fmt=FORMAT_JSON):
+        self._preload()
+        records = iter_csv_records(stream) if fmt == FORMAT_CSV else iter_records(stream)
+        for entry in records:
+            self.report.processed += 1
+            self._handle(entry)
+            if len(self._inserts) + len(self._updates) + len(self._managers) >= self.batch_size:
+                self._flush()
+        self._flush()
+        return self.report
+
+    # --- Vorab laden (eine Abfrage pro Tabelle) ---
+
+    def _preload(self):
+        model = self.spec.model
+        columns = [model.id] + [getattr(model, f) for f in self.spec.fields]
+        # Schlüssel -> aktuelle Werte (dieselben Dicts werden im Lauf fortgeschrieben)
+        self._existing = {}
+        for row in db.session.query(*columns):
+            values = row._asdict()
+            self._existing[self.spec.key(values)] = values
+
+        if model is Verein:
+            by_id = {v['id']: v for v in self._existing.values()}
+            for v in by_id.values():
+                v['managers'] = frozenset()
+            link = verein_bereichsleitung
+            for verein_id, user_id in db.session.query(link.c.verein_id, link.c.user_id):
+                if verein_id in by_id:
+                    by_id[verein_id]['managers'] |= {user_id}
+
+    def _lookup(self, name):
+        """Name -> ID für Verweise, erst bei Bedarf geladen (eine Abfrage pro Tabelle)."""
+        if name not in self._lookups:
+            query = {
+                'verein': (Verein.name, Verein.id),
+                'anbaustelle': (Anbaustelle.name, Anbaustelle.id),
+                'user': (User.username, User.id),
+            }[name]
+            self._lookups[name] = dict(db.session.query(*query))
+        return self._lookups[name]
+
+    # --- Einzelner Eintrag ---
+
+    def _handle(self, entry):
+        row = self.spec.to_row(entry)
+        label = row.get('name') or row.get('address') or f"Eintrag {self.report.processed}"
+        if row.get('verein_name'):
+            label = f"{label} ({row['verein_name']})"
+        if self._resolve(row, label):
+            self._upsert(row, label)
+
+    def _resolve(self, row, label):
+        """Verweise (Namen) in IDs übersetzen. False = Eintrag wird übersprungen."""
+        if 'verein_name' in row:
+            verein_name = row.pop('verein_name')
+            row['verein_id'] = self._lookup('verein').get(verein_name)
+            if not row['verein_id']:
+                self.report.skipped += 1
+                self.report.add_row('übersprungen', label, "Verein nicht gefunden")
+                return False
+
+        if 'status_name' in row:
+            status_name = row.pop('status_name')
+            if status_name in self._status_ids:
+                row['status_id'] = self._status_ids[status_name]
+            else:
+                self.report.add_row('hinweis', label, f"Status '{status_name}' unbekannt - ignoriert")
+
+        if 'anbaustelle_name' in row:
+            anbau_name = row.pop('anbaustelle_name')
+            if not anbau_name:
+                row['anbaustelle_id'] = None
+            elif anbau_name in self._lookup('anbaustelle'):
+                row['anbaustelle_id'] = self._lookup('anbaustelle')[anbau_name]
+            else:
+                self.report.add_row('hinweis', label, f"Anbaustelle '{anbau_name}' nicht gefunden - ignoriert")
+
+        if 'manager_names' in row:
+            users = self._lookup('user')
+            names = row.pop('manager_names')
+            unknown = [n for n in names if n not in users]
+            if unknown:
+                self.report.add_row('hinweis', label, f"Unbekannte Manager ignoriert: {', '.join(unknown)}")
+            row['managers'] = frozenset(users[n] for n in names if n in users)
+        return True
+
+    def _upsert(self, row, label):
+        key = self.spec.key(row)
+        if not key:
+            self.report.skipped += 1
+            self.report.add_row('übersprungen', label, "Name fehlt")
+            return
+
+        current = self._existing.get(key)
+        if current is None:
+            new = {'id': None, 'status_id': self.default_status_id}
+            new.update(row)
+            self._existing[key] = new
+            self._inserts.append(new)
+            if new.get('managers'):
+                self._managers[key] = new['managers']
+            self.report.created += 1
+            self.report.add_row('neu', label)
+            return
+
+        changes = {k: v for k, v in row.items() if current.get(k) != v}
+        if not changes:
+            self.report.unchanged += 1
+            return
+
+        details = {k: self._describe(k, current.get(k), v) for k, v in changes.items()}
+        current.update(changes)
+        if 'managers' in changes:
+            self._managers[key] = changes.pop('managers')
+        # Doppelter Schlüssel in der Datei, erster Eintrag ist noch nicht geschrieben
+        # (id None) -> die Änderung wird mit dem Insert-Dict zusammen geschrieben
+        if current['id'] is not None and changes:
+            self._updates.setdefault(current['id'], {'id': current['id']}).update(changes)
+        self.report.updated += 1
+        self.report.add_row('geändert', label, details)
+
+    def _describe(self, field, old, new):
+        if field != 'managers':
+            return old, new
+        names = {user_id: name for name, user_id in self._lookup('user').items()}
+        return tuple(', '.join(sorted(names.get(i, str(i)) for i in ids)) if ids else None for ids in (old, new))
+
+    # --- Batch schreiben ---
+
+    def _flush(self):
+        if not self._inserts and not self._updates and not self._managers:
+            return
+
+        if not self.dry_run:
+            model = self.spec.model
+            try:
+                if self._inserts:
+                    db.session.execute(insert(model), [
+                        {k: v for k, v in r.items() if k in self.spec.fields} for r in self._inserts
+                    ])
+                    self._resolve_new_ids()
+                if self._updates:
+                    db.session.execute(update(model), list(self._updates.values()))
+                if self._managers:
+                    self._write_managers()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+        self._inserts = []
+        self._updates = {}
+        self._managers = {}
+        self.report.batches += 1
+        if self.progress:
+            self.progress(self.report)
+
+    def _resolve_new_ids(self):
+        """IDs der neuen Zeilen nachladen, damit spätere Batches sie aktualisieren können."""
+        model = self.spec.model
+        first = self.spec.key_columns[0]
+        values = {r[first] for r in self._inserts}
+        columns = [model.id] + [getattr(model, c) for c in self.spec.key_columns]
+        for row in db.session.query(*columns).filter(getattr(model, first).in_(values)):
+            current = self._existing.get(self.spec.key(row._asdict()))
+            if current is not None and current['id'] is None:
+                current['id'] = row.id
+
+    def _write_managers(self):
+        """Manager pro Verein ersetzen - ein assign_managers() pro unterschiedlicher Menge."""
+        groups = {}
+        for key, user_ids in self._managers.items():
+            groups.setdefault(user_ids, []).append(self._existing[key]['id'])
+        for user_ids, verein_ids in groups.items():
+            Verein.assign_managers(verein_ids, user_ids, Verein.MANAGER_REPLACE)
@@ -0,0 +1,125 @@
+"""
+Übersicht pro Bundesland: wie viele Vereine, Anbaustellen und Abgabestellen
+es je Status gibt.
+
+Gezählt wird mit EINER Abfrage (drei GROUP BY state, status_id per UNION ALL).
+Das Ergebnis wird pro Sicht (alle / eigene Vereine eines BL) gecacht und nach
+jedem Commit, der eine der Tabellen ändert, verworfen - auch bei Bulk-Statements
+(Import, Massenbearbeitung, Manager-Zuweisung).
+"""
+from flask import has_app_context
+from sqlalchemy import event, func, literal, select, union_all
+from sqlalchemy.orm import Session
+from app.cache import GenerationCache
+from app.extensions import db
+from app.models import Verein, Anbaustelle, Ausgabestelle, StatusDefinition, GERMAN_STATES, \
+    verein_bereichsleitung
+
+SCOPE_ALL = 'all'
+SCOPE_MINE = 'mine'
+
+# Kontext (wie bei StatusDefinition) -> (Model, Spalte für das Bundesland)
+SOURCES = (
+    (StatusDefinition.CONTEXT_VEREIN, Verein, Verein.state_seat),
+    (StatusDefinition.CONTEXT_ANBAU, Anbaustelle, Anbaustelle.state),
+    (StatusDefinition.CONTEXT_AUSGABE, Ausgabestelle, Ausgabestelle.state),
+)
+CONTEXTS = tuple(ctx for ctx, _, _ in SOURCES)
+WATCHED_TABLES = {'verein', 'anbaustelle', 'ausgabestelle', 'verein_bereichsleitung'}
+
+STATE_NAMES = dict(GERMAN_STATES)
+NO_STATE = 'k.A.'
+
+# Wert: {Cache-Schlüssel der Sicht: fertige Übersicht}
+_rollups = GenerationCache('bl_rollup', dict)
+
+
+def invalidate():
+    _rollups.invalidate()
+
+
+def _grouped_query(user_id=None):
+    selects = []
+    for ctx, model, state_col in SOURCES:
+        stmt = select(literal(ctx), state_col, model.status_id, func.count(model.id))
+        if user_id is not None:
+            stmt = stmt.where(_own_filter(model, user_id))
+        selects.append(stmt.group_by(state_col, model.status_id))
+    return union_all(*selects)
+
+
+def _own_filter(model, user_id):
+    """Nur was an den Vereinen des BL hängt."""
+    own_vereine = select(verein_bereichsleitung.c.verein_id).where(verein_bereichsleitung.c.user_id == user_id)
+    if model is Verein:
+        return Verein.id.in_(own_vereine)
+    if model is Ausgabestelle:
+        return Ausgabestelle.verein_id.in_(own_vereine)
+    return Anbaustelle.id.in_(select(Verein.anbaustelle_id).where(Verein.id.in_(own_vereine)))
+
+
+def _build(rows):
+    states = {}
+    totals = {ctx: 0 for ctx in CONTEXTS}
+    for ctx, state, status_id, count in rows:
+        code = state or NO_STATE
+        entry = states.get(code)
+        if entry is None:
+            entry = states[code] = {
+                'code': code,
+                'name': STATE_NAMES.get(code, code),
+                **{c: {'total': 0, 'by_status': {}} for c in CONTEXTS}
+            }
+        entry[ctx]['total'] += count
+        entry[ctx]['by_status'][status_id] = entry[ctx]['by_status'].get(status_id, 0) + count
+        totals[ctx] += count
+
+    # Reihenfolge wie in GERMAN_STATES, Unbekanntes / "k.A." ans Ende
+    order = {code: i for i, (code, _) in enumerate(GERMAN_STATES)}
+    ordered = sorted(states.values(), key=lambda s: (order.get(s['code'], len(order)), s['code']))
+    return {'states': ordered, 'totals': totals}
+
+
+def get_rollup(user, scope=SCOPE_ALL):
+    """Übersicht aus dem Cache (bzw. mit einer Abfrage neu berechnet)."""
+    user_id = user.id if scope == SCOPE_MINE else None
+    key = (scope, user_id)
+
+    data = _rollups.get()
+    result = data.get(key)
+    if result is None:
+        result = _build(db.session.execute(_grouped_query(user_id)).all())
+        data[key] = result
+    return result
+
+
+# --- Invalidierung ---
+# ORM-Änderungen kommen über after_flush, Bulk-Statements (UPDATE/DELETE/INSERT über
+# session.execute) über do_orm_execute. Verworfen wird erst nach dem Commit.
+
+@event.listens_for(Session, 'after_flush')
+def _mark_dirty_on_flush(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Verein, Anbaustelle, Ausgabestelle)):
+            session.info['bl_rollup_dirty'] = True
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_dirty_on_bulk(state):
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    table = getattr(state.statement, 'table', None)
+    if table is not None and getattr(table, 'name', None) in WATCHED_TABLES:
+        state.session.info['bl_rollup_dirty'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('bl_rollup_dirty', False) and has_app_context():
+        invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_dirty(session):
+    session.info.pop('bl_rollup_dirty', None)
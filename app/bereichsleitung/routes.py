@@ -1,10 +1,15 @@
-import json
-from flask import render_template, request, flash, redirect, url_for, jsonify
+from flask import render_template, request, flash, redirect, url_for, jsonify, current_app, Response, \
+    stream_with_context
+from datetime import datetime
 from flask_login import login_required, current_user
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload, selectinload
 from app.extensions import db
 from app.decorators import permission_required
-from app.models import Verein, Anbaustelle, Ausgabestelle, User, StatusDefinition, GERMAN_STATES
-from app.bereichsleitung import bp
+from app.models import Verein, Anbaustelle, Ausgabestelle, User, StatusDefinition, GERMAN_STATES, \
+    verein_bereichsleitung
+from app.bereichsleitung import bp, rollup, exporter
+from app.bereichsleitung.importer import Importer, FORMAT_CSV, FORMAT_JSON
 
 
 # --- HELPER ---
@@ -16,44 +21,101 @@ def is_admin():
 @login_required
 @permission_required('bl_user')
 def index():
-    # Daten laden
-    vereine = Verein.query.order_by(Verein.name).all() if is_admin() else current_user.managed_vereine
+    # Alle Relationen, die das Template anfasst, werden vorab geladen.
+    # Die Anzahl der Queries bleibt so konstant - egal wie viele Vereine es gibt.
+    verein_query = Verein.query.options(selectinload(Verein.managers), joinedload(Verein.anbaustelle))
+    if not is_admin():
+        verein_query = verein_query.join(verein_bereichsleitung) \
+            .filter(verein_bereichsleitung.c.user_id == current_user.id)
+    vereine = verein_query.order_by(Verein.name).all()
 
-    # Anbaustellen: Admin sieht alle, BL sieht nur die verknüpften
-    all_anbaustellen = Anbaustelle.query.all()
+    # Anbaustellen: Admin sieht alle, BL sieht nur die verknüpften (schon geladen)
     if is_admin():
-        visible_anbaustellen = all_anbaustellen
+        visible_anbaustellen = Anbaustelle.query.all()
     else:
-        # Nur die Anbaustellen der eigenen Vereine
-        visible_anbaustellen = list({v.anbaustelle for v in vereine if v.anbaustelle})
+        # dict.fromkeys statt set: Duplikate raus, Reihenfolge (nach Vereinsname) bleibt stabil
+        visible_anbaustellen = list(dict.fromkeys(v.anbaustelle for v in vereine if v.anbaustelle))
 
-    # Abgabestellen
-    ausgabestellen = []
-    if is_admin():
-        ausgabestellen = Ausgabestelle.query.all()
-    else:
-        for v in vereine:
-            ausgabestellen.extend(v.ausgabestellen)
+    # Abgabestellen (inkl. Verein für die Namensspalte)
+    ausgabe_query = Ausgabestelle.query.options(joinedload(Ausgabestelle.verein))
+    if not is_admin():
+        ausgabe_query = ausgabe_query.filter(Ausgabestelle.verein_id.in_([v.id for v in vereine]))
+    ausgabestellen = ausgabe_query.all()
+
+    mein_verein = None
+    if current_user.verein_id:
+        mein_verein = db.session.get(Verein, current_user.verein_id, options=[selectinload(Verein.managers)])
+
+    # Status-Dropdown aus der Registry (sortiert nach Position, keine Query)
+    all_statuses = []
+    for context in (StatusDefinition.CONTEXT_VEREIN, StatusDefinition.CONTEXT_ANBAU,
+                    StatusDefinition.CONTEXT_AUSGABE):
+        reg = StatusDefinition.status_registry(context)
+        all_statuses.extend({'id': s_id, 'name': reg['names'][s_id], 'context': context} for s_id in reg['ids'])
 
     return render_template(
         'bereichsleitung/index.html',
-        mein_verein=current_user.verein,
+        mein_verein=mein_verein,
         vereine=vereine,
         anbaustellen=visible_anbaustellen,
-        all_anbaustellen_options=all_anbaustellen,
         ausgabestellen=ausgabestellen,
         states=GERMAN_STATES,
+        all_statuses=all_statuses
+        # User & Cluster für die Massenbearbeitung kommen per Typeahead (siehe SUCHE)
+    )
 
-        # FIX: Sortierung nach position
-        all_statuses=StatusDefinition.query.order_by(StatusDefinition.position).all(),
 
-        # FIX: Alle User laden (auch Admins), damit Dropdown nicht leer ist
-        all_users=User.query.order_by(User.username).all(),
+# ==============================================================================
+# ÜBERSICHT PRO BUNDESLAND
+# ==============================================================================
 
-        all_clusters=Anbaustelle.query.filter_by(anbau_type='cluster').all()
+def _rollup_scope():
+    # BL sehen immer nur ihre eigenen Vereine (wie Export und Suche).
+    # Admins sehen per Default alles und können per ?scope=mine umschalten.
+    if not is_admin():
+        return rollup.SCOPE_MINE
+    scope = request.args.get('scope')
+    return scope if scope in (rollup.SCOPE_ALL, rollup.SCOPE_MINE) else rollup.SCOPE_ALL
+
+
+@bp.route('/rollup', methods=['GET'])
+@login_required
+@permission_required('bl_user')
+def rollup_view():
+    scope = _rollup_scope()
+    return render_template(
+        'bereichsleitung/rollup.html',
+        rollup=rollup.get_rollup(current_user, scope),
+        scope=scope,
+        contexts=rollup.CONTEXTS,
+        registries={ctx: StatusDefinition.status_registry(ctx) for ctx in rollup.CONTEXTS},
+        status_label=StatusDefinition.label_for,
+        status_css=StatusDefinition.css_for
     )
 
 
+@bp.route('/api/rollup', methods=['GET'])
+@login_required
+@permission_required('bl_user')
+def rollup_json():
+    scope = _rollup_scope()
+    data = rollup.get_rollup(current_user, scope)
+
+    # JSON-Keys müssen Strings sein -> Status als Liste
+    states = []
+    for s in data['states']:
+        entry = {'code': s['code'], 'name': s['name']}
+        for ctx in rollup.CONTEXTS:
+            entry[ctx] = {
+                'total': s[ctx]['total'],
+                'by_status': [{'status_id': s_id, 'label': StatusDefinition.label_for(s_id), 'count': n}
+                              for s_id, n in s[ctx]['by_status'].items()]
+            }
+        states.append(entry)
+
+    return jsonify({'scope': scope, 'states': states, 'totals': data['totals']})
+
+
 # ==============================================================================
 # CREATE & DELETE (NUR ADMIN)
 # ==============================================================================
@@ -178,19 +240,14 @@ def verein_detail(id):
         elif new_ausgabe_id == 'none':
             for old_aus in verein.ausgabestellen: old_aus.verein_id = None
 
-        manager_ids = request.form.getlist('manager_ids')
-        if manager_ids:
-            verein.managers = User.query.filter(User.id.in_(manager_ids)).all()
-        else:
-            verein.managers = []
+        Verein.assign_managers([verein.id], request.form.getlist('manager_ids'), Verein.MANAGER_REPLACE)
 
         db.session.commit()
         flash(f'Verein "{verein.name}" gespeichert.', 'success')
         return redirect(url_for('bereichsleitung.verein_detail', id=id))
 
-    all_anbaustellen = Anbaustelle.query.all()
-    all_ausgabestellen = Ausgabestelle.query.all()
-    potential_managers = User.query.all()  # Vereinfacht: Alle User können Manager sein
+    # Anbaustelle, Abgabestelle und Manager werden per Typeahead gesucht -
+    # hier nur die aktuell zugewiesenen Einträge (für die Vorauswahl)
     current_ausgabe = verein.ausgabestellen[0] if verein.ausgabestellen else None
     status_options = StatusDefinition.query.filter_by(context='verein').order_by(StatusDefinition.position).all()
 
@@ -198,10 +255,7 @@ def verein_detail(id):
         'bereichsleitung/verein_detail.html',
         verein=verein,
         states=GERMAN_STATES,
-        all_anbaustellen=all_anbaustellen,
-        all_ausgabestellen=all_ausgabestellen,
         current_ausgabe=current_ausgabe,
-        potential_managers=potential_managers,
         status_options=status_options
     )
 
@@ -271,59 +325,52 @@ def import_data(type):
     file = request.files.get('file')
     if not file: return redirect(url_for('bereichsleitung.index'))
 
-    try:
-        data = json.load(file)
-        count = 0
-        def_v = StatusDefinition.query.filter_by(context='verein').order_by(StatusDefinition.position).first()
-        def_a = StatusDefinition.query.filter_by(context='anbau').order_by(StatusDefinition.position).first()
-        def_dist = StatusDefinition.query.filter_by(context='ausgabe').order_by(StatusDefinition.position).first()
-
-        if type == 'vereine':
-            for entry in data:
-                v = Verein.query.filter_by(name=entry.get('name')).first()
-                if not v:
-                    v = Verein(name=entry.get('name'))
-                    if def_v: v.status_id = def_v.id
-                    db.session.add(v)
-                v.city = entry.get('city')
-                v.zip_code = entry.get('zip_code')
-                v.state_seat = entry.get('state_seat')
-                if 'status_id' in entry: v.status_id = entry['status_id']  # changed to status_id from json
-                count += 1
-
-        elif type == 'anbau':
-            for entry in data:
-                a = Anbaustelle.query.filter_by(name=entry.get('name')).first()
-                if not a:
-                    a = Anbaustelle(name=entry.get('name'))
-                    if def_a: a.status_id = def_a.id
-                    db.session.add(a)
-                a.address = entry.get('address')
-                a.state = entry.get('state')
-                a.anbau_type = entry.get('type', 'einzel')
-                if 'status_id' in entry: a.status_id = entry['status_id']
-                count += 1
+    dry_run = 'dry_run' in request.form
 
-        elif type == 'abgabe':
-            for entry in data:
-                v_name = entry.get('verein_name')
-                verein = Verein.query.filter_by(name=v_name).first()
-                if verein:
-                    aus = Ausgabestelle(address=entry.get('address'), state=entry.get('state'), verein=verein)
-                    if def_dist: aus.status_id = def_dist.id
-                    if 'status_id' in entry: aus.status_id = entry['status_id']
-                    db.session.add(aus)
-                    count += 1
+    def log_progress(report):
+        current_app.logger.info(f"Import ({type}) Batch {report.batches}: {report.summary()}")
 
-        db.session.commit()
-        flash(f'Import ({type}) erfolgreich: {count} Einträge.', 'success')
+    importer = None
+    try:
+        importer = Importer(type, batch_size=current_app.config.get('IMPORT_BATCH_SIZE', 500),
+                            dry_run=dry_run, progress=log_progress)
+        fmt = FORMAT_CSV if (file.filename or '').lower().endswith('.csv') else FORMAT_JSON
+        report = importer.run(file.stream, fmt=fmt)
     except Exception as e:
         db.session.rollback()
-        flash(f'Import Fehler: {e}', 'danger')
+        if importer and importer.report.batches and not dry_run:
+            flash(f'Import Fehler nach {importer.report.batches} gespeicherten Batches '
+                  f'({importer.report.summary()}): {e}', 'danger')
+        else:
+            flash(f'Import Fehler: {e}', 'danger')
+        return redirect(url_for('bereichsleitung.index'))
 
+    if dry_run:
+        # Nichts geschrieben - nur anzeigen, was passieren würde
+        return render_template('bereichsleitung/import_report.html', report=report, type=type)
+
+    flash(f'Import ({type}) erfolgreich: {report.summary()}.', 'success')
     return redirect(url_for('bereichsleitung.index'))
 
 
+@bp.route('/export/<type>.<fmt>', methods=['GET'])
+@login_required
+@permission_required('bl_user')
+def export_data(type, fmt):
+    if type not in exporter.TYPES or fmt not in exporter.FORMATS:
+        flash('Unbekannter Export.', 'danger')
+        return redirect(url_for('bereichsleitung.index'))
+
+    # BL exportieren nur ihre eigenen Vereine (wie in der Übersicht)
+    user_id = None if is_admin() else current_user.id
+    filename = f"{type}_{datetime.utcnow():%Y%m%d}.{fmt}"
+    return Response(
+        stream_with_context(exporter.stream(type, fmt, user_id)),
+        mimetype=exporter.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
 @bp.route('/status/manage', methods=['GET'])
 @login_required
 def manage_status():
@@ -346,6 +393,7 @@ def add_status():
     new_pos = (last.position + 1) if last else 0
     db.session.add(StatusDefinition(name=name, context=context, position=new_pos))
     db.session.commit()
+    StatusDefinition.invalidate_registry()
     return redirect(url_for('bereichsleitung.manage_status'))
 
 
@@ -396,6 +444,7 @@ def move_status(id, direction):
 
     for idx, item in enumerate(items): item.position = idx
     db.session.commit()
+    StatusDefinition.invalidate_registry()
     return redirect(url_for('bereichsleitung.manage_status'))
 
 
@@ -403,6 +452,7 @@ def reorder_statuses(context):
     items = StatusDefinition.query.filter_by(context=context).order_by(StatusDefinition.position).all()
     for idx, item in enumerate(items): item.position = idx
     db.session.commit()
+    StatusDefinition.invalidate_registry()
 
 
 # ... (Imports und andere Routen bleiben gleich)
@@ -435,6 +485,9 @@ def bulk_update(entity_type):
 
     # Manager wird separat aus dem Dict geholt (da M2M Beziehung)
     new_manager_id = changes.pop('manager_id', None)
+    manager_mode = changes.pop('manager_mode', Verein.MANAGER_REPLACE)
+    if manager_mode not in Verein.MANAGER_MODES:
+        return jsonify({"success": False, "error": "Ungültiger Modus"}), 400
 
     clean_changes = {}
     for key, value in changes.items():
@@ -448,14 +501,10 @@ def bulk_update(entity_type):
         if clean_changes:
             db.session.execute(db.update(ModelClass).where(ModelClass.id.in_(ids)).values(clean_changes))
 
-        # Manager Update nur für Verein erlaubt
+        # Manager Update nur für Verein erlaubt (mengenbasiert, ein Statement pro Schritt)
         if new_manager_id and entity_type == 'verein':
-            if new_manager_id != "":
-                manager = db.session.get(User, int(new_manager_id))
-                if manager:
-                    vereine = db.session.query(Verein).filter(Verein.id.in_(ids)).all()
-                    for v in vereine:
-                        v.managers = [manager]
+            if db.session.get(User, int(new_manager_id)):
+                Verein.assign_managers(ids, [new_manager_id], manager_mode)
 
         db.session.commit()
         return jsonify({"success": True})
@@ -479,4 +528,86 @@ def bulk_delete(entity_type):
         return jsonify({"success": True})
     except Exception as e:
         db.session.rollback()
-        return jsonify({"success": False, "error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# ==============================================================================
+# SUCHE (TYPEAHEAD FÜR DIE AUSWAHLFELDER)
+# ==============================================================================
+# Antwort: {"results": [{"id": .., "text": ..}], "page": n, "next_page": n+1 | null}
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+
+
+def _prefix_match(term, *columns):
+    """Präfix-Suche ohne Groß/Klein-Unterscheidung - nutzt die NOCASE-Indizes."""
+    pattern = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    return or_(*[c.like(pattern, escape='\\') for c in columns])
+
+
+def _search_response(query, match_columns, order_column, to_result):
+    term = (request.args.get('q') or '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', SEARCH_PAGE_SIZE, type=int), 1), SEARCH_MAX_PAGE_SIZE)
+
+    if term:
+        query = query.filter(_prefix_match(term, *match_columns))
+
+    # Einen Eintrag mehr holen statt COUNT(*): reicht für "gibt es eine nächste Seite?"
+    rows = query.order_by(db.collate(order_column, 'NOCASE')) \
+        .offset((page - 1) * per_page).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+
+    return jsonify({
+        'results': [to_result(r) for r in rows[:per_page]],
+        'page': page,
+        'next_page': page + 1 if has_more else None
+    })
+
+
+@bp.route('/api/search/users', methods=['GET'])
+@login_required
+@permission_required('bl_user')
+def search_users():
+    query = db.session.query(User.id, User.username, User.first_name, User.last_name)
+
+    def to_result(u):
+        name = f"{u.first_name} {u.last_name}" if u.first_name and u.last_name else u.username
+        return {'id': u.id, 'text': f"{name} ({u.username})"}
+
+    return _search_response(query, (User.username, User.first_name, User.last_name), User.username, to_result)
+
+
+@bp.route('/api/search/anbau', methods=['GET'])
+@login_required
+@permission_required('bl_user')
+def search_anbau():
+    query = db.session.query(Anbaustelle.id, Anbaustelle.name, Anbaustelle.anbau_type)
+    anbau_type = request.args.get('type')
+    if anbau_type:
+        query = query.filter(Anbaustelle.anbau_type == anbau_type)
+
+    def to_result(a):
+        return {'id': a.id, 'text': f"{a.name} ({a.anbau_type})"}
+
+    return _search_response(query, (Anbaustelle.name,), Anbaustelle.name, to_result)
+
+
+@bp.route('/api/search/ausgabe', methods=['GET'])
+@login_required
+@permission_required('bl_user')
+def search_ausgabe():
+    query = db.session.query(Ausgabestelle.id, Ausgabestelle.address, Ausgabestelle.state,
+                             Ausgabestelle.verein_id, Verein.name.label('verein_name')) \
+        .outerjoin(Verein, Ausgabestelle.verein_id == Verein.id)
+    # Optional: Verein, für den gerade ausgewählt wird (blendet "Aktuell bei" aus)
+    for_verein = request.args.get('verein_id', type=int)
+
+    def to_result(a):
+        text = f"{a.address} ({a.state})"
+        if a.verein_name and a.verein_id != for_verein:
+            text += f" [Aktuell bei: {a.verein_name}]"
+        return {'id': a.id, 'text': text}
+
+    return _search_response(query, (Ausgabestelle.address, Ausgabestelle.name), Ausgabestelle.address, to_result)
@@ -0,0 +1,110 @@
+"""
+Kleine In-Process-Caches mit Generationszähler.
+
+Jeder Cache hat einen Namen. Der Generationsstand liegt als Datei in CACHE_DIR,
+damit alle Gunicorn-Worker eine Invalidierung mitbekommen. Ein Zugriff kostet
+damit nur ein os.stat() - keine DB-Abfrage.
+"""
+import os
+import threading
+import time
+from flask import current_app
+
+
+def _stamp_path(name):
+    return os.path.join(current_app.config['CACHE_DIR'], f"{name}.gen")
+
+
+def generation(name):
+    """Liefert den aktuellen Stand des Zählers (Pfad, Inode, mtime)."""
+    path = _stamp_path(name)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return (path, 0, 0)
+    return (path, st.st_ino, st.st_mtime_ns)
+
+
+def bump(name):
+    """Erhöht den Zähler. Alle Worker laden beim nächsten Zugriff neu."""
+    path = _stamp_path(name)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, 'w') as f:
+        f.write(str(time.time_ns()))
+    # os.replace ist atomar -> neuer Inode, andere Worker sehen sofort den neuen Stand
+    os.replace(tmp, path)
+    return generation(name)
+
+
+class GenerationCache:
+    """
+    Hält EINEN Wert pro Prozess. Der Loader läuft nur, wenn sich die Generation
+    geändert hat (oder die optionale TTL abgelaufen ist).
+    """
+
+    def __init__(self, name, loader, ttl=None):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self._entry = None  # (token, geladen_um, wert)
+        self._lock = threading.Lock()
+
+    def _fresh(self, entry, token):
+        if entry is None or entry[0] != token:
+            return False
+        return self.ttl is None or time.monotonic() - entry[1] < self.ttl
+
+    def get(self):
+        token = generation(self.name)
+        entry = self._entry
+        if self._fresh(entry, token):
+            return entry[2]
+
+        with self._lock:
+            entry = self._entry
+            if self._fresh(entry, token):
+                return entry[2]
+            # Token VOR dem Laden lesen: ein paralleler bump() führt so beim nächsten Zugriff zum Reload
+            value = self.loader()
+            self._entry = (token, time.monotonic(), value)
+            return value
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+            bump(self.name)
+
+
+class KeyedGenerationCache:
+    """
+    Wie GenerationCache, aber mit einem Wert UND einem eigenen Zähler pro Schlüssel
+    (z.B. pro User). Eine Invalidierung trifft so nur den betroffenen Eintrag.
+    """
+
+    def __init__(self, name, loader, ttl=None):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self._entries = {}  # key -> (token, geladen_um, wert)
+
+    def _gen_name(self, key):
+        return f"{self.name}-{key}"
+
+    def get(self, key):
+        token = generation(self._gen_name(key))
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == token and \
+                (self.ttl is None or time.monotonic() - entry[1] < self.ttl):
+            return entry[2]
+
+        value = self.loader(key)
+        if value is None:
+            # "Nicht gefunden" cachen wir nicht
+            self._entries.pop(key, None)
+        else:
+            self._entries[key] = (token, time.monotonic(), value)
+        return value
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+        bump(self._gen_name(key))
@@ -4,6 +4,7 @@ import os
 from flask import Blueprint
 from app.extensions import db
 from app.models import Permission, DashboardTile, User
+from app.main.dashboard import invalidate_tiles
 from werkzeug.security import generate_password_hash
 
 # 1. Blueprint erstellen
@@ -47,6 +48,7 @@ def seed_db_command():
             existing.icon = p.get('icon', '')
 
     db.session.commit()
+    Permission.invalidate_flags()
 
     # --- 2. Tiles ---
     click.echo(f"   Prüfe {len(data['tiles'])} Dashboard Kacheln...")
@@ -77,6 +79,7 @@ def seed_db_command():
             existing.required_permission = perm_obj
 
     db.session.commit()
+    invalidate_tiles()
 
     # --- 3. Default Admin ---
     if not User.query.filter_by(username='admin').first():
@@ -92,4 +95,65 @@ def seed_db_command():
         db.session.add(admin)
         db.session.commit()
 
-    click.echo("✅ Seeding abgeschlossen.")
\ No newline at end of file
+    click.echo("✅ Seeding abgeschlossen.")
+
+@cmd_bp.cli.command('bl-import')
+@click.argument('type', type=click.Choice(['vereine', 'anbau', 'abgabe']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', type=int, default=None, help='Zeilen pro Batch (Default: IMPORT_BATCH_SIZE).')
+@click.option('--dry-run', is_flag=True, help='Nichts schreiben, nur den Diff ausgeben.')
+def bl_import_command(type, path, batch_size, dry_run):
+    """Importiert Vereine / Anbaustellen / Abgabestellen (JSON-Array, JSON-Lines oder CSV)."""
+    from flask import current_app
+    from app.bereichsleitung.importer import Importer, FORMAT_CSV, FORMAT_JSON
+
+    def progress(report):
+        click.echo(f"   Batch {report.batches}: {report.summary()}")
+
+    importer = Importer(type, batch_size=batch_size or current_app.config.get('IMPORT_BATCH_SIZE', 500),
+                        dry_run=dry_run, progress=progress)
+    with open(path, 'rb') as f:
+        report = importer.run(f, fmt=FORMAT_CSV if path.lower().endswith('.csv') else FORMAT_JSON)
+
+    if dry_run:
+        for action, label, details in report.rows:
+            click.echo(f"   [{action}] {label}" + (f" {details}" if details else ""))
+    click.echo(f"✅ Import {'(Dry-Run) ' if dry_run else ''}abgeschlossen: {report.summary()}")
+
+
+@cmd_bp.cli.command('search-reindex')
+def search_reindex_command():
+    """Baut den Volltextindex (FTS5) inkl. Trigger komplett neu auf."""
+    from app.search.index import rebuild
+    count = rebuild()
+    click.echo(f"✅ Suchindex neu aufgebaut: {count} Einträge.")
+
+
+@cmd_bp.cli.command('stats-sync')
+@click.option('--force', is_flag=True, help='Ohne If-None-Match / If-Modified-Since abrufen.')
+@click.option('--reparse', is_flag=True, help='Nicht abrufen, nur die zuletzt geladene Anbauverband-Seite neu parsen.')
+def stats_sync_command(force, reparse):
+    """Aktualisiert die Statistik (Anbauverband + Mariana Sheet, parallel)."""
+    from app.stats import sources
+
+    if reparse:
+        click.echo(f"✅ Neu geparst: {sources.reparse()} Bundesländer.")
+        return
+
+    result = sources.refresh_all(force=force)
+    click.echo(f"   Anbauverband: {result.status or '-'} ({result.count} Bundesländer)")
+    click.echo(f"   Mariana: {result.mariana_count} Werte")
+    for source, error in result.errors.items():
+        click.echo(f"❌ {source}: {error}")
+    if not result.errors:
+        click.echo("✅ Statistik aktualisiert.")
+
+
+@cmd_bp.cli.command('mail-send')
+@click.option('--batches', type=int, default=None, help='Höchstens so viele Batches (Default: alle fälligen).')
+def mail_send_command(batches):
+    """Verschickt fällige Mails aus der Outbox (z.B. per Cron, wenn MAIL_OUTBOX_THREAD=False)."""
+    from app import outbox
+    outbox.prune()
+    sent, failed = outbox.drain(max_batches=batches)
+    click.echo(f"✅ Outbox: {sent} verschickt, {failed} fehlgeschlagen.")
@@ -0,0 +1,133 @@
+"""
+Sicherungen der Formular-Struktur (ImmoBackup / ImmoBackupBlob).
+
+- Der Inhalt wird kanonisch serialisiert, per SHA-256 identifiziert und
+  zlib-komprimiert EINMAL in ImmoBackupBlob abgelegt. Gleiche Stände teilen
+  sich den Blob, ein Speichern ohne Änderung legt gar keine Sicherung an.
+- Die Liste liefert nur Metadaten, der Inhalt wird pro ID nachgeladen.
+- Aufbewahrung: die letzten FORM_BACKUP_KEEP_LATEST Sicherungen bleiben immer
+  erhalten (jede Sicherung ist der Stand NACH einem Speichern - ein missglücktes
+  Speichern lässt sich so auf den Stand davor zurücksetzen). Ältere werden
+  ausgedünnt: innerhalb von FORM_BACKUP_KEEP_HOURS die neueste pro Stunde, bis
+  FORM_BACKUP_KEEP_DAYS die neueste pro Tag, der Rest wird gelöscht.
+"""
+import hashlib
+import json
+import zlib
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+from app.extensions import db
+from app.models import ImmoBackup, ImmoBackupBlob
+
+COMPRESS_LEVEL = 6
+DEFAULT_LIST_LIMIT = 50
+
+
+def encode(data):
+    """Struktur -> (Hash, komprimierte Bytes, unkomprimierte Größe)."""
+    raw = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest(), zlib.compress(raw, COMPRESS_LEVEL), len(raw)
+
+
+def decode(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+def _latest_hash():
+    return db.session.execute(
+        select(ImmoBackup.content_hash).order_by(ImmoBackup.created_at.desc(), ImmoBackup.id.desc()).limit(1)
+    ).scalar()
+
+
+def create(data, name, now=None):
+    """
+    Legt eine Sicherung an, sofern sich der Inhalt seit der letzten geändert hat.
+    Räumt danach nach der Aufbewahrungsregel auf. Commit macht der Aufrufer.
+    Gibt die neue ImmoBackup zurück (oder None, wenn nichts zu sichern war).
+    """
+    now = now or datetime.utcnow()
+    content_hash, blob, size = encode(data)
+    if content_hash == _latest_hash():
+        return None
+
+    db.session.execute(insert(ImmoBackupBlob).values(content_hash=content_hash, data=blob, size=size)
+                       .on_conflict_do_nothing(index_elements=['content_hash']))
+    backup = ImmoBackup(name=name, content_hash=content_hash, created_at=now)
+    db.session.add(backup)
+    db.session.flush()
+    prune(now)
+    return backup
+
+
+def listing(limit=DEFAULT_LIST_LIMIT):
+    """Nur Metadaten der neuesten Sicherungen (ohne Inhalt)."""
+    rows = db.session.execute(
+        select(ImmoBackup.id, ImmoBackup.name, ImmoBackup.created_at, ImmoBackupBlob.size)
+        .join(ImmoBackupBlob, ImmoBackupBlob.content_hash == ImmoBackup.content_hash)
+        .order_by(ImmoBackup.created_at.desc(), ImmoBackup.id.desc())
+        .limit(limit)
+    )
+    return [{
+        "id": r.id,
+        "name": r.name,
+        "created_at": r.created_at.isoformat() + 'Z' if r.created_at else None,
+        "size": r.size,
+    } for r in rows]
+
+
+def load(backup_id):
+    """Inhalt einer Sicherung oder None."""
+    blob = db.session.execute(
+        select(ImmoBackupBlob.data)
+        .join(ImmoBackup, ImmoBackup.content_hash == ImmoBackupBlob.content_hash)
+        .where(ImmoBackup.id == backup_id)
+    ).scalar()
+    return decode(blob) if blob is not None else None
+
+
+# ==============================================================================
+# AUFBEWAHRUNG
+# ==============================================================================
+
+def _bucket(created_at, now, keep_hours, keep_days):
+    age = now - created_at
+    if age < timedelta(hours=keep_hours):
+        return 'h', created_at.replace(minute=0, second=0, microsecond=0)
+    if age < timedelta(days=keep_days):
+        return 'd', created_at.date()
+    return None
+
+
+def expired(rows, now, keep_hours, keep_days, keep_latest=1):
+    """
+    rows: (id, created_at), neueste zuerst. Liefert die IDs, die nach der Regel
+    wegfallen (die keep_latest neuesten bleiben, danach die neueste pro Bucket).
+    """
+    seen = set()
+    drop = []
+    for idx, (backup_id, created_at) in enumerate(rows):
+        bucket = _bucket(created_at or now, now, keep_hours, keep_days)
+        if idx < max(keep_latest, 1) or (bucket is not None and bucket not in seen):
+            seen.add(bucket)
+            continue
+        drop.append(backup_id)
+    return drop
+
+
+def prune(now=None):
+    """Wendet die Aufbewahrungsregel an und löscht nicht mehr benutzte Blobs."""
+    now = now or datetime.utcnow()
+    rows = db.session.execute(
+        select(ImmoBackup.id, ImmoBackup.created_at).order_by(ImmoBackup.created_at.desc(), ImmoBackup.id.desc())
+    ).all()
+    drop = expired(rows, now, current_app.config['FORM_BACKUP_KEEP_HOURS'],
+                   current_app.config['FORM_BACKUP_KEEP_DAYS'], current_app.config['FORM_BACKUP_KEEP_LATEST'])
+    if drop:
+        db.session.execute(delete(ImmoBackup).where(ImmoBackup.id.in_(drop))
+                           .execution_options(synchronize_session=False))
+        db.session.execute(delete(ImmoBackupBlob).where(
+            ImmoBackupBlob.content_hash.not_in(select(ImmoBackup.content_hash)))
+            .execution_options(synchronize_session=False))
+    return len(drop)
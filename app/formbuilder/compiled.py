@@ -0,0 +1,190 @@
+"""
+Kompiliertes, unveränderliches Formular-Schema.
+
+Sektionen und Fragen werden einmal pro Formular-Revision (schema.REVISION_CACHE)
+aus der DB geladen und in schlanke, schreibgeschützte Objekte übersetzt:
+options/types sind schon geparst, dazu gibt es Indizes pro Kategorie und pro
+Objekt-Typ (einzel/cluster/ausgabe) sowie die Liste der Metadaten-Fragen.
+/projects/config, der Projekt-Snapshot, die Onboarding-Config und der
+PdfGenerator lesen alle daraus - ohne eigene Abfragen und ohne json.loads.
+
+Projekt-Snapshots (form_config im data_json) lassen sich mit from_snapshot()
+in dasselbe Format bringen.
+"""
+import json
+from sqlalchemy import select
+from app.cache import GenerationCache
+from app.extensions import db
+from app.models import ImmoSection, ImmoQuestion
+from app.formbuilder.schema import CATEGORY_IMMO, REVISION_CACHE, revision
+
+QUESTION_FIELDS = ('id', 'section_id', 'label', 'type', 'width', 'width_tablet', 'width_mobile', 'tooltip',
+                   'order', 'is_required', 'is_metadata', 'is_print', 'options_json', 'types_json')
+SECTION_FIELDS = ('id', 'title', 'order', 'is_expanded', 'category')
+
+
+def _parse_list(raw):
+    if not raw:
+        return ()
+    if isinstance(raw, (list, tuple)):
+        return tuple(raw)
+    try:
+        value = json.loads(raw)
+    except (TypeError, ValueError):
+        return ()
+    return tuple(value) if isinstance(value, list) else ()
+
+
+class _Frozen:
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} ist schreibgeschützt")
+
+    def _init(self, **values):
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+
+class Question(_Frozen):
+    __slots__ = QUESTION_FIELDS + ('options', 'types')
+
+    def __init__(self, **values):
+        self._init(**values)
+        self._init(options=_parse_list(values.get('options_json')), types=_parse_list(values.get('types_json')))
+
+    def config(self):
+        """Format für /projects/config und die Onboarding-Config."""
+        return {
+            "id": self.id,
+            "label": self.label,
+            "type": self.type,
+            "width": self.width,
+            "width_tablet": self.width_tablet,
+            "width_mobile": self.width_mobile,
+            "tooltip": self.tooltip,
+            "is_required": self.is_required,
+            "is_metadata": self.is_metadata,
+            "is_print": self.is_print,
+            "options": list(self.options),
+            "types": list(self.types),
+        }
+
+    def snapshot(self):
+        """Format für form_config im Projekt (Rohdaten wie in der DB)."""
+        return {
+            "id": str(self.id),  # ID als String für JSON Konsistenz
+            "label": self.label,
+            "type": self.type,
+            "width": self.width,
+            "width_tablet": self.width_tablet,
+            "width_mobile": self.width_mobile,
+            "tooltip": self.tooltip,
+            "is_required": self.is_required,
+            "is_print": self.is_print,
+            "options_json": self.options_json,
+            "types_json": self.types_json,
+        }
+
+
+class Section(_Frozen):
+    __slots__ = SECTION_FIELDS + ('questions',)
+
+    def __init__(self, questions, **values):
+        self._init(questions=tuple(questions), **values)
+
+
+class FormSchema(_Frozen):
+    """
+    Ein Stand des Formulars. sections: alle Sektionen in Reihenfolge,
+    jeweils mit ihren Fragen (Tupel). Alles andere sind Indizes darauf.
+    """
+    __slots__ = ('revision', 'sections', 'questions', 'by_id', 'metadata', '_by_category', '_printable')
+
+    def __init__(self, sections, revision=None):
+        sections = tuple(sections)
+        questions = tuple(q for sec in sections for q in sec.questions)
+
+        by_category = {}
+        for sec in sections:
+            by_category.setdefault(sec.category, []).append(sec)
+
+        # Pro Objekt-Typ die druckbaren Fragen je Immo-Sektion (None = alle Typen)
+        all_types = {t for q in questions for t in q.types}
+        printable = {}
+        for target in all_types | {None}:
+            entries = []
+            for sec in by_category.get(CATEGORY_IMMO, ()):
+                visible = tuple(q for q in sec.questions if q.is_print and (target is None or target in q.types))
+                if visible:
+                    entries.append((sec, visible))
+            printable[target] = tuple(entries)
+
+        self._init(
+            revision=revision,
+            sections=sections,
+            questions=questions,
+            by_id={q.id: q for q in questions},
+            metadata=tuple(q for q in questions if q.is_metadata),
+            _by_category={k: tuple(v) for k, v in by_category.items()},
+            _printable=printable,
+        )
+
+    def sections_in(self, category=None):
+        """Sektionen einer Kategorie ('immo' / 'onboarding'), None = alle."""
+        if category is None:
+            return self.sections
+        return self._by_category.get(category, ())
+
+    def printable(self, target_type=None):
+        """[(Immo-Sektion, druckbare Fragen)] für einen Objekt-Typ - leere Sektionen fehlen."""
+        return self._printable.get(target_type, ())
+
+    def config(self, category=None):
+        return [{"id": sec.id, "title": sec.title, "is_expanded": sec.is_expanded,
+                 "content": [q.config() for q in sec.questions]}
+                for sec in self.sections_in(category)]
+
+    def snapshot(self, category=CATEGORY_IMMO):
+        return [{"id": sec.id, "title": sec.title, "is_expanded": sec.is_expanded,
+                 "questions": [q.snapshot() for q in sec.questions]}
+                for sec in self.sections_in(category)]
+
+
+# ==============================================================================
+# AUFBAU
+# ==============================================================================
+
+def _compile():
+    current = revision()
+    sections = db.session.execute(
+        select(*[getattr(ImmoSection, f) for f in SECTION_FIELDS]).order_by(ImmoSection.order)
+    ).all()
+    grouped = {}
+    for row in db.session.execute(
+            select(*[getattr(ImmoQuestion, f) for f in QUESTION_FIELDS]).order_by(ImmoQuestion.order)):
+        grouped.setdefault(row.section_id, []).append(Question(**row._asdict()))
+    return FormSchema([Section(grouped.get(row.id, ()), **row._asdict()) for row in sections], current)
+
+
+_schema = GenerationCache(REVISION_CACHE, _compile)
+
+
+def get():
+    """Das aktuelle Schema (wird nur nach einem Speichern neu aufgebaut)."""
+    return _schema.get()
+
+
+def from_snapshot(data):
+    """Schema aus einem Projekt-Snapshot (form_config) - für PDFs alter Projekte."""
+    sections = []
+    for sec_idx, sec in enumerate(data or []):
+        questions = []
+        for q_idx, q in enumerate(sec.get('questions') or []):
+            values = {f: q.get(f) for f in QUESTION_FIELDS}
+            values.update(section_id=sec.get('id'), order=q_idx,
+                          is_print=q.get('is_print', True), is_metadata=q.get('is_metadata', False))
+            questions.append(Question(**values))
+        sections.append(Section(questions, id=sec.get('id'), title=sec.get('title', ''), order=sec_idx,
+                                is_expanded=sec.get('is_expanded', True), category=sec.get('category', CATEGORY_IMMO)))
+    return FormSchema(sections)
@@ -0,0 +1,311 @@
+"""
+Speichern der Formular-Struktur (ImmoSection / ImmoQuestion) per Diff.
+
+- Der aktuelle Stand wird mit EINER Abfrage geladen (Sektionen + Fragen).
+- Der übergebene Baum (Formbuilder, Onboarding-Editor oder questions.json) wird auf dieselben
+  Spalten abgebildet und verglichen. Geschrieben werden nur neue, geänderte,
+  verschobene und entfernte Zeilen - per Bulk-INSERT/UPDATE/DELETE.
+- options/types werden inhaltlich verglichen, ein anders formatierter
+  JSON-String allein zählt nicht als Änderung.
+- Commit macht der Aufrufer. Danach bump_revision(), damit Clients
+  (ETag auf /projects/config und /formbuilder/onboarding/config) die neue Struktur laden.
+"""
+import json
+import uuid
+from flask import jsonify, make_response, request
+from sqlalchemy import delete, insert, select, update
+from app import cache
+from app.extensions import db
+from app.models import ImmoSection, ImmoQuestion
+
+CATEGORY_IMMO = 'immo'
+CATEGORY_ONBOARDING = 'onboarding'
+
+# Name des Generationszählers; ändert sich bei jedem Speichern mit Änderungen
+REVISION_CACHE = 'form_schema'
+
+SOURCE_BUILDER = 'builder'
+SOURCE_QUESTIONS_JSON = 'questions_json'
+SOURCE_ONBOARDING = 'onboarding'
+
+SECTION_COLUMNS = ('id', 'title', 'order', 'is_expanded', 'category')
+QUESTION_COLUMNS = ('id', 'section_id', 'label', 'type', 'width', 'width_tablet', 'width_mobile',
+                    'tooltip', 'options_json', 'types_json', 'order', 'is_required', 'is_metadata',
+                    'is_print')
+JSON_COLUMNS = ('options_json', 'types_json')
+
+
+# ==============================================================================
+# REVISION
+# ==============================================================================
+
+def revision():
+    """Kurzer Stempel der aktuellen Formular-Revision (für ETags)."""
+    _path, inode, mtime = cache.generation(REVISION_CACHE)
+    return f"{inode:x}-{mtime:x}"
+
+
+def bump_revision():
+    cache.bump(REVISION_CACHE)
+
+
+def conditional_json(build):
+    """
+    JSON-Antwort mit der Revision als ETag. Kennt der Browser den Stand schon,
+    gibt es ein 304, ohne build() (und damit die DB) anzufassen.
+    """
+    etag = revision()
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# ==============================================================================
+# EINGANGSFORMATE
+# ==============================================================================
+
+def _list(value):
+    return value if isinstance(value, list) else []
+
+
+def _builder_section(data, idx):
+    return {
+        'id': data.get('id'),
+        'title': data.get('title', 'Unbenannt'),
+        'is_expanded': data.get('is_expanded', True),
+        'order': idx,
+    }
+
+
+def _builder_question(data, idx, section_id):
+    # Das JavaScript sendet "is_required", die questions.json oft nur "required"
+    is_print = data.get('is_print')
+    if is_print is None:
+        is_print = data.get('print', True)  # Fallback für alte JSONs
+    return {
+        'id': data.get('id'),
+        'label': data.get('label', ''),
+        'type': data.get('type', 'text'),
+        'width': data.get('width', 'half'),
+        'width_tablet': data.get('width_tablet', 'default'),
+        'width_mobile': data.get('width_mobile', 'default'),
+        'tooltip': data.get('tooltip', ''),
+        'order': idx,
+        'is_required': bool(data.get('is_required') or data.get('required')),
+        'is_metadata': bool(data.get('is_metadata') or data.get('metadata')),
+        'is_print': bool(is_print),
+        'options_json': json.dumps(_list(data.get('options', []))),
+        'types_json': json.dumps(_list(data.get('types', []))),
+    }
+
+
+def _onboarding_section(data, idx):
+    # Neue Sektionen ohne ID bekommen eine, bestehende behalten ihre
+    return dict(_builder_section(data, idx), id=data.get('id') or str(uuid.uuid4()),
+                title=data.get('title', 'Neue Sektion'))
+
+
+def _onboarding_question(data, idx, section_id):
+    row = _builder_question(data, idx, section_id)
+    row['id'] = row['id'] or str(uuid.uuid4())
+    if 'types' not in data:
+        row['types_json'] = json.dumps(['einzel'])
+    return row
+
+
+def _import_section(data, idx):
+    # Falls die ID fehlt, generieren wir eine (sollte im JSON aber da sein)
+    return {
+        'id': data.get('id', f"sec_{idx}"),
+        'title': data.get('title', 'Unbenannt'),
+        'order': idx,
+    }
+
+
+def _import_question(data, idx, section_id):
+    options = data.get('options', [])
+    types = data.get('types', [])
+    is_print = data.get('is_print')
+    return {
+        # Header/Infos ohne ID bekommen eine aus Sektion + Position
+        'id': data.get('id') or f"{section_id}_q_{idx}",
+        'label': data.get('label'),
+        'type': data.get('type'),
+        'width': data.get('width', 'full'),
+        'tooltip': data.get('tooltip', ''),
+        'order': idx,
+        'is_required': bool(data.get('required', False)),
+        'is_metadata': bool(data.get('metadata', False)),
+        'is_print': True if is_print is None else bool(is_print),
+        'options_json': json.dumps(options) if options else None,
+        'types_json': json.dumps(types) if types else None,
+    }
+
+
+# Pro Format: (Sektion, Frage). Jede Funktion liefert nur die Spalten, die das Format
+# verwaltet - alles andere bleibt bei bestehenden Zeilen unangetastet.
+SOURCES = {
+    SOURCE_BUILDER: (_builder_section, _builder_question),
+    SOURCE_QUESTIONS_JSON: (_import_section, _import_question),
+    SOURCE_ONBOARDING: (_onboarding_section, _onboarding_question),
+}
+
+
+# ==============================================================================
+# DIFF
+# ==============================================================================
+
+class ChangeSummary:
+    """Was ein Speichern geändert hat (Zähler pro Tabelle)."""
+
+    def __init__(self):
+        self.sections = 0           # übergebene Sektionen
+        self.questions = 0          # übergebene Fragen
+        self.sections_created = 0
+        self.sections_updated = 0
+        self.sections_deleted = 0
+        self.questions_created = 0
+        self.questions_updated = 0
+        self.questions_moved = 0    # nur Reihenfolge / Sektion geändert
+        self.questions_deleted = 0
+
+    @property
+    def changed(self):
+        return any((self.sections_created, self.sections_updated, self.sections_deleted,
+                    self.questions_created, self.questions_updated, self.questions_moved,
+                    self.questions_deleted))
+
+    def as_dict(self):
+        return dict(vars(self), changed=self.changed)
+
+    def summary(self):
+        if not self.changed:
+            return f"{self.sections} Sektionen, {self.questions} Fragen: keine Änderungen"
+        return (f"{self.sections} Sektionen, {self.questions} Fragen - "
+                f"Sektionen: {self.sections_created} neu, {self.sections_updated} geändert, "
+                f"{self.sections_deleted} gelöscht; "
+                f"Fragen: {self.questions_created} neu, {self.questions_updated} geändert, "
+                f"{self.questions_moved} verschoben, {self.questions_deleted} gelöscht")
+
+
+def _load():
+    """Aktueller Stand in einer Abfrage: ({Sektion-ID: Werte}, {Frage-ID: Werte})."""
+    columns = [getattr(ImmoSection, c) for c in SECTION_COLUMNS]
+    columns += [getattr(ImmoQuestion, c).label(f"q_{c}") for c in QUESTION_COLUMNS]
+    stmt = select(*columns).outerjoin(ImmoQuestion, ImmoQuestion.section_id == ImmoSection.id)
+
+    sections, questions = {}, {}
+    for row in db.session.execute(stmt).mappings():
+        sections.setdefault(row['id'], {c: row[c] for c in SECTION_COLUMNS})
+        if row['q_id'] is not None:
+            questions[row['q_id']] = {c: row[f"q_{c}"] for c in QUESTION_COLUMNS}
+    return sections, questions
+
+
+def _decode(value):
+    try:
+        return json.loads(value) if value else []
+    except ValueError:
+        return value
+
+
+def _same(column, old, new):
+    if old == new:
+        return True
+    if column in JSON_COLUMNS:
+        return _decode(old) == _decode(new)
+    return False
+
+
+def _changes(current, row):
+    return {k: v for k, v in row.items() if not _same(k, current.get(k), v)}
+
+
+def apply(tree, source=SOURCE_BUILDER, category=CATEGORY_IMMO, delete_missing=True):
+    """
+    Gleicht die DB mit dem übergebenen Baum ab (Liste von Sektionen mit 'content').
+
+    delete_missing: Fragen, die in einer übergebenen Sektion fehlen, und Sektionen
+    der category, die gar nicht übergeben wurden, werden gelöscht.
+    Neue Sektionen bekommen category; bestehende behalten ihre.
+    Commit macht der Aufrufer. Gibt eine ChangeSummary zurück.
+    """
+    to_section, to_question = SOURCES[source]
+    summary = ChangeSummary()
+    sections, questions = _load()
+
+    # Übergebenen Baum flach machen (doppelte IDs: letzter Eintrag gewinnt)
+    new_sections, new_questions = {}, {}
+    for sec_idx, sec_data in enumerate(tree or []):
+        sec = to_section(sec_data, sec_idx)
+        if not sec['id']:
+            continue  # Ohne ID überspringen wir
+        new_sections[sec['id']] = sec
+        for q_idx, q_data in enumerate(sec_data.get('content') or []):
+            q = to_question(q_data, q_idx, sec['id'])
+            if not q['id']:
+                continue
+            q['section_id'] = sec['id']
+            new_questions[q['id']] = q
+    summary.sections = len(new_sections)
+    summary.questions = len(new_questions)
+
+    section_inserts, section_updates = [], []
+    for sec_id, sec in new_sections.items():
+        current = sections.get(sec_id)
+        if current is None:
+            section_inserts.append(dict(sec, category=category))
+            continue
+        changes = _changes(current, sec)
+        if changes:
+            section_updates.append(dict(changes, id=sec_id))
+
+    question_inserts, question_updates = [], []
+    for q_id, q in new_questions.items():
+        current = questions.get(q_id)
+        if current is None:
+            question_inserts.append(q)
+            continue
+        changes = _changes(current, q)
+        if not changes:
+            continue
+        question_updates.append(dict(changes, id=q_id))
+        if changes.keys() <= {'order', 'section_id'}:
+            summary.questions_moved += 1
+        else:
+            summary.questions_updated += 1
+
+    section_deletes, question_deletes = [], []
+    if delete_missing:
+        section_deletes = [sec_id for sec_id, sec in sections.items()
+                           if sec['category'] == category and sec_id not in new_sections]
+        # Fragen aus übergebenen oder gelöschten Sektionen, die nicht mehr vorkommen
+        scope = set(new_sections) | set(section_deletes)
+        question_deletes = [q_id for q_id, q in questions.items()
+                            if q['section_id'] in scope and q_id not in new_questions]
+
+    if section_inserts:
+        db.session.execute(insert(ImmoSection), section_inserts)
+    if section_updates:
+        db.session.execute(update(ImmoSection), section_updates)
+    if question_inserts:
+        db.session.execute(insert(ImmoQuestion), question_inserts)
+    if question_updates:
+        db.session.execute(update(ImmoQuestion), question_updates)
+    if question_deletes:
+        db.session.execute(delete(ImmoQuestion).where(ImmoQuestion.id.in_(question_deletes))
+                           .execution_options(synchronize_session=False))
+    if section_deletes:
+        db.session.execute(delete(ImmoSection).where(ImmoSection.id.in_(section_deletes))
+                           .execution_options(synchronize_session=False))
+
+    summary.sections_created = len(section_inserts)
+    summary.sections_updated = len(section_updates)
+    summary.sections_deleted = len(section_deletes)
+    summary.questions_created = len(question_inserts)
+    summary.questions_deleted = len(question_deletes)
+    return summary
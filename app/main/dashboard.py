@@ -0,0 +1,76 @@
+"""
+Daten für das Dashboard (main.home).
+
+- Kacheln: einmal pro Prozess geladen, die sichtbare Liste wird pro
+  Berechtigungs-Bitmaske gemerkt.
+- Badges: alle Zähler in EINER Aggregat-Abfrage.
+"""
+from sqlalchemy import func, select
+from app.cache import GenerationCache
+from app.extensions import db
+from app.models import DashboardTile, Inspection, User, Permission, SiteContent
+
+TILE_FIELDS = ('id', 'title', 'description', 'icon', 'color_hex', 'route_name', 'order', 'required_permission_id')
+
+
+def _load_tiles():
+    columns = [getattr(DashboardTile, f) for f in TILE_FIELDS]
+    rows = db.session.query(*columns).order_by(DashboardTile.order).all()
+    # 'visible' merkt sich die gefilterte Liste pro (Admin, Bitmaske)
+    return {'tiles': [dict(zip(TILE_FIELDS, r)) for r in rows], 'visible': {}}
+
+
+_tiles = GenerationCache('dashboard_tiles', _load_tiles)
+
+
+def invalidate_tiles():
+    _tiles.invalidate()
+
+
+def visible_tiles(user):
+    """Liste der Kacheln (als Dicts), die der User sehen darf."""
+    data = _tiles.get()
+    key = (bool(user.is_admin), user.permission_mask or 0)
+    tiles = data['visible'].get(key)
+    if tiles is None:
+        tiles = [
+            t for t in data['tiles']
+            if t['required_permission_id'] is None or
+            user.has_mask(Permission.flag_for_id(t['required_permission_id']))
+        ]
+        data['visible'][key] = tiles
+    return tiles
+
+
+def badge_counts(user):
+    """Zählt neue Projekte / neue User mit EINER Abfrage. Roadmap kommt aus dem Cache."""
+    badges = {}
+
+    # --- 1. Neue/Geänderte Projekte (nur eigene) ---
+    # Wenn ich noch nie da war (last_projects_visit is None), ist ALLES neu.
+    proj_q = select(func.count(Inspection.id)).where(Inspection.user_id == user.id)
+    if user.last_projects_visit:
+        proj_q = proj_q.where(Inspection.updated_at > user.last_projects_visit)
+    columns = [proj_q.scalar_subquery()]
+
+    # --- 2. Neue User (nur mit Berechtigung) ---
+    show_users = user.has_permission('view_users')
+    if show_users:
+        user_q = select(func.count(User.id))
+        if user.last_users_visit:
+            user_q = user_q.where(User.created_at > user.last_users_visit)
+        columns.append(user_q.scalar_subquery())
+
+    row = db.session.execute(select(*columns)).one()
+    badges['projects.overview'] = row[0]
+    if show_users:
+        badges['user.list_users'] = row[1]
+
+    # --- 3. Roadmap Updates ---
+    roadmap = SiteContent.cached('roadmap')
+    if roadmap and roadmap.updated_at:
+        # Noch nie gesehen ODER Update neuer als mein Besuch -> "1" als Hinweis
+        if not user.last_roadmap_visit or roadmap.updated_at > user.last_roadmap_visit:
+            badges['roadmap.view_roadmap'] = 1
+
+    return badges
@@ -1,12 +1,12 @@
 import os
-import markdown
 from app.main import bp
 from datetime import datetime
 from flask import request, flash, redirect, url_for, current_app, render_template, send_from_directory, jsonify
 from flask_login import login_required, current_user
-from flask_mail import Message
-from app.extensions import db, mail
-from app.models import DashboardTile, Inspection, User, SiteContent, ImmoSetting, SystemSetting
+from app.extensions import db
+from app import outbox, settings
+from app.main import dashboard
+from app.rendering import render_markdown
 
 
 @bp.route('/home')
@@ -14,59 +14,12 @@ from app.models import DashboardTile, Inspection, User, SiteContent, ImmoSetting
 @login_required
 def home():
     """Dashboard / Startseite mit INTELLIGENTEN Badges."""
-    from app.models import DashboardTile, Inspection, User  # Import hier
+    # Kacheln kommen aus dem Cache, alle Badges aus EINER Abfrage (siehe dashboard.py)
+    badges = dashboard.badge_counts(current_user)
 
-    all_tiles = DashboardTile.query.order_by(DashboardTile.order).all()
-
-    badges = {}
-
-    # --- 1. BADGE: Neue/Geänderte Projekte ---
-    # Logik: Zähle alle Inspections, deren update-Datum NEUER ist als mein letzter Besuch
-    # Wenn ich noch nie da war (last_projects_visit is None), ist ALLES neu.
-
-    proj_query = Inspection.query
-    # Optional: Nur eigene filtern?
-    # proj_query = proj_query.filter_by(user_id=current_user.id)
-    # Aber meist will man wissen "Gibt es generell was neues?", also lassen wir den Filter weg oder passen ihn an.
-    # Wenn du nur DEINE Änderungen sehen willst:
-    proj_query = proj_query.filter_by(user_id=current_user.id)
-
-    if current_user.last_projects_visit:
-        new_projects = proj_query.filter(Inspection.updated_at > current_user.last_projects_visit).count()
-    else:
-        new_projects = proj_query.count()  # Alles ist neu beim ersten Mal
-
-    badges['projects.overview'] = new_projects
-
-    # --- 2. BADGE: Neue User (Nur für Admins) ---
-    if current_user.has_permission('view_users'):
-        user_query = User.query
-        if current_user.last_users_visit:
-            new_users = user_query.filter(User.created_at > current_user.last_users_visit).count()
-        else:
-            new_users = user_query.count()
-
-        badges['user.list_users'] = new_users
-
-    # --- 3. BADGE: Roadmap Updates ---
-    # Wir holen den Inhalt der Roadmap
-    roadmap_content = db.session.get(SiteContent, 'roadmap')
-
-    if roadmap_content and roadmap_content.updated_at:
-        # Check: Habe ich sie noch nie gesehen? ODER ist das Update neuer als mein Besuch?
-        if not current_user.last_roadmap_visit or roadmap_content.updated_at > current_user.last_roadmap_visit:
-            # Wir zeigen eine "1" an, um zu signalisieren: Hier gibt es was Neues
-            badges['roadmap.view_roadmap'] = 1
-
-
-    # --- Kacheln bauen ---
     visible_tiles = []
-    for tile in all_tiles:
-        if tile.required_permission is None or \
-                current_user.is_admin or \
-                current_user.has_permission(tile.required_permission.slug):
-            tile.badge_count = badges.get(tile.route_name, 0)
-            visible_tiles.append(tile)
+    for tile in dashboard.visible_tiles(current_user):
+        visible_tiles.append(dict(tile, badge_count=badges.get(tile['route_name'], 0)))
 
     return render_template('main/main.html', tiles=visible_tiles)
 
@@ -74,7 +27,7 @@ def home():
 @bp.route('/report_issue', methods=['POST'])
 @login_required
 def report_issue():
-    """Sendet Feedback per E-Mail an den Admin."""
+    """Legt Feedback als E-Mail an den Admin in die Outbox."""
     category = request.form.get('category')
     message_text = request.form.get('message')
     source_url = request.form.get('current_url', 'Unbekannt')  # <--- NEU
@@ -83,9 +36,8 @@ def report_issue():
         flash("Bitte eine Nachricht eingeben.", "warning")
         return redirect(request.referrer or url_for('main.home'))
 
-    # 1. Empfänger laden
-    setting = db.session.get(ImmoSetting, 'email_receiver')
-    receiver = setting.value if (setting and setting.value) else current_app.config.get('MAIL_DEFAULT_SENDER')
+    # 1. Empfänger laden (aus dem Settings-Cache)
+    receiver = settings.get('email_receiver', scope=settings.IMMO) or current_app.config.get('MAIL_DEFAULT_SENDER')
 
     if not receiver:
         flash("Keine Empfänger-E-Mail konfiguriert!", "danger")
@@ -111,11 +63,8 @@ KATEGORIE: {category}
 NACHRICHT:
 {message_text}
 """
-        msg = Message(subject, recipients=[receiver])
-        msg.body = body
-
-        # 3. Senden
-        mail.send(msg)
+        # 3. In die Outbox legen (Versand im Hintergrund)
+        outbox.enqueue(subject, [receiver], body)
         flash("Feedback wurde gesendet! Wir kümmern uns darum.", "success")
 
     except Exception as e:
@@ -138,7 +87,7 @@ def datenschutz():
 @bp.app_context_processor
 def inject_version():
     """Macht die Variable 'app_version' in allen Templates verfügbar."""
-    version = SystemSetting.get_value('app_version', '1.0.0')
+    version = settings.get('app_version', '1.0.0')
     return dict(app_version=version)
 
 
@@ -146,11 +95,11 @@ def inject_version():
 @bp.route('/versionshinweise', methods=['GET'])
 def changelog_view():
     """Zeigt die Patchnotes an."""
-    version = SystemSetting.get_value('app_version', '1.0.0')
-    raw_text = SystemSetting.get_value('changelog_text', '# Keine Patchnotes verfügbar.')
+    version = settings.get('app_version', '1.0.0')
+    raw_text = settings.get('changelog_text', '# Keine Patchnotes verfügbar.')
 
-    # Markdown in HTML wandeln
-    content_html = markdown.markdown(raw_text)
+    # Markdown in HTML wandeln (gecacht)
+    content_html = render_markdown(raw_text)
 
     return render_template('changelog.html', version=version, content_html=content_html)
 
@@ -162,8 +111,13 @@ def changelog_view():
 def update_changelog():
     data = request.json
     try:
-        SystemSetting.set_value('app_version', data.get('version'))
-        SystemSetting.set_value('changelog_text', data.get('text'))
+        # Beide Werte in EINER Transaktion speichern
+        settings.set_many({
+            'app_version': data.get('version'),
+            'changelog_text': data.get('text')
+        })
+        # HTML direkt vorrendern, damit der erste Besucher nicht wartet
+        render_markdown(data.get('text'))
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -173,8 +127,8 @@ def update_changelog():
 @login_required
 def get_changelog_settings():
     return jsonify({
-        'version': SystemSetting.get_value('app_version', '1.0.0'),
-        'text': SystemSetting.get_value('changelog_text', '')
+        'version': settings.get('app_version', '1.0.0'),
+        'text': settings.get('changelog_text', '')
     })
 
 
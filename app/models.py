@@ -1,9 +1,13 @@
+from collections import namedtuple
 from datetime import datetime, timedelta
 import jwt
 from time import time
 from flask import current_app
 from flask_login import UserMixin
-from app.extensions import db, login_manager
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+from app.cache import GenerationCache
+from app.extensions import db
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # --- KONSTANTEN ---
@@ -21,7 +25,9 @@ GERMAN_STATES = [
 
 user_permissions = db.Table('user_permissions',
                             db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
-                            db.Column('permission_id', db.Integer, db.ForeignKey('permission.id'), primary_key=True)
+                            db.Column('permission_id', db.Integer, db.ForeignKey('permission.id'), primary_key=True),
+                            # Für "Alle User mit Permission X" (PK deckt nur user_id zuerst ab)
+                            db.Index('ix_user_permissions_permission_id', 'permission_id')
                             )
 
 # Kreuzverbindung: Welche User sind Bereichsleiter für welche Vereine?
@@ -42,6 +48,73 @@ class Permission(db.Model):
     url = db.Column(db.String(200), nullable=True)
     background_image = db.Column(db.String(100), nullable=True)
 
+    # Bit-Position in User.permission_mask (bevorzugt id - 1, vergeben beim Flush)
+    bit = db.Column(db.Integer, unique=True)
+
+    @property
+    def flag(self):
+        return (1 << self.bit) if self.bit is not None else 0
+
+    @staticmethod
+    def flag_for(slug):
+        """Bitmaske für einen Slug (0, wenn unbekannt) - aus dem Cache, ohne Query."""
+        return _permission_meta.get()['slug'].get(slug, 0)
+
+    @staticmethod
+    def flag_for_id(permission_id):
+        return _permission_meta.get()['id'].get(permission_id, 0)
+
+    @staticmethod
+    def background_for(lookup_slug):
+        """Hintergrundbild der ersten Permission, deren Slug lookup_slug enthält."""
+        for slug, background in _permission_meta.get()['backgrounds']:
+            if slug and lookup_slug in slug:
+                return background
+        return None
+
+    @staticmethod
+    def invalidate_flags():
+        _permission_meta.invalidate()
+
+
+def _load_permission_meta():
+    meta = {'slug': {}, 'id': {}, 'backgrounds': []}
+    rows = db.session.query(Permission.id, Permission.slug, Permission.bit, Permission.background_image) \
+        .order_by(Permission.id)
+    for p_id, slug, bit, background in rows:
+        meta['backgrounds'].append((slug, background))
+        if bit is None: continue
+        meta['slug'][slug] = 1 << bit
+        meta['id'][p_id] = 1 << bit
+    return meta
+
+
+_permission_meta = GenerationCache('permission_meta', _load_permission_meta)
+
+
+# Höchste Bit-Position: permission_mask ist ein vorzeichenbehafteter 64-Bit-Integer
+MAX_PERMISSION_BIT = 62
+
+
+def _assign_permission_bits(session, permissions):
+    """
+    Vergibt freie Bit-Positionen (bevorzugt id - 1). Bits gelöschter Permissions werden
+    wiederverwendet, mehr als MAX_PERMISSION_BIT + 1 Permissions sind nicht möglich.
+    """
+    used = set(session.scalars(db.select(Permission.bit).where(Permission.bit.isnot(None))))
+    used.update(o.bit for o in session.new if isinstance(o, Permission) and o.bit is not None)
+    for permission in permissions:
+        preferred = permission.id - 1 if permission.id is not None else None
+        if preferred is not None and 0 <= preferred <= MAX_PERMISSION_BIT and preferred not in used:
+            bit = preferred
+        else:
+            bit = next((b for b in range(MAX_PERMISSION_BIT + 1) if b not in used), None)
+        if bit is None:
+            raise ValueError(f"Keine freie Bit-Position für Permission '{permission.slug}' "
+                             f"(maximal {MAX_PERMISSION_BIT + 1} Permissions).")
+        permission.bit = bit
+        used.add(bit)
+
 
 class StatusDefinition(db.Model):
     """
@@ -58,19 +131,73 @@ class StatusDefinition(db.Model):
     context = db.Column(db.String(20), nullable=False)  # z.B. 'verein', 'anbau'
     position = db.Column(db.Integer, default=0)  # Für die Sortierung
 
+    NO_STATUS_LABEL = "Kein Status"
+    NO_STATUS_CSS = "background-color: #6c757d; color: white;"
+
     def get_color_css(self, total_steps):
+        return StatusDefinition.color_css(self.position, total_steps)
+
+    @staticmethod
+    def color_css(position, total_steps):
         """Berechnet dynamisch eine Farbe von Rot (0) bis Grün (100%)."""
         if total_steps <= 1:
             hue = 0
         else:
             # 0 = Rot, 120 = Grün.
             # Wir normalisieren die Position auf 0.0 bis 1.0
-            percent = self.position / (total_steps - 1)
+            percent = (position or 0) / (total_steps - 1)
             hue = int(percent * 120)
 
         # HSL Rückgabe für CSS (Sättigung 70%, Helligkeit 45%)
         return f"background-color: hsl({hue}, 70%, 45%); color: white;"
 
+    # --- Registry (Prozess-Cache, keine Query pro Badge) ---
+
+    @staticmethod
+    def status_registry(context):
+        """{'ids': [...sortiert], 'names': {id: name}, 'css': {id: css}} für einen Kontext."""
+        return _status_registry.get()['contexts'].get(context, {'ids': [], 'names': {}, 'css': {}})
+
+    @staticmethod
+    def label_for(status_id):
+        entry = _status_registry.get()['by_id'].get(status_id)
+        return entry[0] if entry else StatusDefinition.NO_STATUS_LABEL
+
+    @staticmethod
+    def css_for(status_id):
+        entry = _status_registry.get()['by_id'].get(status_id)
+        return entry[1] if entry else StatusDefinition.NO_STATUS_CSS
+
+    @staticmethod
+    def invalidate_registry():
+        _status_registry.invalidate()
+
+
+def _load_status_registry():
+    rows = db.session.query(StatusDefinition.id, StatusDefinition.name, StatusDefinition.context,
+                            StatusDefinition.position) \
+        .order_by(StatusDefinition.context, StatusDefinition.position).all()
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.context, []).append(row)
+
+    registry = {'contexts': {}, 'by_id': {}}
+    for context, items in grouped.items():
+        total = len(items)
+        entry = {'ids': [], 'names': {}, 'css': {}}
+        for s in items:
+            css = StatusDefinition.color_css(s.position, total)
+            entry['ids'].append(s.id)
+            entry['names'][s.id] = s.name
+            entry['css'][s.id] = css
+            registry['by_id'][s.id] = (s.name, css)
+        registry['contexts'][context] = entry
+    return registry
+
+
+_status_registry = GenerationCache('status_registry', _load_status_registry)
+
 
 class Anbaustelle(db.Model):
     __tablename__ = 'anbaustelle'
@@ -84,6 +211,9 @@ class Anbaustelle(db.Model):
     state = db.Column(db.String(50))  # Bundesland Dropdown Value
     anbau_type = db.Column(db.String(20), default=TYPE_SINGLE)
 
+    # NOCASE-Index für die Präfix-Suche (LIKE 'abc%' nutzt ihn in SQLite)
+    __table_args__ = (db.Index('ix_anbaustelle_name_nocase', db.collate(name, 'NOCASE')),)
+
     # Relation: Eine Anbaustelle kann mehrere Vereine beherbergen (Cluster)
     vereine = db.relationship('Verein', backref='anbaustelle', lazy=True)
 
@@ -93,17 +223,12 @@ class Anbaustelle(db.Model):
 
     @property
     def status_label(self):
-        return self.status_rel.name if self.status_rel else "Kein Status"
+        return StatusDefinition.label_for(self.status_id)
 
     @property
     def status_color_css(self):
-        if not self.status_rel:
-            return "background-color: #6c757d; color: white;"
-
-        # Wir müssen wissen, wie viele Schritte es insgesamt in diesem Kontext gibt
-        # Das ist performancetechnisch nicht ideal direkt im Model, aber für kleine Mengen ok.
-        total = db.session.query(StatusDefinition).filter_by(context='anbau').count()
-        return self.status_rel.get_color_css(total)
+        # Farbe kommt vorberechnet aus der Status-Registry (keine Query pro Zeile)
+        return StatusDefinition.css_for(self.status_id)
 
 
 class Verein(db.Model):
@@ -136,17 +261,51 @@ class Verein(db.Model):
     managers = db.relationship('User', secondary=verein_bereichsleitung,
                                backref=db.backref('managed_vereine', lazy=True))
 
+    MANAGER_ADD = 'add'
+    MANAGER_REMOVE = 'remove'
+    MANAGER_REPLACE = 'replace'
+    MANAGER_MODES = (MANAGER_ADD, MANAGER_REMOVE, MANAGER_REPLACE)
+
+    @staticmethod
+    def assign_managers(verein_ids, user_ids, mode=MANAGER_REPLACE):
+        """
+        Bereichsleitung für viele Vereine auf einmal setzen - mengenbasiert per
+        DELETE / INSERT ... SELECT auf verein_bereichsleitung (statt Objekt für Objekt).
+        Bereits geladene managers-Listen sind danach veraltet; Commit macht der Aufrufer.
+        """
+        if mode not in Verein.MANAGER_MODES:
+            raise ValueError(f"Unbekannter Modus: {mode}")
+        verein_ids = [int(i) for i in verein_ids]
+        user_ids = [int(i) for i in user_ids]
+        if not verein_ids:
+            return
+
+        link = verein_bereichsleitung
+        if mode == Verein.MANAGER_REMOVE or mode == Verein.MANAGER_REPLACE:
+            stmt = link.delete().where(link.c.verein_id.in_(verein_ids))
+            if mode == Verein.MANAGER_REMOVE:
+                if not user_ids:
+                    return
+                stmt = stmt.where(link.c.user_id.in_(user_ids))
+            elif user_ids:
+                # Zuordnungen, die bleiben, werden nicht gelöscht und neu angelegt
+                stmt = stmt.where(~link.c.user_id.in_(user_ids))
+            db.session.execute(stmt)
+
+        if mode != Verein.MANAGER_REMOVE and user_ids:
+            # Alle (Verein, User)-Paare, die es noch nicht gibt - unbekannte IDs fallen über die Joins raus
+            exists_already = db.exists().where(link.c.verein_id == Verein.id, link.c.user_id == User.id)
+            pairs = db.select(Verein.id, User.id).join(User, User.id.in_(user_ids)) \
+                .where(Verein.id.in_(verein_ids), ~exists_already)
+            db.session.execute(link.insert().from_select(['verein_id', 'user_id'], pairs))
+
     @property
     def status_label(self):
-        return self.status_rel.name if self.status_rel else "Kein Status"
+        return StatusDefinition.label_for(self.status_id)
 
     @property
     def status_color_css(self):
-        if not self.status_rel:
-            return "background-color: #6c757d; color: white;"
-
-        total = db.session.query(StatusDefinition).filter_by(context='verein').count()
-        return self.status_rel.get_color_css(total)
+        return StatusDefinition.css_for(self.status_id)
 
 
 class Ausgabestelle(db.Model):
@@ -157,6 +316,11 @@ class Ausgabestelle(db.Model):
     address = db.Column(db.String(255))
     state = db.Column(db.String(50))
 
+    __table_args__ = (
+        db.Index('ix_ausgabestelle_address_nocase', db.collate(address, 'NOCASE')),
+        db.Index('ix_ausgabestelle_name_nocase', db.collate(name, 'NOCASE')),
+    )
+
     verein_id = db.Column(db.Integer, db.ForeignKey('verein.id'), nullable=False)
     verein = db.relationship('Verein', backref='ausgabestellen', lazy=True)
 
@@ -166,15 +330,11 @@ class Ausgabestelle(db.Model):
 
     @property
     def status_label(self):
-        return self.status_rel.name if self.status_rel else "Kein Status"
+        return StatusDefinition.label_for(self.status_id)
 
     @property
     def status_color_css(self):
-        if not self.status_rel:
-            return "background-color: #6c757d; color: white;"
-
-        total = db.session.query(StatusDefinition).filter_by(context='ausgabe').count()
-        return self.status_rel.get_color_css(total)
+        return StatusDefinition.css_for(self.status_id)
 
 
 class User(UserMixin, db.Model):
@@ -192,9 +352,17 @@ class User(UserMixin, db.Model):
     last_roadmap_visit = db.Column(db.DateTime)
     onboarding_confirmed_at = db.Column(db.DateTime, nullable=True)
 
-    # Permissions
-    permissions = db.relationship('Permission', secondary=user_permissions, lazy='subquery',
+    # NOCASE-Indizes für die Präfix-Suche (Typeahead)
+    __table_args__ = (
+        db.Index('ix_user_username_nocase', db.collate(username, 'NOCASE')),
+        db.Index('ix_user_first_name_nocase', db.collate(first_name, 'NOCASE')),
+        db.Index('ix_user_last_name_nocase', db.collate(last_name, 'NOCASE')),
+    )
+
+    # Permissions (die Liste ist die Quelle, permission_mask die materialisierte Bitmaske)
+    permissions = db.relationship('Permission', secondary=user_permissions, lazy=True,
                                   backref=db.backref('users', lazy=True))
+    permission_mask = db.Column(db.BigInteger, default=0, nullable=False)
 
     # NEU: Ein User kann Mitglied in EINEM Verein sein
     verein_id = db.Column(db.Integer, db.ForeignKey('verein.id'), nullable=True)
@@ -203,7 +371,22 @@ class User(UserMixin, db.Model):
     def has_permission(self, slug_name):
         if self.is_admin:
             return True
-        return any(p.slug == slug_name for p in self.permissions)
+        return bool((self.permission_mask or 0) & Permission.flag_for(slug_name))
+
+    def has_mask(self, flags):
+        """Prüft eine fertige Bitmaske (z.B. Permission.flag_for_id(...))."""
+        return self.is_admin or bool((self.permission_mask or 0) & flags)
+
+    def recompute_permission_mask(self):
+        mask = 0
+        for p in self.permissions:
+            mask |= p.flag
+        self.permission_mask = mask
+
+    @staticmethod
+    def with_permission(slug_name):
+        """Query: alle User mit dieser Permission (über den Index auf user_permissions)."""
+        return User.query.join(user_permissions).join(Permission).filter(Permission.slug == slug_name)
 
     def get_reset_token(self, expires_sec=1800):
         return jwt.encode(
@@ -249,6 +432,49 @@ class User(UserMixin, db.Model):
         return self.username
 
 
+# permission_mask vor jedem Flush aus User.permissions neu berechnen. Erst hier (und nicht
+# im append-Event) haben neue Permissions sicher ein Bit.
+@event.listens_for(Session, 'before_flush')
+def _sync_permission_masks(session, flush_context, instances):
+    pending = list(session.new) + list(session.dirty)
+    unassigned = [o for o in pending if isinstance(o, Permission) and o.bit is None]
+    if unassigned:
+        _assign_permission_bits(session, unassigned)
+
+    users = set()
+    for obj in pending:
+        if isinstance(obj, User):
+            if attributes.get_history(obj, 'permissions').has_changes():
+                users.add(obj)
+        elif isinstance(obj, Permission):
+            history = attributes.get_history(obj, 'users')
+            users.update(history.added)
+            users.update(history.deleted)
+    for user in users:
+        if user not in session.deleted:
+            user.recompute_permission_mask()
+
+
+# Gelöschte Permissions: ihr Bit aus allen Masken entfernen, bevor es neu vergeben wird
+@event.listens_for(Session, 'after_flush')
+def _release_permission_bits(session, flush_context):
+    flags = 0
+    for obj in session.deleted:
+        if isinstance(obj, Permission):
+            flags |= obj.flag
+    if not flags:
+        return
+    user_table = User.__table__
+    affected = user_table.c.permission_mask.op('&')(flags) != 0
+    user_ids = session.connection().execute(db.select(user_table.c.id).where(affected)).scalars().all()
+    session.connection().execute(
+        db.update(user_table).where(affected)
+        .values(permission_mask=user_table.c.permission_mask.op('&')(~flags))
+    )
+    # Gecachte User-Snapshots nach dem Commit verwerfen (siehe app/user_cache.py)
+    session.info.setdefault('changed_user_ids', set()).update(user_ids)
+
+
 class ImmoSetting(db.Model):
     key = db.Column(db.String(50), primary_key=True)
     value = db.Column(db.Text)
@@ -283,9 +509,17 @@ class ImmoQuestion(db.Model):
 
 class ImmoBackup(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     name = db.Column(db.String(100))
-    data_json = db.Column(db.Text)
+    # Inhalt liegt (komprimiert, einmal pro Stand) in ImmoBackupBlob
+    content_hash = db.Column(db.String(64), db.ForeignKey('immo_backup_blob.content_hash'), nullable=False)
+    blob = db.relationship('ImmoBackupBlob')
+
+
+class ImmoBackupBlob(db.Model):
+    content_hash = db.Column(db.String(64), primary_key=True)  # SHA-256 des JSON
+    data = db.Column(db.LargeBinary, nullable=False)           # zlib-komprimiertes JSON
+    size = db.Column(db.Integer)                               # unkomprimierte Größe (Bytes)
 
 
 class SiteContent(db.Model):
@@ -295,6 +529,26 @@ class SiteContent(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     author = db.relationship('User', backref='content_updates')
 
+    @staticmethod
+    def cached(content_id):
+        """Schreibgeschützter Snapshot (content, updated_at, user_id) aus dem Prozess-Cache."""
+        return _site_content.get().get(content_id)
+
+    @staticmethod
+    def invalidate_cache():
+        _site_content.invalidate()
+
+
+SiteContentSnapshot = namedtuple('SiteContentSnapshot', ['id', 'content', 'updated_at', 'user_id'])
+
+
+def _load_site_content():
+    rows = db.session.query(SiteContent.id, SiteContent.content, SiteContent.updated_at, SiteContent.user_id)
+    return {r[0]: SiteContentSnapshot(*r) for r in rows}
+
+
+_site_content = GenerationCache('site_content', _load_site_content)
+
 
 class DashboardTile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -357,7 +611,7 @@ class Inspection(db.Model):
 
 class InspectionLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    inspection_id = db.Column(db.Integer, db.ForeignKey('inspection.id'), nullable=False)
+    inspection_id = db.Column(db.Integer, db.ForeignKey('inspection.id'), nullable=False, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     action = db.Column(db.String(50))
@@ -401,25 +655,68 @@ class MarketStat(db.Model):
         return m_app - (m_ok + m_rej + m_wd)
 
 
+class MarketStatSnapshot(db.Model):
+    """
+    Verlauf der MarketStat-Zahlen. Eine Zeile pro Bundesland und Änderung
+    (nur geänderte Länder bekommen bei einem Sync eine neue Zeile).
+    """
+    __table_args__ = (
+        db.Index('ix_market_stat_snapshot_state_date', 'state_name', 'data_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    state_name = db.Column(db.String(50), nullable=False)
+    # Stichtag der Quelle (MarketStat.data_date als Datum), sonst Tag der Aufnahme
+    data_date = db.Column(db.Date, nullable=False)
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    applied = db.Column(db.Integer, default=0)
+    approved = db.Column(db.Integer, default=0)
+    rejected = db.Column(db.Integer, default=0)
+    withdrawn = db.Column(db.Integer, default=0)
+
+    mariana_applied = db.Column(db.Integer, default=0)
+    mariana_approved = db.Column(db.Integer, default=0)
+    mariana_rejected = db.Column(db.Integer, default=0)
+    mariana_withdrawn = db.Column(db.Integer, default=0)
+
+
+class MailOutbox(db.Model):
+    """Ausgehende E-Mails. Der Request legt nur an, verschickt wird im Hintergrund (app/outbox.py)."""
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'  # nach MAIL_OUTBOX_MAX_ATTEMPTS Versuchen aufgegeben
+
+    __table_args__ = (db.Index('ix_mail_outbox_status_due', 'status', 'next_attempt_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(255))
+    recipients = db.Column(db.Text, nullable=False)  # JSON-Liste
+    body = db.Column(db.Text)
+
+    status = db.Column(db.String(20), default=STATUS_PENDING, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Ein Sender "reserviert" Zeilen, damit mehrere Worker nichts doppelt verschicken
+    claim = db.Column(db.String(36))
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    sent_at = db.Column(db.DateTime)
+
+
 class SystemSetting(db.Model):
     key = db.Column(db.String(50), primary_key=True)
     value = db.Column(db.Text)
 
+    # Lesen/Schreiben läuft über den gecachten Settings-Service (app/settings.py)
     @staticmethod
     def get_value(key, default=None):
-        setting = db.session.get(SystemSetting, key)
-        return setting.value if setting else default
+        from app import settings
+        return settings.get(key, default)
 
     @staticmethod
     def set_value(key, value):
-        setting = db.session.get(SystemSetting, key)
-        if not setting:
-            setting = SystemSetting(key=key)
-            db.session.add(setting)
-        setting.value = value
-        db.session.commit()
-
-
-@login_manager.user_loader
-def load_user(user_id):
-    return db.session.get(User, int(user_id))
\ No newline at end of file
+        from app import settings
+        settings.set_value(key, value)
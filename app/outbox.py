@@ -0,0 +1,264 @@
+"""
+Mail-Outbox: E-Mails werden im Request nur in MailOutbox abgelegt, verschickt
+wird im Hintergrund.
+
+- enqueue(): ein INSERT + Commit, danach wird der Sender-Thread geweckt.
+  Ein SMTP-Ausfall hält so keinen Request (und keinen Worker) mehr auf.
+- Der Sender holt fällige Mails in Batches (MAIL_OUTBOX_BATCH_SIZE) und
+  reserviert sie mit EINEM UPDATE (claim + locked_until) - mehrere
+  Gunicorn-Worker verschicken so nichts doppelt. Ein Batch läuft über EINE
+  SMTP-Verbindung.
+- Die SMTP-Verbindung hat einen Socket-Timeout (MAIL_OUTBOX_SMTP_TIMEOUT), und
+  nach der halben Lease-Zeit wird keine neue Mail mehr begonnen - ein langsamer
+  Server kann die Reservierung so nicht überdauern (sonst würde ein anderer
+  Worker den Batch übernehmen und doppelt senden). Der Rest geht zurück in die Queue.
+- Fehler: erneuter Versuch mit exponentiellem Backoff, nach
+  MAIL_OUTBOX_MAX_ATTEMPTS Versuchen status='failed' (last_error bleibt stehen).
+- Verschickte und aufgegebene Mails verlieren sofort ihren Text (Reset-Links!)
+  und werden nach MAIL_OUTBOX_KEEP_DAYS Tagen gelöscht (der Thread räumt
+  höchstens einmal pro PRUNE_INTERVAL auf, nicht bei jedem wake()).
+- Der Thread startet mit dem ersten Request im Prozess und schaut alle
+  MAIL_OUTBOX_POLL Sekunden nach fälligen Wiederholungen.
+  Alternativ (z.B. per Cron): `flask commands mail-send`.
+"""
+import json
+import logging
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Connection, Message
+from sqlalchemy import delete, or_, select, update
+from app.extensions import db
+from app.models import MailOutbox
+
+log = logging.getLogger(__name__)
+
+RETRY_BASE = 30    # Sekunden bis zum zweiten Versuch, danach jeweils doppelt so lang
+RETRY_MAX = 3600
+LEASE = 300        # so lange (Sekunden) gehört ein reservierter Batch einem Sender
+SEND_WINDOW = LEASE / 2  # danach wird im Batch keine neue Mail mehr begonnen
+PRUNE_INTERVAL = 3600  # so oft (Sekunden) räumt der Thread alte Einträge auf
+FINAL_STATUSES = (MailOutbox.STATUS_SENT, MailOutbox.STATUS_FAILED)
+
+
+def enqueue(subject, recipients, body, sender=None):
+    """Legt eine Mail in die Outbox (mit Commit) und weckt den Sender."""
+    entry = MailOutbox(subject=subject, recipients=json.dumps(list(recipients)), body=body,
+                       sender=sender or current_app.config.get('MAIL_DEFAULT_SENDER'))
+    db.session.add(entry)
+    db.session.commit()
+    _sender.wake(current_app._get_current_object())
+    return entry
+
+
+def backoff(attempts):
+    """Wartezeit nach dem attempts-ten Fehlversuch."""
+    return timedelta(seconds=min(RETRY_BASE * 2 ** max(attempts - 1, 0), RETRY_MAX))
+
+
+# ==============================================================================
+# VERSAND
+# ==============================================================================
+
+def _claim(batch_size, now):
+    """Reserviert bis zu batch_size fällige Mails für diesen Sender und gibt sie zurück."""
+    token = str(uuid.uuid4())
+    due = (select(MailOutbox.id)
+           .where(MailOutbox.status == MailOutbox.STATUS_PENDING,
+                  MailOutbox.next_attempt_at <= now,
+                  or_(MailOutbox.locked_until.is_(None), MailOutbox.locked_until < now))
+           .order_by(MailOutbox.id)
+           .limit(batch_size))
+    db.session.execute(update(MailOutbox).where(MailOutbox.id.in_(due))
+                       .values(claim=token, locked_until=now + timedelta(seconds=LEASE))
+                       .execution_options(synchronize_session=False))
+    db.session.commit()
+
+    columns = (MailOutbox.id, MailOutbox.subject, MailOutbox.sender, MailOutbox.recipients,
+               MailOutbox.body, MailOutbox.attempts)
+    return db.session.execute(select(*columns).where(MailOutbox.claim == token).order_by(MailOutbox.id)).all()
+
+
+class _Connection(Connection):
+    """flask_mail.Connection mit Socket-Timeout (Flask-Mail selbst setzt keinen)."""
+
+    def __init__(self, state, timeout):
+        super().__init__(state)
+        self.timeout = timeout
+
+    def configure_host(self):
+        smtp = smtplib.SMTP_SSL if self.mail.use_ssl else smtplib.SMTP
+        host = smtp(self.mail.server, self.mail.port, timeout=self.timeout)
+        host.set_debuglevel(int(self.mail.debug))
+        if self.mail.use_tls:
+            host.starttls()
+        if self.mail.username and self.mail.password:
+            host.login(self.mail.username, self.mail.password)
+        return host
+
+
+def _connect():
+    return _Connection(current_app.extensions['mail'], current_app.config.get('MAIL_OUTBOX_SMTP_TIMEOUT', 30))
+
+
+def _message(row):
+    return Message(row.subject, sender=row.sender, recipients=json.loads(row.recipients), body=row.body)
+
+
+def _failed(row, error, now, max_attempts):
+    attempts = row.attempts + 1
+    values = {'id': row.id, 'attempts': attempts, 'last_error': str(error)[:1000],
+              'claim': None, 'locked_until': None}
+    if attempts >= max_attempts:
+        values.update(status=MailOutbox.STATUS_FAILED, body=None)
+    else:
+        values['next_attempt_at'] = now + backoff(attempts)
+    return values
+
+
+def _sent(row):
+    return {'id': row.id, 'status': MailOutbox.STATUS_SENT, 'sent_at': datetime.utcnow(),
+            'attempts': row.attempts + 1, 'last_error': None, 'body': None,
+            'claim': None, 'locked_until': None}
+
+
+def _released(row):
+    # Nicht versucht (Lease-Zeit knapp) -> ohne Fehlversuch zurück in die Queue
+    return {'id': row.id, 'claim': None, 'locked_until': None}
+
+
+def _send_batch(rows, max_attempts):
+    """Verschickt rows über eine SMTP-Verbindung. Gibt die Updates pro Zeile zurück."""
+    results = {}
+    started = time.monotonic()
+    try:
+        with _connect() as connection:
+            for row in rows:
+                if time.monotonic() - started > SEND_WINDOW:
+                    break
+                try:
+                    connection.send(_message(row))
+                except Exception as e:
+                    log.warning(f"Mail {row.id} an {row.recipients} fehlgeschlagen: {e}")
+                    results[row.id] = _failed(row, e, datetime.utcnow(), max_attempts)
+                    continue
+                results[row.id] = _sent(row)
+    except Exception as e:
+        # Verbindung (Aufbau, Login, QUIT) fehlgeschlagen -> alles Offene später erneut
+        log.warning(f"SMTP-Verbindung fehlgeschlagen: {e}")
+        now = datetime.utcnow()
+        for row in rows:
+            results.setdefault(row.id, _failed(row, e, now, max_attempts))
+    for row in rows:
+        results.setdefault(row.id, _released(row))
+    return list(results.values())
+
+
+def prune(now=None):
+    """Löscht verschickte und aufgegebene Mails, die älter als MAIL_OUTBOX_KEEP_DAYS sind."""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=current_app.config.get('MAIL_OUTBOX_KEEP_DAYS', 7))
+    count = db.session.execute(
+        delete(MailOutbox).where(MailOutbox.status.in_(FINAL_STATUSES), MailOutbox.created_at < cutoff)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def drain(max_batches=None):
+    """
+    Verschickt alle fälligen Mails (Batch für Batch). Synchron - für den
+    Hintergrund-Thread, das CLI-Kommando und Tests (z.B. gegen aiosmtpd).
+    Gibt (verschickt, fehlgeschlagen) zurück.
+    """
+    batch_size = current_app.config.get('MAIL_OUTBOX_BATCH_SIZE', 20)
+    max_attempts = current_app.config.get('MAIL_OUTBOX_MAX_ATTEMPTS', 6)
+    sent = failed = batches = 0
+
+    while max_batches is None or batches < max_batches:
+        rows = _claim(batch_size, datetime.utcnow())
+        if not rows:
+            break
+        results = _send_batch(rows, max_attempts)
+        db.session.execute(update(MailOutbox), results)
+        db.session.commit()
+
+        batches += 1
+        released = 0
+        for r in results:
+            if r.get('status') == MailOutbox.STATUS_SENT:
+                sent += 1
+            elif 'last_error' in r:
+                failed += 1
+            else:
+                released += 1
+        # Batch nicht voll oder abgebrochen (langsamer Server) -> nächste Runde
+        if len(rows) < batch_size or released:
+            break
+    return sent, failed
+
+
+# ==============================================================================
+# HINTERGRUND-THREAD
+# ==============================================================================
+
+class OutboxSender:
+    """Ein Thread pro Prozess; wartet auf wake() oder das Poll-Intervall."""
+
+    def __init__(self):
+        self._app = None
+        self._event = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._pruned_at = None  # time.monotonic() des letzten prune()
+
+    def wake(self, app):
+        self.ensure(app)
+        self._event.set()
+
+    def ensure(self, app):
+        if not app.config.get('MAIL_OUTBOX_THREAD', True):
+            return
+        self._app = app
+        # Nach einem Fork (Gunicorn) läuft der Thread im Kind nicht mehr -> neu starten
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='mail-outbox', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            # Vor dem Versand zurücksetzen: ein wake() währenddessen löst sofort die nächste Runde aus
+            self._event.clear()
+            app = self._app
+            with app.app_context():
+                try:
+                    self.prune_if_due()
+                    drain()
+                except Exception as e:
+                    log.warning(f"Mail-Outbox: Versand fehlgeschlagen: {e}")
+            self._event.wait(app.config.get('MAIL_OUTBOX_POLL', 30))
+
+    def prune_if_due(self):
+        """prune() höchstens einmal pro PRUNE_INTERVAL (braucht den App-Kontext)."""
+        if self._pruned_at is not None and time.monotonic() - self._pruned_at < PRUNE_INTERVAL:
+            return 0
+        self._pruned_at = time.monotonic()
+        return prune()
+
+
+_sender = OutboxSender()
+
+
+def init_app(app):
+    """Startet den Sender mit dem ersten Request des Prozesses (nicht bei CLI-Befehlen)."""
+    @app.before_request
+    def _ensure_outbox_sender():
+        _sender.ensure(app)
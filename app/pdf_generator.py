@@ -6,12 +6,12 @@ from flask import current_app
 
 
 class PdfGenerator(FPDF):
-    def __init__(self, sections_data, inspection=None, upload_folder="app/static/uploads", target_type=None):
+    def __init__(self, form, inspection=None, upload_folder="app/static/uploads", target_type=None):
         """
-        sections_data: Liste von Dictionaries (nicht mehr DB Objekte!)
+        form: kompiliertes Schema (app.formbuilder.compiled) - live oder aus dem Projekt-Snapshot
         """
         super().__init__()
-        self.sections = sections_data
+        self.form = form
         self.inspection = inspection
         self.upload_folder = upload_folder
 
@@ -85,30 +85,11 @@ class PdfGenerator(FPDF):
         except:
             return text
 
-    def _get_opts(self, q):
-        """Hilft beim Parsen der Optionen aus dem Dict."""
-        raw = q.get('options_json')
-        if not raw: return []
-        if isinstance(raw, list): return raw
-        try:
-            return json.loads(raw)
-        except:
-            return []
-
-    def _get_types(self, q):
-        raw = q.get('types_json')
-        if not raw: return []
-        if isinstance(raw, list): return raw
-        try:
-            return json.loads(raw)
-        except:
-            return []
-
     def _calculate_height(self, q, label):
         lines = self.multi_cell(0, 6, label, split_only=True)
         label_height = len(lines) * 6
         input_height = 0
-        q_type = q.get('type')
+        q_type = q.type
 
         if self.inspection is None:
             if q_type == 'textarea':
@@ -116,12 +97,11 @@ class PdfGenerator(FPDF):
             elif q_type == 'checkbox':
                 input_height = 6 + 2
             elif q_type == 'select':
-                opts = self._get_opts(q)
-                input_height = (len(opts) * 5) + 2
+                input_height = (len(q.options) * 5) + 2
             elif q_type == 'file':
                 input_height = 40 + 2
             elif q_type in ['info', 'alert']:
-                return len(self.multi_cell(0, 6, self._clean(f"Hinweis: {q.get('label')}"), split_only=True)) * 6 + 4
+                return len(self.multi_cell(0, 6, self._clean(f"Hinweis: {q.label}"), split_only=True)) * 6 + 4
             elif q_type == 'header':
                 return len(self.multi_cell(0, 8, label, split_only=True)) * 8 + 4
             else:
@@ -129,7 +109,7 @@ class PdfGenerator(FPDF):
             return label_height + input_height + 2
 
         # Filled
-        val = self.form_data.get(q.get('id'), "")
+        val = self.form_data.get(q.id, "")
         val_lines = self.multi_cell(0, 6, str(val), split_only=True)
         text_height = len(val_lines) * 6 + 4
         return label_height + text_height + 5
@@ -137,22 +117,9 @@ class PdfGenerator(FPDF):
     def create(self):
         self.set_font('Arial', '', 11)
 
-        # Iteration über Dicts statt Objekte
-        for sec in self.sections:
-            sec_title = sec.get('title', '')
-            questions = sec.get('questions', [])
-
-            visible_questions = []
-            for q in questions:
-                q_types = self._get_types(q)
-                type_match = not self.target_type or self.target_type in q_types
-                # Zugriff auf 'is_print' via get(), default True
-                print_allowed = q.get('is_print', True)
-
-                if type_match and print_allowed:
-                    visible_questions.append(q)
-
-            if not visible_questions: continue
+        # Sichtbare Fragen (Typ + is_print) kommen fertig gefiltert aus dem Schema-Index
+        for sec, visible_questions in self.form.printable(self.target_type or None):
+            sec_title = sec.title or ''
 
             if self.get_y() + 30 > self.page_break_trigger: self.add_page()
 
@@ -165,8 +132,8 @@ class PdfGenerator(FPDF):
 
             for q in visible_questions:
                 self.set_x(self.l_margin)
-                label = self._clean(q.get('label', ''))
-                if q.get('is_required', False): label += " *"
+                label = self._clean(q.label or '')
+                if q.is_required: label += " *"
 
                 needed = self._calculate_height(q, label)
 
@@ -174,7 +141,7 @@ class PdfGenerator(FPDF):
                     self.add_page()
                     self._print_continuation(sec_title)
 
-                q_type = q.get('type')
+                q_type = q.type
 
                 if q_type == 'header':
                     self.ln(3)
@@ -192,7 +159,7 @@ class PdfGenerator(FPDF):
                     self.ln(4)
                     continue
 
-                val = self.form_data.get(q.get('id'))
+                val = self.form_data.get(q.id)
                 if self.inspection is None:
                     self._render_blank_field(q, label)
                 else:
@@ -227,7 +194,7 @@ class PdfGenerator(FPDF):
         self.set_font('Arial', 'B', 10)
         self.multi_cell(0, 6, label)
         self.set_font('Arial', '', 10)
-        q_type = q.get('type')
+        q_type = q.type
 
         if q_type == 'textarea':
             self.ln(1);
@@ -239,9 +206,8 @@ class PdfGenerator(FPDF):
             self.cell(5, 5, "", 1, 0);
             self.cell(0, 5, self._clean(" Ja / Bestätigt"), ln=True)
         elif q_type == 'select':
-            opts = self._get_opts(q)
             self.ln(1)
-            for opt in opts:
+            for opt in q.options:
                 self.set_x(self.l_margin);
                 self.cell(5, 5, "", 1, 0);
                 self.cell(0, 5, self._clean(f" {opt}"), ln=True)
@@ -263,7 +229,7 @@ class PdfGenerator(FPDF):
         self.multi_cell(0, 6, label + ":")
         self.set_font('Arial', '', 10)
 
-        if q.get('type') == 'file':
+        if q.type == 'file':
             if not val:
                 self.set_x(self.l_margin + 5);
                 self.cell(0, 6, "-", ln=True);
@@ -9,12 +9,18 @@ from flask import render_template, request, jsonify, current_app, url_for, send_
     redirect
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
+from sqlalchemy import select
 from app.extensions import db
-from app.models import ImmoSection, Inspection, InspectionLog, ImmoQuestion
+from app.models import Inspection, InspectionLog, ImmoQuestion, User
 from app.decorators import permission_required
 from app.projects import bp
+from app.formbuilder import compiled, schema
 from app.pdf_generator import PdfGenerator
 
+# Historie auf der Detailseite: Einträge pro Nachladen
+LOG_PAGE_SIZE = 20
+LOG_PAGE_SIZE_MAX = 100
+
 
 # ==============================================================================
 # VIEW ROUTES (GET)
@@ -132,28 +138,15 @@ def download_file(project, filename):
 @login_required
 @permission_required('immo_user')
 def get_form_config():
-    """Lädt die Formular-Struktur (JSON)."""
-    sections = ImmoSection.query.order_by(ImmoSection.order).all()
-    data = []
-    for sec in sections:
-        questions = []
-        for q in sec.questions:
-            questions.append({
-                "id": q.id,
-                "label": q.label,
-                "type": q.type,
-                "width": q.width,
-                "width_tablet": q.width_tablet,
-                "width_mobile": q.width_mobile,
-                "tooltip": q.tooltip,
-                "is_required": q.is_required,
-                "is_metadata": q.is_metadata,
-                "is_print": q.is_print,
-                "options": json.loads(q.options_json) if q.options_json else [],
-                "types": json.loads(q.types_json) if q.types_json else []
-            })
-        data.append({"id": sec.id, "title": sec.title, "is_expanded": sec.is_expanded, "content": questions})
-    return jsonify(data)
+    """
+    Lädt die Formular-Struktur (JSON). Mit ETag = Formular-Revision: solange niemand
+    speichert, bekommt der Browser nur ein 304 (ohne DB-Abfrage).
+    """
+    return schema.conditional_json(_form_config_data)
+
+
+def _form_config_data():
+    return compiled.get().config()
 
 
 @bp.route('/upload/init', methods=['POST'])
@@ -272,12 +265,10 @@ def generate_and_download_pdf(inspection_id):
             except:
                 pass
 
-        # 2. Fallback: Live Daten holen und konvertieren
-        if not sections_data:
-            sections_data = get_current_form_structure_as_dict()
+        # 2. Fallback: Live-Schema (bereits kompiliert)
+        form = compiled.from_snapshot(sections_data) if sections_data else compiled.get()
 
-        # Generator aufrufen (Achtung: Der Generator muss jetzt Dictionaries verstehen!)
-        gen = PdfGenerator(sections_data, inspection, current_app.config['UPLOAD_FOLDER'])
+        gen = PdfGenerator(form, inspection, current_app.config['UPLOAD_FOLDER'])
         rel_path = gen.create()
 
         inspection.pdf_path = rel_path
@@ -356,11 +347,9 @@ def detail_view(inspection_id):
         except:
             pass
 
-    meta_questions = db.session.query(ImmoQuestion).join(ImmoSection).filter(ImmoQuestion.is_metadata == True).order_by(
-        ImmoSection.order, ImmoQuestion.order).all()
-
+    # Metadaten-Fragen aus dem kompilierten Schema (nur nach einem Formular-Speichern neu geladen)
     meta_fields = []
-    for q in meta_questions:
+    for q in compiled.get().metadata:
         val = form_responses.get(q.id)
         if val is True: val = "Ja"
         if val is False: val = "Nein"
@@ -381,19 +370,67 @@ def detail_view(inspection_id):
     files = []
     if folder_name:
         target_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], folder_name)
-        if os.path.exists(target_dir):
-            for f in os.listdir(target_dir):
-                fp = os.path.join(target_dir, f)
-                if os.path.isfile(fp):
+        if os.path.isdir(target_dir):
+            # scandir: Typ + Größe aus einem Verzeichnisdurchlauf statt 2 stat() pro Datei
+            with os.scandir(target_dir) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    f = entry.name
                     is_img = f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))
                     is_vid = f.lower().endswith(('.mp4', '.mov', '.avi'))
-                    size_mb = round(os.path.getsize(fp) / (1024 * 1024), 2)
+                    size_mb = round(entry.stat().st_size / (1024 * 1024), 2)
                     files.append({
                         "name": f, "size": size_mb, "is_img": is_img, "is_vid": is_vid, "folder": folder_name
                     })
 
+    # Die Historie lädt das Frontend seitenweise über /logs nach
     return render_template('immo/immo_details.html', inspection=inspection, files=files,
-                           folder_name=folder_name, form_responses=form_responses, meta_fields=meta_fields)
+                           folder_name=folder_name, form_responses=form_responses, meta_fields=meta_fields,
+                           log_page_size=LOG_PAGE_SIZE)
+
+
+@bp.route('/<int:inspection_id>/logs', methods=['GET'])
+@login_required
+@permission_required('immo_user')
+def inspection_logs(inspection_id):
+    """
+    Historie eines Projekts als JSON, neueste zuerst.
+    Blättern per ?before=<Log-ID> (Keyset), ?limit= bis LOG_PAGE_SIZE_MAX.
+    """
+    inspection = db.session.get(Inspection, inspection_id)
+    if not inspection: return jsonify({'error': 'Nicht gefunden'}), 404
+
+    if not (current_user.is_admin or current_user.has_permission(
+            'immo_files_access') or inspection.user_id == current_user.id):
+        return jsonify({'error': 'Keine Berechtigung'}), 403
+
+    limit = min(max(request.args.get('limit', LOG_PAGE_SIZE, type=int), 1), LOG_PAGE_SIZE_MAX)
+    before = request.args.get('before', type=int)
+
+    stmt = (select(InspectionLog.id, InspectionLog.timestamp, InspectionLog.action, InspectionLog.details,
+                   User.username)
+            .outerjoin(User, User.id == InspectionLog.user_id)
+            .where(InspectionLog.inspection_id == inspection_id)
+            .order_by(InspectionLog.id.desc())
+            .limit(limit + 1))
+    if before:
+        stmt = stmt.where(InspectionLog.id < before)
+    rows = db.session.execute(stmt).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        "logs": [{
+            "id": r.id,
+            "user": r.username,
+            "timestamp": r.timestamp.isoformat() + 'Z' if r.timestamp else None,
+            "timestamp_display": r.timestamp.strftime('%d.%m.%Y %H:%M') if r.timestamp else '',
+            "action": r.action,
+            "details": r.details,
+        } for r in rows],
+        "next": rows[-1].id if has_more else None,
+    })
 
 
 @bp.route('/<int:inspection_id>/update_data', methods=['POST'])
@@ -443,11 +480,9 @@ def download_blank_pdf():
     target_type = request.args.get('type', 'einzel')
 
     try:
-        sections = ImmoSection.query.order_by(ImmoSection.order).all()
-
         # Generator mit target_type aufrufen
         gen = PdfGenerator(
-            sections,
+            compiled.get(),
             inspection=None,
             upload_folder=current_app.config['UPLOAD_FOLDER'],
             target_type=target_type  # <--- NEU
@@ -674,34 +709,8 @@ def unarchive_project(inspection_id):
 
 # --- HELPER FUNKTION (Neu) ---
 def get_current_form_structure_as_dict():
-    """Lädt die aktuelle DB-Struktur und gibt sie als Liste von Dictionaries zurück."""
-    sections_db = ImmoSection.query.filter_by(category='immo').order_by(ImmoSection.order).all()
-    structure = []
-
-    for sec in sections_db:
-        sec_data = {
-            "id": sec.id,
-            "title": sec.title,
-            "is_expanded": sec.is_expanded,
-            "questions": []
-        }
-        for q in sec.questions:
-            # Wir speichern ALLES, was für die Anzeige wichtig ist
-            sec_data["questions"].append({
-                "id": str(q.id),  # ID als String für JSON Konsistenz
-                "label": q.label,
-                "type": q.type,
-                "width": q.width,
-                "width_tablet": q.width_tablet,
-                "width_mobile": q.width_mobile,
-                "tooltip": q.tooltip,
-                "is_required": q.is_required,
-                "is_print": getattr(q, 'is_print', True),
-                "options_json": q.options_json,  # Rohdaten speichern
-                "types_json": q.types_json
-            })
-        structure.append(sec_data)
-    return structure
+    """Aktuelle Immo-Struktur als Liste von Dictionaries (Snapshot für das Projekt)."""
+    return compiled.get().snapshot()
 
 
 @bp.route('/<int:inspection_id>/config_snapshot', methods=['GET'])
@@ -0,0 +1,51 @@
+"""
+Markdown -> sicheres HTML (Roadmap, Anforderungen, Versionshinweise).
+
+Das Ergebnis wird über den Hash des Textes gecacht. Da sich die Texte selten
+ändern, ist jeder Seitenaufruf nach dem ersten Rendern nur ein Dict-Lookup.
+Beim Speichern wird der Cache direkt vorgewärmt.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+import bleach
+import markdown
+
+ALLOWED_TAGS = list(bleach.sanitizer.ALLOWED_TAGS) + [
+    'p', 'br', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'ul', 'ol', 'li', 'pre', 'code', 'table', 'thead',
+    'tbody', 'tr', 'th', 'td', 'blockquote', 'hr',
+    'strong', 'em', 'a', 'img'
+]
+ALLOWED_ATTRS = {'*': ['class'], 'a': ['href', 'rel'], 'img': ['src', 'alt', 'style']}
+
+# Es gibt nur eine Handvoll Texte - das Limit schützt nur vor Wildwuchs
+MAX_ENTRIES = 32
+
+_rendered = OrderedDict()
+_lock = threading.Lock()
+
+
+def _render(text):
+    html = markdown.markdown(text, extensions=['fenced_code', 'tables'])
+    return bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS)
+
+
+def render_markdown(text):
+    """Gibt bereinigtes HTML zurück (aus dem Cache, falls der Text bekannt ist)."""
+    if not text: return ""
+    key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    with _lock:
+        html = _rendered.get(key)
+        if html is not None:
+            _rendered.move_to_end(key)
+            return html
+
+    html = _render(text)
+
+    with _lock:
+        _rendered[key] = html
+        while len(_rendered) > MAX_ENTRIES:
+            _rendered.popitem(last=False)
+    return html
@@ -4,6 +4,7 @@ from datetime import datetime
 from app.models import SiteContent
 from app.extensions import db
 from app.decorators import permission_required
+from app.rendering import render_markdown
 from app.roadmap import bp
 
 
@@ -36,15 +37,17 @@ def update_roadmap():
 
     if not page_content:
         # Neu anlegen, falls noch nicht existiert
-        page_content = SiteContent(id='roadmap', content=new_text, author=current_user)
+        page_content = SiteContent(id='roadmap', content=new_text, user_id=current_user.id)
         db.session.add(page_content)
     else:
         # Update bestehenden Eintrag
         page_content.content = new_text
-        page_content.author = current_user
+        page_content.user_id = current_user.id
         page_content.updated_at = datetime.utcnow()
 
     db.session.commit()
+    SiteContent.invalidate_cache()
+    render_markdown(new_text)  # Cache vorwärmen
     flash('Roadmap erfolgreich gespeichert.', 'success')
 
     # Redirect zur GET-Ansicht
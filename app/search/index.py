@@ -0,0 +1,250 @@
+"""
+Volltextindex (SQLite FTS5) über Projekte und Bereichsleitungs-Einträge.
+
+- Tabelle `search_index(title, body)`. Die rowid kodiert Art + ID:
+  rowid = id * 8 + Art. Aktualisieren/Löschen trifft so genau eine Zeile.
+- Verein / Anbaustelle / Ausgabestelle: SQL-Trigger. Damit sind auch
+  Bulk-Statements (Import, Massenlöschen) automatisch abgedeckt.
+- Inspection: ORM-Event (after_flush). Die Metadaten-Antworten stecken im
+  JSON und müssen in Python ausgelesen werden.
+
+Achtung: Ein batch_alter_table auf verein/anbaustelle/ausgabestelle baut die
+Tabelle neu und verliert dabei die Trigger -> danach `flask commands search-reindex`.
+"""
+import json
+import re
+from sqlalchemy import DDL, event, inspect as sa_inspect, select, text
+from sqlalchemy.orm import Session
+from app.extensions import db
+from app.models import Inspection, ImmoQuestion
+
+KIND_INSPECTION = 1
+KIND_VEREIN = 2
+KIND_ANBAU = 3
+KIND_AUSGABE = 4
+ROWID_FACTOR = 8
+
+KIND_NAMES = {KIND_INSPECTION: 'projekt', KIND_VEREIN: 'verein', KIND_ANBAU: 'anbau', KIND_AUSGABE: 'abgabe'}
+
+CREATE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "title, body, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+
+# Tabelle -> (Art, Spalten für den Update-Trigger, Titel, Text). {p} = 'new.' im Trigger, '' beim Rebuild
+_TRIGGER_SOURCES = {
+    'verein': (
+        KIND_VEREIN, 'name, city, zip_code, board_member, prev_officer',
+        "{p}name",
+        "coalesce({p}city, '') || ' ' || coalesce({p}zip_code, '') || ' ' || "
+        "coalesce({p}board_member, '') || ' ' || coalesce({p}prev_officer, '')",
+    ),
+    'anbaustelle': (
+        KIND_ANBAU, 'name, address, state',
+        "{p}name",
+        "coalesce({p}address, '') || ' ' || coalesce({p}state, '')",
+    ),
+    'ausgabestelle': (
+        KIND_AUSGABE, 'name, address, state',
+        "coalesce({p}name, {p}address, '')",
+        "coalesce({p}address, '') || ' ' || coalesce({p}state, '') || ' ' || coalesce({p}name, '')",
+    ),
+}
+
+# Felder einer Inspection, die im Index landen
+_INSPECTION_FIELDS = ('csc_name', 'inspection_type', 'data_json')
+
+
+def _trigger_statements():
+    for table, (kind, columns, title, body) in _TRIGGER_SOURCES.items():
+        values = f"(new.id * {ROWID_FACTOR} + {kind}, {title.format(p='new.')}, {body.format(p='new.')})"
+        delete = f"DELETE FROM search_index WHERE rowid = old.id * {ROWID_FACTOR} + {kind};"
+        insert = f"INSERT INTO search_index(rowid, title, body) VALUES {values};"
+        yield (f"CREATE TRIGGER IF NOT EXISTS search_{table}_ai AFTER INSERT ON {table} "
+               f"BEGIN {insert} END")
+        # Nur bei Änderungen an indexierten Spalten (Status-Updates lassen den Index in Ruhe)
+        yield (f"CREATE TRIGGER IF NOT EXISTS search_{table}_au AFTER UPDATE OF {columns} ON {table} "
+               f"BEGIN {delete} {insert} END")
+        yield (f"CREATE TRIGGER IF NOT EXISTS search_{table}_ad AFTER DELETE ON {table} "
+               f"BEGIN {delete} END")
+
+
+def install(connection):
+    """Legt Tabelle + Trigger an (idempotent)."""
+    connection.execute(text(CREATE_TABLE))
+    for stmt in _trigger_statements():
+        connection.execute(text(stmt))
+
+
+# db.create_all() (setup.py, seed-db) legt den Index gleich mit an
+event.listen(db.metadata, 'after_create', DDL(CREATE_TABLE).execute_if(dialect='sqlite'))
+for _stmt in _trigger_statements():
+    event.listen(db.metadata, 'after_create', DDL(_stmt).execute_if(dialect='sqlite'))
+event.listen(db.metadata, 'before_drop', DDL("DROP TABLE IF EXISTS search_index").execute_if(dialect='sqlite'))
+
+
+# ==============================================================================
+# INSPECTIONS (ORM)
+# ==============================================================================
+
+def _inspection_body(inspection, meta_ids):
+    parts = [inspection.inspection_type or '']
+    try:
+        responses = json.loads(inspection.data_json or '{}').get('form_responses', {})
+    except (ValueError, AttributeError):
+        responses = {}
+
+    for q_id in meta_ids:
+        val = responses.get(q_id)
+        values = val if isinstance(val, list) else [val]
+        # Ja/Nein-Antworten bringen für die Suche nichts
+        parts.extend(str(v) for v in values if isinstance(v, (str, int, float)) and not isinstance(v, bool))
+    return ' '.join(p for p in parts if p)
+
+
+def _metadata_question_ids(connection):
+    return connection.execute(select(ImmoQuestion.id).where(ImmoQuestion.is_metadata == True)).scalars().all()  # noqa: E712
+
+
+_index_present = {}
+
+
+def _has_index(connection):
+    """Gibt es die FTS-Tabelle schon? (Vor der Migration nicht - dann nichts tun.)"""
+    key = str(connection.engine.url)
+    if key not in _index_present:
+        _index_present[key] = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'search_index'")).first() is not None
+    return _index_present[key]
+
+
+def _needs_reindex(obj):
+    state = sa_inspect(obj)
+    return any(state.attrs[f].history.has_changes() for f in _INSPECTION_FIELDS)
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_inspections(session, flush_context):
+    changed = [o for o in list(session.new) + list(session.dirty)
+               if isinstance(o, Inspection) and _needs_reindex(o)]
+    deleted = [o for o in session.deleted if isinstance(o, Inspection)]
+    if not changed and not deleted:
+        return
+
+    # Gleiche Transaktion wie die Änderung selbst -> Rollback nimmt den Index mit
+    connection = session.connection()
+    if not _has_index(connection):
+        return
+
+    for obj in deleted + changed:
+        connection.execute(text("DELETE FROM search_index WHERE rowid = :r"),
+                           {'r': obj.id * ROWID_FACTOR + KIND_INSPECTION})
+    if changed:
+        meta_ids = _metadata_question_ids(connection)
+        connection.execute(
+            text("INSERT INTO search_index(rowid, title, body) VALUES (:r, :title, :body)"),
+            [{'r': o.id * ROWID_FACTOR + KIND_INSPECTION, 'title': o.csc_name, 'body': _inspection_body(o, meta_ids)}
+             for o in changed]
+        )
+
+
+# ==============================================================================
+# REBUILD
+# ==============================================================================
+
+def rebuild():
+    """Index komplett neu aufbauen (inkl. Trigger). Gibt die Anzahl der Einträge zurück."""
+    connection = db.session.connection()
+    install(connection)
+    _index_present[str(connection.engine.url)] = True
+    connection.execute(text("DELETE FROM search_index"))
+
+    for table, (kind, _, title, body) in _TRIGGER_SOURCES.items():
+        connection.execute(text(
+            f"INSERT INTO search_index(rowid, title, body) "
+            f"SELECT id * {ROWID_FACTOR} + {kind}, {title.format(p='')}, {body.format(p='')} FROM {table}"
+        ))
+
+    meta_ids = _metadata_question_ids(connection)
+    rows = db.session.query(Inspection.id, Inspection.csc_name, Inspection.inspection_type, Inspection.data_json) \
+        .yield_per(500)
+    batch = []
+    for row in rows:
+        batch.append({'r': row.id * ROWID_FACTOR + KIND_INSPECTION, 'title': row.csc_name,
+                      'body': _inspection_body(row, meta_ids)})
+        if len(batch) >= 500:
+            connection.execute(text("INSERT INTO search_index(rowid, title, body) VALUES (:r, :title, :body)"), batch)
+            batch = []
+    if batch:
+        connection.execute(text("INSERT INTO search_index(rowid, title, body) VALUES (:r, :title, :body)"), batch)
+
+    count = connection.execute(text("SELECT count(*) FROM search_index")).scalar()
+    db.session.commit()
+    return count
+
+
+# ==============================================================================
+# SUCHE
+# ==============================================================================
+
+_TOKEN_RE = re.compile(r'\w+')
+MAX_TOKENS = 10
+
+
+def match_expression(term):
+    """Freitext -> FTS5-Ausdruck: jedes Wort als Präfix, alle müssen vorkommen."""
+    tokens = _TOKEN_RE.findall(term or '')[:MAX_TOKENS]
+    return ' '.join(f'"{t}"*' for t in tokens)
+
+
+def _visibility(user):
+    """SQL-Bedingungen, was der User sehen darf (wie in den Detailansichten)."""
+    clauses = []
+    kind = f"rowid % {ROWID_FACTOR}"
+    ref = f"rowid / {ROWID_FACTOR}"
+
+    if user.has_permission('immo_user'):
+        if user.is_admin or user.has_permission('immo_files_access'):
+            clauses.append(f"{kind} = {KIND_INSPECTION}")
+        else:
+            clauses.append(f"({kind} = {KIND_INSPECTION} AND {ref} IN (SELECT id FROM inspection WHERE user_id = :uid))")
+
+    if user.has_permission('bl_user'):
+        if user.is_admin:
+            clauses.append(f"{kind} IN ({KIND_VEREIN}, {KIND_ANBAU}, {KIND_AUSGABE})")
+        else:
+            own = "SELECT verein_id FROM verein_bereichsleitung WHERE user_id = :uid"
+            clauses.append(f"({kind} = {KIND_VEREIN} AND {ref} IN ({own}))")
+            clauses.append(f"({kind} = {KIND_ANBAU} AND {ref} IN (SELECT anbaustelle_id FROM verein WHERE id IN ({own})))")
+            clauses.append(f"({kind} = {KIND_AUSGABE} AND {ref} IN (SELECT id FROM ausgabestelle WHERE verein_id IN ({own})))")
+    return clauses
+
+
+def search(term, user, page=1, per_page=20):
+    """
+    Sortiert nach Relevanz (bm25, Titel zählt stärker).
+    Gibt (Treffer, gibt_es_mehr) zurück; Treffer = dicts mit kind, id, title, snippet.
+    """
+    match = match_expression(term)
+    clauses = _visibility(user)
+    if not match or not clauses:
+        return [], False
+
+    sql = text(
+        "SELECT rowid, title, snippet(search_index, 1, '', '', '…', 12) AS snippet "
+        "FROM search_index "
+        f"WHERE search_index MATCH :match AND ({' OR '.join(clauses)}) "
+        "ORDER BY bm25(search_index, 10.0, 1.0) "
+        "LIMIT :limit OFFSET :offset"
+    )
+    rows = db.session.execute(sql, {
+        'match': match, 'uid': user.id, 'limit': per_page + 1, 'offset': (page - 1) * per_page
+    }).all()
+
+    hits = [{
+        'kind': KIND_NAMES[r.rowid % ROWID_FACTOR],
+        'id': r.rowid // ROWID_FACTOR,
+        'title': r.title,
+        'snippet': r.snippet,
+    } for r in rows[:per_page]]
+    return hits, len(rows) > per_page
@@ -0,0 +1,38 @@
+from flask import request, jsonify, url_for
+from flask_login import login_required, current_user
+from app.search import bp
+from app.search.index import search as run_search
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+
+# Art -> (Endpoint, Name des ID-Parameters)
+DETAIL_ROUTES = {
+    'projekt': ('projects.detail_view', 'inspection_id'),
+    'verein': ('bereichsleitung.verein_detail', 'id'),
+    'anbau': ('bereichsleitung.anbau_detail', 'id'),
+    'abgabe': ('bereichsleitung.ausgabe_detail', 'id'),
+}
+
+
+@bp.route('/', methods=['GET'])
+@login_required
+def query():
+    """
+    Volltextsuche über Projekte, Vereine, Anbau- und Abgabestellen.
+    Liefert nur, was der User auch öffnen darf - sortiert nach Relevanz.
+    """
+    term = (request.args.get('q') or '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+    hits, has_more = run_search(term, current_user, page=page, per_page=per_page)
+    for hit in hits:
+        endpoint, param = DETAIL_ROUTES[hit['kind']]
+        hit['url'] = url_for(endpoint, **{param: hit['id']})
+
+    return jsonify({
+        'results': hits,
+        'page': page,
+        'next_page': page + 1 if has_more else None
+    })
@@ -0,0 +1,74 @@
+"""
+Zentraler Zugriff auf SystemSetting und ImmoSetting.
+
+Alle Einstellungen beider Tabellen werden mit EINER Abfrage geladen und im
+Prozess gecacht. Schreibzugriffe laufen gebündelt in einer Transaktion und
+invalidieren danach den Cache - der nächste Zugriff lädt aus der DB. (Den
+lokalen Stand zu patchen wäre bei parallelen Schreibern in mehreren Workern
+nicht sicher: ein veralteter Stand bekäme sonst den neuesten Zähler.)
+"""
+from sqlalchemy import literal, select, union_all
+from app.cache import GenerationCache
+from app.extensions import db
+from app.models import SystemSetting, ImmoSetting
+
+SYSTEM = 'system'
+IMMO = 'immo'
+
+_MODELS = {SYSTEM: SystemSetting, IMMO: ImmoSetting}
+
+
+def _load_all():
+    stmt = union_all(
+        select(literal(SYSTEM), SystemSetting.key, SystemSetting.value),
+        select(literal(IMMO), ImmoSetting.key, ImmoSetting.value),
+    )
+    data = {scope: {} for scope in _MODELS}
+    for scope, key, value in db.session.execute(stmt):
+        data[scope][key] = value
+    return data
+
+
+_cache = GenerationCache('settings', _load_all)
+
+
+def get(key, default=None, scope=SYSTEM, cast=None):
+    """
+    Liest eine Einstellung aus dem Cache (keine DB-Abfrage im Normalfall).
+    Mit cast (z.B. int) wird der Wert typisiert, bei Fehlern gibt es den Default.
+    """
+    values = _cache.get()[scope]
+    if key not in values:
+        return default
+
+    value = values[key]
+    if cast is None or value is None:
+        return value
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def set_many(values, scope=SYSTEM):
+    """Schreibt mehrere Einstellungen in EINER Transaktion."""
+    model = _MODELS[scope]
+    existing = {s.key: s for s in model.query.filter(model.key.in_(list(values))).all()}
+
+    try:
+        for key, value in values.items():
+            setting = existing.get(key)
+            if not setting:
+                setting = model(key=key)
+                db.session.add(setting)
+            setting.value = value
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    _cache.invalidate()
+
+
+def set_value(key, value, scope=SYSTEM):
+    set_many({key: value}, scope=scope)
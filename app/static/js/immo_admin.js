@@ -30,6 +30,8 @@ async function init() {
         config = await res.json();
         renderEditor();
         renderPreview();
+        // Liste ist klein (nur Metadaten), Inhalte kommen erst bei Auswahl
+        if (document.getElementById('backupLoader')) loadBackups();
     } catch (e) {
         console.error("Fehler beim Laden der Config:", e);
         alert("Fehler beim Laden der Konfiguration. Siehe Konsole.");
@@ -257,8 +259,8 @@ function scrape() {
             if(badges[2].classList.contains('active')) types.push('ausgabe');
 
             let qId = q.querySelector('.q-id').value;
-            // Falls ID ein Client-Side String ist, übergeben wir sie so,
-            // Backend entscheidet (beim Onboarding ignorieren wir sie meist beim Re-Create)
+            // Falls ID ein Client-Side String ist, übergeben wir sie so -
+            // das Backend gleicht über die IDs ab (neu / geändert / gelöscht)
             if(!qId) qId = generateUniqueId('q_scrape');
 
             qs.push({
@@ -295,7 +297,11 @@ async function saveConfig() {
         });
         const result = await res.json();
         if(result.success) {
-            alert("✅ Gespeichert!");
+            const c = result.changes;
+            if (c && !c.changed) alert("✅ Gespeichert! (keine Änderungen)");
+            else if (c) alert(`✅ Gespeichert! Fragen: ${c.questions_created} neu, ${c.questions_updated} geändert, ${c.questions_moved} verschoben, ${c.questions_deleted} gelöscht`);
+            else alert("✅ Gespeichert!");
+            if (document.getElementById('backupLoader')) loadBackups();
             // Optional: Seite neu laden, um echte DB-IDs zu bekommen
             // window.location.reload();
         }
@@ -313,14 +319,23 @@ async function loadBackups() {
         sel.innerHTML = '<option value="">Wähle Sicherung...</option>';
         list.forEach(b => {
             const opt = document.createElement('option');
-            opt.value = JSON.stringify(b.data);
+            opt.value = b.id;
             opt.innerText = b.name;
             sel.appendChild(opt);
         });
     } catch(e) { console.error("Backup Load Error", e); }
 }
 
-function loadBackup(json) { if(json && confirm("Backup laden?")) { config = JSON.parse(json); renderEditor(); sync(); } }
+async function loadBackup(id) {
+    if (!id || !confirm("Backup laden?")) return;
+    try {
+        // Inhalt erst bei Auswahl laden - die Liste enthält nur Metadaten
+        const res = await fetch(`/formbuilder/backups/${id}`);
+        if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+        config = await res.json();
+        renderEditor(); sync();
+    } catch(e) { alert("Fehler beim Laden des Backups: " + e); }
+}
 
 // --- HELPER FÜR RESPONSIVE KLASSEN ---
 function getColClass(q) {
@@ -1,5 +1,6 @@
 document.addEventListener('DOMContentLoaded', () => {
     initForm();
+    loadLogs();
 });
 
 // --- GLOBALE VARIABLEN ---
@@ -35,6 +36,59 @@ function getColClass(q) {
     return classes;
 }
 
+// --- HISTORIE (seitenweise nachladen) ---
+
+let logCursor = null;
+let logLoading = false;
+
+async function loadLogs() {
+    const list = document.getElementById('logList');
+    if (!list || logLoading) return;
+    logLoading = true;
+    const moreWrap = document.getElementById('logMoreWrap');
+    const moreBtn = document.getElementById('logMoreBtn');
+    if (moreBtn) moreBtn.disabled = true;
+
+    try {
+        const params = new URLSearchParams({ limit: logPageSize });
+        if (logCursor) params.set('before', logCursor);
+        const res = await fetch(`${logsUrl}?${params}`);
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        const data = await res.json();
+
+        const placeholder = document.getElementById('logPlaceholder');
+        if (placeholder) placeholder.remove();
+
+        data.logs.forEach(log => {
+            const li = document.createElement('li');
+            li.className = 'list-group-item';
+            li.innerHTML = `
+                <div class="d-flex justify-content-between">
+                    <span class="fw-bold small"></span>
+                    <span class="text-muted" style="font-size: 0.75em"></span>
+                </div>
+                <div class="small mt-1 text-secondary"></div>`;
+            li.querySelector('.fw-bold').textContent = log.user || '';
+            li.querySelector('.text-muted').textContent = log.timestamp_display;
+            li.querySelector('.text-secondary').textContent = log.details || '';
+            list.appendChild(li);
+        });
+
+        if (!list.children.length) {
+            list.innerHTML = '<li class="list-group-item text-muted text-center py-4">Noch keine Änderungen protokolliert.</li>';
+        }
+        logCursor = data.next;
+        moreWrap.classList.toggle('d-none', !logCursor);
+    } catch (e) {
+        console.error("Historie konnte nicht geladen werden", e);
+        const placeholder = document.getElementById('logPlaceholder');
+        if (placeholder) placeholder.textContent = "Historie konnte nicht geladen werden.";
+    } finally {
+        logLoading = false;
+        if (moreBtn) moreBtn.disabled = false;
+    }
+}
+
 // --- INITIALISIERUNG ---
 
 async function initForm() {
@@ -78,6 +78,8 @@ function updateChart() {
     document.getElementById('pct_withdrawn').innerText = calcPct(d.withdrawn, total);
     document.getElementById('pct_open').innerText = calcPct(d.open, total);
 
+    updateHistory(sel === 'DE' ? 'DE' : d.name);
+
     // --- CHART LOGIC ---
     const ctx = document.getElementById('marketChart');
     if (!ctx) return;
@@ -147,6 +149,70 @@ function updateChart() {
     });
 }
 
+// --- VERLAUF ---
+let historyChart = null;
+let historyRequest = 0;
+
+function isoToDisplay(iso) {
+    const [y, m, d] = iso.split('-');
+    return `${d}.${m}.${y}`;
+}
+
+async function updateHistory(state) {
+    const canvas = document.getElementById('historyChart');
+    if (!canvas || typeof historyUrl === 'undefined') return;
+
+    const req = ++historyRequest;
+    let json;
+    try {
+        const res = await fetch(historyUrl + '?state=' + encodeURIComponent(state));
+        json = await res.json();
+    } catch (e) {
+        console.error("Verlauf konnte nicht geladen werden:", e);
+        return;
+    }
+    // Inzwischen wurde eine andere Region gewählt
+    if (req !== historyRequest) return;
+
+    if (historyChart) { historyChart.destroy(); historyChart = null; }
+
+    const points = json.points || [];
+    const empty = points.length < 2;
+    canvas.parentElement.classList.toggle('d-none', empty);
+    document.getElementById('historyEmpty').classList.toggle('d-none', !empty);
+    if (empty) return;
+
+    const line = (label, key, color) => ({
+        label: label,
+        data: points.map(p => p[key]),
+        borderColor: color,
+        backgroundColor: color,
+        tension: 0.2,
+        pointRadius: points.length > 60 ? 0 : 3
+    });
+
+    historyChart = new Chart(canvas, {
+        type: 'line',
+        data: {
+            labels: points.map(p => isoToDisplay(p.date)),
+            datasets: [
+                line('Gestellte Anträge', 'applied', '#0d6efd'),
+                line('Genehmigt', 'approved', '#198754'),
+                line('Offen / In Prüfung', 'open', '#ffc107'),
+                line('Abgelehnt', 'rejected', '#dc3545'),
+                line('Zurückgezogen', 'withdrawn', '#6c757d')
+            ]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            interaction: { mode: 'index', intersect: false },
+            plugins: { legend: { position: 'bottom', labels: { padding: 20 } } },
+            scales: { y: { beginAtZero: true } }
+        }
+    });
+}
+
 function saveAsImage() {
     const element = document.getElementById("captureArea");
     document.body.classList.add('taking-screenshot');
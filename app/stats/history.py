@@ -0,0 +1,143 @@
+"""
+Verlauf der Antragszahlen (MarketStatSnapshot).
+
+- Nach jedem Sync / jeder Mariana-Änderung wird der aktuelle Stand mit dem
+  letzten Snapshot pro Bundesland verglichen. Nur geänderte Länder bekommen
+  eine neue Zeile (ein Bulk-INSERT, gleiche Transaktion wie die Änderung).
+- Für das Diagramm gibt es pro Stichtag einen Punkt. Bei langen Zeiträumen wird
+  auf max_points Zeit-Buckets verdichtet (letzter Wert pro Bucket - die Zahlen
+  sind kumulativ, der letzte Stand ist also der richtige).
+"""
+from datetime import datetime
+from sqlalchemy import func, insert, select
+from app.extensions import db
+from app.models import MarketStat, MarketStatSnapshot
+
+NATIONAL = 'DE'
+DEFAULT_MAX_POINTS = 120
+MAX_POINTS = 500
+
+STAT_FIELDS = ('applied', 'approved', 'rejected', 'withdrawn')
+MARIANA_FIELDS = ('mariana_applied', 'mariana_approved', 'mariana_rejected', 'mariana_withdrawn')
+SNAPSHOT_FIELDS = STAT_FIELDS + MARIANA_FIELDS
+
+SOURCE_DATE_FORMAT = '%d.%m.%Y'
+
+
+def parse_source_date(value, fallback):
+    """'31.01.2026' (wie auf anbauverband.de) -> date, sonst fallback."""
+    try:
+        return datetime.strptime((value or '').strip(), SOURCE_DATE_FORMAT).date()
+    except ValueError:
+        return fallback
+
+
+# ==============================================================================
+# AUFZEICHNEN
+# ==============================================================================
+
+def _latest_snapshots():
+    """{state_name: (data_date, Werte...)} des jeweils letzten Snapshots."""
+    latest_ids = select(func.max(MarketStatSnapshot.id)).group_by(MarketStatSnapshot.state_name)
+    columns = [getattr(MarketStatSnapshot, f) for f in ('state_name', 'data_date') + SNAPSHOT_FIELDS]
+    rows = db.session.execute(select(*columns).where(MarketStatSnapshot.id.in_(latest_ids)))
+    return {r[0]: tuple(r[1:]) for r in rows}
+
+
+def record_snapshots(now=None):
+    """
+    Schreibt Snapshots für alle Länder, deren Zahlen sich seit dem letzten
+    Snapshot geändert haben. Commit macht der Aufrufer. Gibt die Anzahl zurück.
+    """
+    now = now or datetime.utcnow()
+    latest = _latest_snapshots()
+    columns = [getattr(MarketStat, f) for f in ('state_name', 'data_date') + SNAPSHOT_FIELDS]
+
+    new_rows = []
+    for row in db.session.execute(select(*columns)):
+        state_name, data_date = row[0], parse_source_date(row[1], None)
+        values = tuple(v or 0 for v in row[2:])
+        previous = latest.get(state_name)
+        if data_date is None:
+            # Ohne lesbaren Stichtag zählen nur die Werte - sonst gäbe es jeden Tag eine neue Zeile
+            if previous is not None and previous[1:] == values:
+                continue
+            data_date = now.date()
+        elif previous == (data_date,) + values:
+            continue
+        new_rows.append(dict(zip(SNAPSHOT_FIELDS, values), state_name=state_name,
+                             data_date=data_date, recorded_at=now))
+
+    if new_rows:
+        db.session.execute(insert(MarketStatSnapshot), new_rows)
+    return len(new_rows)
+
+
+# ==============================================================================
+# ZEITREIHEN
+# ==============================================================================
+
+def _point(day, values):
+    point = dict(zip(SNAPSHOT_FIELDS, values), date=day.isoformat())
+    point['open'] = point['applied'] - (point['approved'] + point['rejected'] + point['withdrawn'])
+    point['mariana_open'] = point['mariana_applied'] - (
+        point['mariana_approved'] + point['mariana_rejected'] + point['mariana_withdrawn'])
+    return point
+
+
+def _daily(rows, sum_states):
+    """
+    rows: (state_name, data_date, Werte...) sortiert nach Datum + Aufnahme.
+    Liefert [(Datum, Werte)] mit einem Eintrag pro Stichtag (letzter Stand gewinnt).
+    Bei sum_states wird pro Stichtag über den jeweils letzten Stand aller Länder summiert.
+    """
+    current = {}
+    days = []
+    for state_name, day, *values in rows:
+        current[state_name] = tuple(v or 0 for v in values)
+        total = tuple(map(sum, zip(*current.values()))) if sum_states else current[state_name]
+        if days and days[-1][0] == day:
+            days[-1] = (day, total)
+        else:
+            days.append((day, total))
+    return days
+
+
+def downsample(days, max_points):
+    """
+    Verdichtet auf max_points Punkte: der erste Punkt bleibt (Beginn des Zeitraums),
+    der Rest wird auf gleich lange Zeit-Buckets verteilt (letzter Wert pro Bucket).
+    """
+    if len(days) <= max_points:
+        return days
+    first = days[0][0]
+    span = (days[-1][0] - first).days
+    buckets = {}
+    for day, values in days[1:]:
+        buckets[((day - first).days - 1) * (max_points - 1) // span] = (day, values)
+    return [days[0]] + [buckets[k] for k in sorted(buckets)]
+
+
+def series(state=NATIONAL, start=None, end=None, max_points=DEFAULT_MAX_POINTS):
+    """
+    Zeitreihe für ein Bundesland (oder NATIONAL = Summe aller Länder).
+    Gibt (Punkte, verdichtet?) zurück.
+    """
+    columns = [getattr(MarketStatSnapshot, f) for f in ('state_name', 'data_date') + SNAPSHOT_FIELDS]
+    stmt = select(*columns)
+    national = state == NATIONAL
+    if not national:
+        stmt = stmt.where(MarketStatSnapshot.state_name == state)
+        if start:
+            stmt = stmt.where(MarketStatSnapshot.data_date >= start)
+    # Für die Summe brauchen wir auch den Stand VOR start (letzter Wert je Land)
+    if end:
+        stmt = stmt.where(MarketStatSnapshot.data_date <= end)
+    stmt = stmt.order_by(MarketStatSnapshot.data_date, MarketStatSnapshot.recorded_at, MarketStatSnapshot.id)
+
+    days = _daily(db.session.execute(stmt), sum_states=national)
+    if start:
+        days = [d for d in days if d[0] >= start]
+
+    sampled = downsample(days, max(2, min(max_points, MAX_POINTS)))
+    return [_point(day, values) for day, values in sampled], len(sampled) < len(days)
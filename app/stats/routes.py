@@ -1,103 +1,111 @@
-import csv
-import io
-import requests
-from bs4 import BeautifulSoup
-from datetime import datetime
-from flask import render_template, redirect, url_for, flash, jsonify, request
+from datetime import date, datetime
+from flask import render_template, redirect, url_for, flash, jsonify, request, session, stream_template
 from flask import jsonify, request, make_response
-from flask_login import login_required
+from flask_login import login_required, current_user
+from app import settings
 from app.extensions import db
 from app.models import MarketStat
 from app.decorators import permission_required
-from app.stats import bp
+from app.stats import bp, sources, history, summary
 
-URL_SOURCE = "https://anbauverband.de/antrags-und-genehmigungszahlen/"
+# Matrix-Ansicht des Mariana Sheets
+SHEET_PAGE_SIZE = 50
+SHEET_SEARCH_LIMIT = 100
 
 
 @bp.route('/', methods=['GET'])
 def index():
-    """Zeigt das Dashboard an."""
-    stats = MarketStat.query.all()
+    """Zeigt das Dashboard an. Anonyme Besucher bekommen das fertige HTML aus dem Cache."""
+    data = summary.get()
 
-    # Sortierung: Deutschlandweit (Summe) + Alphabetisch
-    # Wir bauen das JSON für das Frontend direkt hier oder im Template.
-    # Wir übergeben die Stats einfach an Jinja.
+    def render():
+        return render_template('stats/index.html', stats=data['stats'], has_data=bool(data['stats']),
+                               last_update=data['last_update'])
 
-    # Prüfen, ob überhaupt Daten da sind
-    has_data = len(stats) > 0
-    last_update = stats[0].last_scraped if has_data else None
+    # Eingeloggt (Buttons, Name in der Sidebar) oder mit Flash-Meldung -> persönlich, nicht cachen
+    if current_user.is_authenticated or '_flashes' in session or request.args:
+        response = make_response(render())
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
 
-    return render_template('stats/index.html', stats=stats, has_data=has_data, last_update=last_update)
+    # Schlüssel ohne Host/Schema: sonst legt jeder beliebige Host-Header einen neuen Eintrag an
+    html, etag = summary.rendered((request.path, settings.get('app_version')), render)
+    response = make_response(html)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={summary.MAX_AGE}'
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+
+@bp.route('/api/summary', methods=['GET'])
+def summary_data():
+    """Öffentliche Zahlen als JSON: pro Bundesland, Summe Deutschland, offene Anträge."""
+    data = summary.get()
+    return _public_json(data['json'], data['json_etag'])
+
+
+def _public_json(body, etag):
+    """Öffentliches JSON: ETag + kurz cachebar für Browser und Proxies."""
+    response = make_response(body)
+    response.mimetype = 'application/json'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={summary.MAX_AGE}'
+    return response.make_conditional(request)
 
 
 @bp.route('/sync', methods=['POST'])
 @login_required
 @permission_required('stats_access')
 def sync_data():
-    """Liest die Daten von anbauverband.de ein."""
+    """Aktualisiert Anbauverband-Zahlen und Mariana-Anträge (beide Quellen parallel)."""
     try:
-        response = requests.get(URL_SOURCE, timeout=10)
-        response.raise_for_status()
+        result = sources.refresh_all()
 
-        soup = BeautifulSoup(response.content, 'html.parser')
+        messages = []
+        if result.status == sources.RESULT_UPDATED:
+            messages.append(f"{result.count} Bundesländer aktualisiert")
+        elif result.status is not None:
+            messages.append("Anbauverband: keine neuen Zahlen")
+        if sources.SOURCE_MARIANA not in result.errors:
+            messages.append(f"Mariana: {result.mariana_count} Werte übernommen")
+        if messages:
+            flash(f"Erfolgreich synchronisiert! {', '.join(messages)}.", "success")
 
-        # Tabelle finden (meistens die erste oder einzige Table)
-        table = soup.find('table')
-        if not table:
-            raise Exception("Keine Tabelle auf der Zielseite gefunden.")
+        for source, error in result.errors.items():
+            flash(f"Fehler beim Synchronisieren ({source}): {error}", "danger")
 
-        rows = table.find_all('tr')
+    except Exception as e:
+        flash(f"Fehler beim Synchronisieren: {str(e)}", "danger")
 
-        # Wir gehen davon aus, dass die erste Zeile der Header ist.
-        # Wir starten ab Zeile 1 (Index 0 ist Header).
-        # Manchmal ist der Header in <thead>, Body in <tbody>.
-        # Wir iterieren einfach und prüfen auf Inhalt.
+    return redirect(url_for('stats.index'))
 
-        count = 0
-        for row in rows:
-            cols = row.find_all('td')
-            if not cols: continue  # Header Zeile mit <th> überspringen
-
-            # Sicherheitscheck: Erwartet werden mind. 6 Spalten
-            if len(cols) < 6: continue
-
-            # Helper um Text zu Zahl zu wandeln (entfernt Punkte etc.)
-            def parse_int(col):
-                txt = col.get_text(strip=True).replace('.', '')
-                if not txt or txt == '-': return 0
-                if not txt.isnumeric(): return 0
-                return int(txt)
-
-            state_name = cols[0].get_text(strip=True)
-
-            # Wir wollen "Summe" oder "Gesamt" oft ausschließen,
-            # aber du wolltest es berechnen. Falls die Webseite eine Summenzeile hat,
-            # ignorieren wir sie lieber und rechnen selbst, um Konsistenz zu wahren.
-            if "Summe" in state_name or "Gesamt" in state_name:
-                continue
-
-            # Datenbank Update oder Insert (Upsert)
-            stat = MarketStat.query.filter_by(state_name=state_name).first()
-            if not stat:
-                stat = MarketStat(state_name=state_name)
-                db.session.add(stat)
-
-            stat.applied = parse_int(cols[1])
-            stat.approved = parse_int(cols[2])
-            stat.rejected = parse_int(cols[3])
-            stat.withdrawn = parse_int(cols[4])
-            stat.data_date = cols[5].get_text(strip=True)
-            stat.last_scraped = datetime.utcnow()
-
-            count += 1
 
-        db.session.commit()
-        flash(f"Erfolgreich synchronisiert! {count} Bundesländer aktualisiert.", "success")
+@bp.route('/api/history', methods=['GET'])
+def history_data():
+    """
+    Verlauf für das Diagramm. ?state=<Bundesland> (Default: DE = Summe),
+    optional ?from=/to= (YYYY-MM-DD) und ?points= (max. Anzahl Punkte).
+    """
+    try:
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else None
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'Ungültiges Datum (YYYY-MM-DD erwartet).'}), 400
 
-    except Exception as e:
-        flash(f"Fehler beim Synchronisieren: {str(e)}", "danger")
+    state = request.args.get('state') or history.NATIONAL
+    max_points = request.args.get('points', history.DEFAULT_MAX_POINTS, type=int)
 
-    return redirect(url_for('stats.index'))
+    def build():
+        points, downsampled = history.series(state, start, end, max_points=max_points)
+        return {'state': state, 'points': points, 'downsampled': downsampled}
+
+    # Standard-Aufruf des Diagramms (nur ?state=) kommt aus dem Cache (bis zum nächsten Sync)
+    entry = None
+    if start is None and end is None and max_points == history.DEFAULT_MAX_POINTS:
+        entry = summary.history(state, build)
+    if entry is None:
+        entry = summary.json_entry(build())
+    return _public_json(*entry)
 
 
 # NEU: Route zum Speichern der Mariana Zahlen
@@ -130,7 +138,9 @@ def update_mariana():
                 stat.mariana_withdrawn = get_val('m_withdrawn')
                 count += 1
 
+        history.record_snapshots()
         db.session.commit()
+        summary.invalidate()
         flash(f"Erfolgreich gespeichert! ({count} Datensätze aktualisiert)", "success")
 
     except Exception as e:
@@ -140,77 +150,21 @@ def update_mariana():
     return redirect(url_for('stats.index'))
 
 
-MARIANA_SHEET_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vQk7raieqSwVtFn6cD0KiQXpet7Ojx8QCAHsxeyek50HYJu5bCT1cET9jiCa7DOZQ/pub?output=csv&gid=1584782275"
-
-
 @bp.route('/fetch_mariana_sheet', methods=['GET'])
 @login_required
 @permission_required('stats_access')
 def fetch_mariana_sheet():
     """
-    Lädt die Mariana-Daten aus dem Google Sheet anhand fester Koordinaten.
+    Liefert die Mariana-Daten aus dem Google Sheet anhand fester Koordinaten
+    (aus dem Speicher, der Abruf läuft im Hintergrund).
     """
     try:
-        response = requests.get(MARIANA_SHEET_URL)
-        response.raise_for_status()
-
-        # CSV in eine Liste von Listen umwandeln (Das Raster)
-        decoded_content = response.content.decode('utf-8')
-        # Wir nutzen list(csv.reader(...)) um das komplette Grid im Speicher zu haben
-        grid = list(csv.reader(io.StringIO(decoded_content), delimiter=','))
-
-        # --- KONFIGURATION DER KOORDINATEN ---
-        # Format: 'Bundesland Name in DB': (Zeilen-Index, Spalten-Index)
-        # HINWEIS: Zeile 1 in Excel ist Index 0. Spalte A ist Index 0.
-        # Beispiel: Wert steht in C5 -> Zeile 4, Spalte 2
-
-        SHEET_COORDS = {
-            'Baden-Württemberg': (72, 4),  # <--- BITTE ÄNDERN
-            'Bayern': (57, 4),  # <--- BITTE ÄNDERN
-            'Berlin': (92, 7),  # <--- BITTE ÄNDERN
-            'Brandenburg': (92, 4),  # <--- BITTE ÄNDERN
-            'Bremen': (62, 4),  # <--- BITTE ÄNDERN
-            'Hamburg': (85, 4),  # <--- BITTE ÄNDERN
-            'Hessen': (66, 4),  # <--- BITTE ÄNDERN
-            'Mecklenburg-Vorpommern': (77, 4),  # <--- BITTE ÄNDERN
-            'Niedersachsen': (62, 7),  # <--- BITTE ÄNDERN
-            'Nordrhein-Westfalen': (66, 7),  # <--- BITTE ÄNDERN
-            'Rheinland-Pfalz': (77, 7),  # <--- BITTE ÄNDERN
-            'Saarland': (85, 7),  # <--- BITTE ÄNDERN
-            'Sachsen': (98, 7),  # <--- BITTE ÄNDERN
-            'Sachsen-Anhalt': (98, 4),  # <--- BITTE ÄNDERN
-            'Schleswig-Holstein': (72, 7),  # <--- BITTE ÄNDERN
-            'Thüringen': (57, 7),  # <--- BITTE ÄNDERN
-        }
-
-        data_map = {}
-
-        for state, (row_idx, col_idx) in SHEET_COORDS.items():
-            try:
-                # Prüfen, ob die Zelle existiert
-                if row_idx < len(grid) and col_idx < len(grid[row_idx]):
-                    raw_val = grid[row_idx][col_idx].strip()
-
-                    # Leere Felder zu 0
-                    if not raw_val:
-                        val = 0
-                    else:
-                        # Entferne Punkte (Tausendertrennzeichen) und parse Int
-                        # Falls da Text steht ("ca. 10"), entfernen wir alles was keine Zahl ist?
-                        # Besser: Wir versuchen strikt zu parsen, sonst 0
-                        clean_val = ''.join(filter(str.isdigit, raw_val))
-                        val = int(clean_val) if clean_val else 0
-
-                    data_map[state] = val
-                else:
-                    # Koordinate außerhalb der CSV
-                    data_map[state] = 0
-
-            except Exception:
-                # Fallback bei Fehler
-                data_map[state] = 0
-
-        return jsonify({"success": True, "data": data_map})
+        sheet = sources.mariana_sheet()
+        return jsonify({
+            "success": True,
+            "data": sources.mariana_values(sheet.grid),
+            "fetched_at": datetime.utcfromtimestamp(sheet.fetched_at).isoformat() + 'Z'
+        })
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -221,84 +175,49 @@ def fetch_mariana_sheet():
 @permission_required('stats_access')
 def debug_csv():
     """
-    Zeigt die 'Matrix' der CSV-Datei an.
+    Zeigt die 'Matrix' der CSV-Datei seitenweise an.
     Jede Zelle zeigt ihren Inhalt UND ihre Koordinaten [Zeile, Spalte].
+    ?q= sucht serverseitig und listet die Koordinaten der Treffer.
     """
-    import requests, csv, io
-
     try:
-        # CSV laden
-        response = requests.get(MARIANA_SHEET_URL)
-        response.raise_for_status()
-
-        # Grid erstellen
-        content = response.content.decode('utf-8')
-        grid = list(csv.reader(io.StringIO(content), delimiter=','))
-
-        # HTML bauen
-        html = """
-        <style>
-            body { font-family: sans-serif; padding: 20px; background: #f8f9fa; }
-            .matrix-table { border-collapse: collapse; width: 100%; font-size: 12px; }
-            .matrix-table td { 
-                border: 1px solid #dee2e6; 
-                padding: 8px; 
-                vertical-align: top;
-                background: white;
-                min-width: 100px;
-            }
-            .coord { 
-                display: block; 
-                font-size: 10px; 
-                color: #adb5bd; 
-                margin-bottom: 4px; 
-                font-family: monospace;
-            }
-            .val { font-weight: bold; color: #212529; }
-            .highlight { background-color: #d1e7dd !important; border: 2px solid #198754 !important; }
-            .search-box { 
-                position: fixed; top: 10px; right: 10px; 
-                background: white; padding: 15px; 
-                box-shadow: 0 4px 12px rgba(0,0,0,0.15); 
-                border-radius: 8px; z-index: 1000; 
-                border-left: 5px solid #0d6efd;
-            }
-        </style>
-
-        <div class="search-box">
-            <h4 style="margin-top:0">🔍 Koordinaten-Finder</h4>
-            <p style="margin-bottom:5px; font-size: 0.9rem;">Drücke <b>STRG + F</b> und suche dein Bundesland.</p>
-            <p style="margin-bottom:0; font-size: 0.9rem;">Die Zahl daneben hat die Koordinaten, die du brauchst.</p>
-        </div>
-
-        <h2 style="margin-top: 50px;">CSV Matrix Ansicht</h2>
-        <table class="matrix-table">
-        """
-
-        # Durch das Grid iterieren
-        for r_idx, row in enumerate(grid):
-            html += "<tr>"
-            # Zeilen-Index am Anfang
-            html += f"<td style='background:#e9ecef; font-weight:bold;'>Zeile {r_idx}</td>"
-
-            for c_idx, col in enumerate(row):
-                val = col.strip()
-
-                # Leere Zellen leicht ausgrauen, volle hervorheben
-                bg_style = ""
-                if val:
-                    # Wenn es nach einer Zahl aussieht, grünlich markieren
-                    if val.replace('.', '').isdigit():
-                        bg_style = "class='highlight'"
-
-                html += f"<td {bg_style}>"
-                html += f"<span class='coord'>[{r_idx}, {c_idx}]</span>"  # DIE KOORDINATE
-                html += f"<span class='val'>{val}</span>"
-                html += "</td>"
-            html += "</tr>"
-
-        html += "</table>"
-        return html
-
+        sheet = sources.mariana_sheet()
     except Exception as e:
-        return f"<h1>Fehler beim Laden:</h1><pre>{e}</pre>"
\ No newline at end of file
+        flash(f"Fehler beim Laden: {e}", "danger")
+        return redirect(url_for('stats.index'))
+
+    grid = sheet.grid
+    pages = max((len(grid) + SHEET_PAGE_SIZE - 1) // SHEET_PAGE_SIZE, 1)
+    page = min(max(request.args.get('page', 1, type=int), 1), pages)
+    q = request.args.get('q', '').strip()
+    matches, truncated = sources.find_cells(grid, q, limit=SHEET_SEARCH_LIMIT)
+
+    first = (page - 1) * SHEET_PAGE_SIZE
+    # Generator statt fertigem Raster: das Template wird Zeile für Zeile gestreamt
+    rows = ((first + i, row) for i, row in enumerate(grid[first:first + SHEET_PAGE_SIZE]))
+
+    return stream_template(
+        'stats/debug_csv.html',
+        rows=rows, page=page, pages=pages, page_size=SHEET_PAGE_SIZE, total_rows=len(grid),
+        q=q, matches=matches, truncated=truncated,
+        # Konfigurierte Koordinaten markieren (Zelle -> Bundesland)
+        coords={coord: state for state, coord in sources.SHEET_COORDS.items()},
+        fetched_at=datetime.utcfromtimestamp(sheet.fetched_at),
+    )
+
+
+@bp.route('/debug_csv/search', methods=['GET'])
+@login_required
+@permission_required('stats_access')
+def debug_csv_search():
+    """Koordinaten aller Zellen, die ?q= enthalten (JSON)."""
+    try:
+        grid = sources.mariana_sheet().grid
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    matches, truncated = sources.find_cells(grid, request.args.get('q', ''), limit=SHEET_SEARCH_LIMIT)
+    return jsonify({
+        "success": True,
+        "matches": [{"row": r, "col": c, "value": v, "page": r // SHEET_PAGE_SIZE + 1} for r, c, v in matches],
+        "truncated": truncated,
+    })
@@ -0,0 +1,579 @@
+"""
+Externe Datenquellen der Statistik-Seite.
+
+Anbauverband (Antrags- und Genehmigungszahlen):
+- Bedingter Abruf: ETag / Last-Modified der letzten Antwort liegen in den
+  Einstellungen und gehen als If-None-Match / If-Modified-Since mit.
+  Bei 304 wird nichts geparst und nichts geschrieben.
+- Die Rohantwort liegt in CACHE_DIR, so kann ohne neuen Abruf neu geparst
+  werden (z.B. nach einer Änderung am Parser).
+- Geparst wird nur die Tabelle (SoupStrainer), geschrieben wird mit EINEM
+  Upsert-Statement für alle Bundesländer. Geänderte Länder landen zusätzlich
+  im Verlauf (history.py).
+
+Mariana Google Sheet (CSV):
+- Das geparste Raster liegt pro Prozess im Speicher. Abgerufen wird nur von
+  einem Hintergrund-Thread (sofort beim ersten Zugriff, dann bedingt per ETag
+  alle MARIANA_SHEET_TTL Sekunden). Ein Request wartet höchstens
+  SHEET_FIRST_WAIT Sekunden auf den allerersten Stand; schlägt der fehl, gibt
+  es bis zum nächsten Versuch (SHEET_ERROR_RETRY) sofort einen Fehler.
+
+Refresh (refresh_all): beide Quellen werden parallel abgerufen und geparst
+(eigener kleiner Thread-Pool pro Aufruf, Deadline pro Quelle), geschrieben wird
+danach mit EINEM Commit. Die Dauer ist so die der langsameren Quelle, nicht die Summe.
+
+Alle Abrufe laufen über eine gemeinsame Session (Connection-Pool) und http_get():
+Timeouts und Retries werden aus der Deadline abgeleitet, ein Abruf endet also
+spätestens dann - inklusive Wiederholungen und langsam tröpfelnder Antworten.
+"""
+import csv
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+import requests
+from bs4 import BeautifulSoup, SoupStrainer
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+from sqlalchemy import case, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import settings
+from app.extensions import db
+from app.models import MarketStat
+from app.stats import history, summary
+
+log = logging.getLogger(__name__)
+
+URL_SOURCE = "https://anbauverband.de/antrags-und-genehmigungszahlen/"
+MARIANA_SHEET_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vQk7raieqSwVtFn6cD0KiQXpet7Ojx8QCAHsxeyek50HYJu5bCT1cET9jiCa7DOZQ/pub?output=csv&gid=1584782275"
+
+# Obergrenzen (Sekunden) für Verbindungsaufbau / Lesen - gekürzt auf die Restzeit bis zur Deadline
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 15
+# Wiederholungen bei Verbindungsfehlern, Timeouts und 429/5xx, Backoff 0.5s, 1s, 2s -
+# nur solange die Deadline noch Luft für Pause + neuen Versuch lässt
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# Deadline für Abrufe ohne eigene (z.B. Sheet-Refresh im Hintergrund)
+DEFAULT_DEADLINE = 20
+CHUNK_SIZE = 64 * 1024
+
+# Einstellungen (SystemSetting) für den bedingten Abruf
+SETTING_ETAG = 'stats_source_etag'
+SETTING_LAST_MODIFIED = 'stats_source_last_modified'
+SETTING_HASH = 'stats_source_hash'
+
+RAW_CACHE_FILE = 'anbauverband.html'
+
+STAT_FIELDS = ('applied', 'approved', 'rejected', 'withdrawn', 'data_date')
+
+SOURCE_ANBAUVERBAND = 'anbauverband'
+SOURCE_MARIANA = 'mariana'
+# Spätestens nach so vielen Sekunden wird ohne die Quelle weitergemacht
+SOURCE_DEADLINES = {SOURCE_ANBAUVERBAND: 20, SOURCE_MARIANA: 20}
+# Luft für den Worker nach seiner Deadline (Parsen), bevor refresh_all aufgibt
+DEADLINE_GRACE = 2
+
+# Ergebnis für den Anbauverband
+RESULT_UPDATED = 'updated'
+RESULT_NOT_MODIFIED = 'not_modified'
+RESULT_UNCHANGED = 'unchanged'  # 200, aber gleicher Inhalt wie beim letzten Mal
+
+
+class RefreshResult:
+    def __init__(self):
+        self.status = None        # RESULT_* für den Anbauverband
+        self.count = 0            # aktualisierte Bundesländer (Anbauverband)
+        self.mariana_count = 0    # übernommene Mariana-Werte
+        self.errors = {}          # Quelle -> Fehlermeldung
+
+
+# ==============================================================================
+# HTTP
+# ==============================================================================
+
+_http = None
+_http_lock = threading.Lock()
+
+
+def http():
+    """Gemeinsame requests.Session des Prozesses (hält die Verbindungen offen)."""
+    global _http
+    if _http is None:
+        with _http_lock:
+            if _http is None:
+                session = requests.Session()
+                # Retries macht http_get() selbst (mit Blick auf die Deadline)
+                adapter = HTTPAdapter(max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _http = session
+    return _http
+
+
+# Antwort von http_get (content komplett gelesen)
+HttpResponse = namedtuple('HttpResponse', 'status_code headers content')
+
+
+def _deadline_from(deadline):
+    return time.monotonic() + DEFAULT_DEADLINE if deadline is None else deadline
+
+
+def _remaining(deadline, url):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise requests.Timeout(f"Deadline überschritten: {url}")
+    return remaining
+
+
+def _read(response, deadline, url):
+    """
+    Body stückweise lesen. Vor jedem Lesen wird der Socket-Timeout auf die Restzeit
+    gekürzt - auch eine tröpfelnde Antwort endet so zur Deadline.
+    """
+    raw = response.raw
+    read = getattr(raw, 'read1', None) or raw.read  # read1: liefert, was gerade da ist
+    chunks = []
+    while True:
+        remaining = _remaining(deadline, url)
+        sock = getattr(raw.connection, 'sock', None)
+        if sock is not None:
+            sock.settimeout(min(READ_TIMEOUT, remaining))
+        try:
+            chunk = read(CHUNK_SIZE, decode_content=True)
+        except ReadTimeoutError as e:
+            raise requests.Timeout(e)
+        except ProtocolError as e:
+            raise requests.ConnectionError(e)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+
+
+def http_get(url, headers=None, deadline=None):
+    """
+    GET mit Timeouts und Retries, die zusammen nie über deadline (time.monotonic()) hinausgehen.
+    Gibt HttpResponse zurück (auch 304); 4xx/5xx nach dem letzten Versuch -> requests.HTTPError,
+    Deadline überschritten -> requests.Timeout.
+    """
+    deadline = _deadline_from(deadline)
+    attempt = 0
+    while True:
+        remaining = _remaining(deadline, url)
+        timeout = (min(CONNECT_TIMEOUT, remaining), min(READ_TIMEOUT, remaining))
+        try:
+            with http().get(url, headers=headers or {}, timeout=timeout, stream=True) as response:
+                if response.status_code not in RETRY_STATUS:
+                    if response.status_code >= 400:
+                        response.raise_for_status()
+                    return HttpResponse(response.status_code, response.headers, _read(response, deadline, url))
+                error = requests.HTTPError(f"{response.status_code} für {url}", response=response)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+
+        attempt += 1
+        delay = RETRY_BACKOFF * 2 ** (attempt - 1)
+        # Kein neuer Versuch, wenn nach der Pause keine Zeit mehr bliebe
+        if attempt > MAX_RETRIES or time.monotonic() + delay >= deadline:
+            raise error
+        time.sleep(delay)
+
+
+# ==============================================================================
+# ROHANTWORT (CACHE_DIR)
+# ==============================================================================
+
+def _raw_path():
+    return os.path.join(current_app.config['CACHE_DIR'], RAW_CACHE_FILE)
+
+
+def _store_raw(content):
+    path = _raw_path()
+    tmp = f"{path}.{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def load_raw():
+    """Zuletzt abgerufene Seite (bytes) oder None."""
+    try:
+        with open(_raw_path(), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+# ==============================================================================
+# ABRUF + PARSEN
+# ==============================================================================
+
+def conditional_headers():
+    """If-None-Match / If-Modified-Since aus den Einstellungen (braucht den App-Kontext)."""
+    headers = {}
+    etag = settings.get(SETTING_ETAG)
+    last_modified = settings.get(SETTING_LAST_MODIFIED)
+    if etag: headers['If-None-Match'] = etag
+    if last_modified: headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+def fetch(headers=None, url=None, deadline=None):
+    """
+    Ruft die Seite ab (Default: URL_SOURCE). Gibt (Inhalt, Validatoren) zurück - Inhalt None bei 304.
+    Ohne DB-Zugriff, läuft also auch im Worker-Thread.
+    """
+    response = http_get(url or URL_SOURCE, headers, deadline)
+    if response.status_code == 304:
+        return None, {}
+    validators = {
+        SETTING_ETAG: response.headers.get('ETag') or '',
+        SETTING_LAST_MODIFIED: response.headers.get('Last-Modified') or '',
+    }
+    return response.content, validators
+
+
+def _parse_int(col):
+    """Text zu Zahl (Tausenderpunkte entfernen), '-' und Leeres zu 0."""
+    txt = col.get_text(strip=True).replace('.', '')
+    if not txt or txt == '-': return 0
+    if not txt.isnumeric(): return 0
+    return int(txt)
+
+
+def parse(content):
+    """
+    Liest die Zahlen aus der (ersten) Tabelle der Seite.
+    Gibt eine Liste von Dicts (state_name + STAT_FIELDS) zurück.
+    """
+    # Nur <table> und Inhalt aufbauen, der Rest der Seite wird übersprungen
+    soup = BeautifulSoup(content, 'html.parser', parse_only=SoupStrainer('table'))
+    table = soup.find('table')
+    if not table:
+        raise ValueError("Keine Tabelle auf der Zielseite gefunden.")
+
+    rows = []
+    for tr in table.find_all('tr'):
+        cols = tr.find_all('td')
+        # Header-Zeilen (<th>) und unvollständige Zeilen überspringen
+        if len(cols) < 6: continue
+
+        state_name = cols[0].get_text(strip=True)
+        # Summenzeile der Webseite ignorieren, wir rechnen selbst
+        if "Summe" in state_name or "Gesamt" in state_name:
+            continue
+
+        rows.append({
+            'state_name': state_name,
+            'applied': _parse_int(cols[1]),
+            'approved': _parse_int(cols[2]),
+            'rejected': _parse_int(cols[3]),
+            'withdrawn': _parse_int(cols[4]),
+            'data_date': cols[5].get_text(strip=True),
+        })
+    return rows
+
+
+# ==============================================================================
+# SPEICHERN
+# ==============================================================================
+
+def upsert(rows, scraped_at=None):
+    """Alle Bundesländer mit EINEM INSERT ... ON CONFLICT(state_name) DO UPDATE."""
+    if not rows:
+        return 0
+    scraped_at = scraped_at or datetime.utcnow()
+    stmt = sqlite_insert(MarketStat).values([dict(r, last_scraped=scraped_at) for r in rows])
+    # Mariana-Zahlen bleiben unangetastet
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MarketStat.state_name],
+        set_={f: stmt.excluded[f] for f in STAT_FIELDS + ('last_scraped',)}
+    )
+    db.session.execute(stmt)
+    return len(rows)
+
+
+def reparse():
+    """Parst die zuletzt abgerufene Seite erneut (ohne Abruf). Gibt die Anzahl zurück."""
+    content = load_raw()
+    if content is None:
+        raise ValueError("Keine zwischengespeicherte Seite vorhanden - erst synchronisieren.")
+    count = upsert(parse(content))
+    history.record_snapshots()
+    db.session.commit()
+    summary.invalidate()
+    return count
+
+
+# ==============================================================================
+# MARIANA SHEET
+# ==============================================================================
+
+# Format: 'Bundesland Name in DB': (Zeilen-Index, Spalten-Index)
+# HINWEIS: Zeile 1 in Excel ist Index 0. Spalte A ist Index 0.
+# Beispiel: Wert steht in C5 -> Zeile 4, Spalte 2
+SHEET_COORDS = {
+    'Baden-Württemberg': (72, 4),
+    'Bayern': (57, 4),
+    'Berlin': (92, 7),
+    'Brandenburg': (92, 4),
+    'Bremen': (62, 4),
+    'Hamburg': (85, 4),
+    'Hessen': (66, 4),
+    'Mecklenburg-Vorpommern': (77, 4),
+    'Niedersachsen': (62, 7),
+    'Nordrhein-Westfalen': (66, 7),
+    'Rheinland-Pfalz': (77, 7),
+    'Saarland': (85, 7),
+    'Sachsen': (98, 7),
+    'Sachsen-Anhalt': (98, 4),
+    'Schleswig-Holstein': (72, 7),
+    'Thüringen': (57, 7),
+}
+
+# So lange (Sekunden) wartet ein Request höchstens auf den ersten Abruf im Prozess
+SHEET_FIRST_WAIT = 2
+# Ohne Stand im Speicher wird nach einem Fehler schon nach so vielen Sekunden neu versucht
+SHEET_ERROR_RETRY = 30
+
+# grid = Liste von Zeilen (Liste von Zellen), fetched_at = time.time() des letzten Abrufs
+SheetGrid = namedtuple('SheetGrid', 'grid etag last_modified fetched_at')
+
+
+class SheetUnavailable(Exception):
+    """Noch kein Stand des Sheets im Speicher (wird geladen oder Abruf fehlgeschlagen)."""
+
+
+class SheetCache:
+    """
+    Das geparste Sheet, einmal pro Prozess.
+    get() liefert immer den Stand aus dem Speicher und ruft nie selbst ab; schlägt
+    ein Refresh im Hintergrund fehl, bleibt der alte Stand stehen.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.ttl = None
+        self._entry = None
+        self._error = None  # Meldung des letzten fehlgeschlagenen Abrufs
+        self._attempted = threading.Event()  # erster Abruf beendet (mit oder ohne Erfolg)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def get(self, ttl):
+        self.ttl = ttl
+        self._ensure_refresher()
+        entry = self._entry
+        if entry is None:
+            # Den ersten Abruf macht der Hintergrund-Thread - hier nur kurz darauf warten
+            self._attempted.wait(SHEET_FIRST_WAIT)
+            entry = self._entry
+        if entry is None:
+            if self._error:
+                raise SheetUnavailable(f"Mariana Sheet nicht erreichbar: {self._error}")
+            raise SheetUnavailable("Mariana Sheet wird noch geladen - bitte gleich noch einmal versuchen.")
+        return entry
+
+    def refresh(self, deadline=None):
+        deadline = _deadline_from(deadline)
+        # Läuft gerade der Hintergrund-Refresh, höchstens bis zur Deadline warten
+        if not self._lock.acquire(timeout=_remaining(deadline, self.url)):
+            raise requests.Timeout(f"Deadline überschritten: {self.url}")
+        try:
+            self._entry = self._fetch(self._entry, deadline)
+            self._error = None
+            return self._entry
+        except Exception as e:
+            self._error = str(e)
+            raise
+        finally:
+            self._lock.release()
+
+    def _fetch(self, previous, deadline=None):
+        headers = {}
+        if previous is not None:
+            if previous.etag: headers['If-None-Match'] = previous.etag
+            if previous.last_modified: headers['If-Modified-Since'] = previous.last_modified
+
+        response = http_get(self.url, headers, deadline)
+        if response.status_code == 304:
+            if previous is not None:
+                return previous._replace(fetched_at=time.time())
+            raise requests.HTTPError(f"304 ohne vorherigen Stand: {self.url}")
+
+        grid = list(csv.reader(io.StringIO(response.content.decode('utf-8')), delimiter=','))
+        return SheetGrid(grid, response.headers.get('ETag'), response.headers.get('Last-Modified'), time.time())
+
+    def _ensure_refresher(self):
+        # Nach einem Fork (Gunicorn) läuft der Thread im Kind nicht mehr -> neu starten
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='mariana-sheet-refresh', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                log.warning(f"Mariana Sheet Refresh fehlgeschlagen: {e}")
+            finally:
+                self._attempted.set()
+            time.sleep(SHEET_ERROR_RETRY if self._entry is None else self.ttl)
+
+
+_sheet = SheetCache(MARIANA_SHEET_URL)
+
+
+def mariana_sheet():
+    """Aktuelles Raster des Mariana Sheets (SheetGrid) aus dem Speicher."""
+    return _sheet.get(current_app.config.get('MARIANA_SHEET_TTL', 300))
+
+
+def _cell_int(grid, row_idx, col_idx):
+    """Zahl aus einer Zelle. Leer, Text oder außerhalb des Rasters -> 0."""
+    if row_idx >= len(grid) or col_idx >= len(grid[row_idx]):
+        return 0
+    # Tausenderpunkte, "ca." etc. entfernen - es zählen nur die Ziffern
+    digits = ''.join(filter(str.isdigit, grid[row_idx][col_idx]))
+    return int(digits) if digits else 0
+
+
+def mariana_values(grid):
+    """{Bundesland: Anzahl Anträge} anhand SHEET_COORDS."""
+    return {state: _cell_int(grid, r, c) for state, (r, c) in SHEET_COORDS.items()}
+
+
+def update_mariana_applied(values):
+    """Mariana-Anträge aller Länder mit EINEM UPDATE (CASE über state_name)."""
+    if not values:
+        return 0
+    stmt = update(MarketStat).where(MarketStat.state_name.in_(list(values))) \
+        .values(mariana_applied=case(values, value=MarketStat.state_name)) \
+        .execution_options(synchronize_session=False)
+    return db.session.execute(stmt).rowcount
+
+
+# ==============================================================================
+# REFRESH (BEIDE QUELLEN)
+# ==============================================================================
+
+# Ergebnis des Anbauverband-Workers (rows = None -> Inhalt unverändert, nicht geparst)
+AnbauFetch = namedtuple('AnbauFetch', 'content validators digest rows')
+
+
+def _fetch_anbauverband(headers, known_hash, deadline):
+    """Worker-Thread: Abruf + Parsen. None bei 304."""
+    content, validators = fetch(headers, deadline=deadline)
+    if content is None:
+        return None
+    digest = hashlib.sha256(content).hexdigest()
+    rows = None if digest == known_hash else parse(content)
+    return AnbauFetch(content, validators, digest, rows)
+
+
+def _fetch_mariana(deadline):
+    """Worker-Thread: Sheet neu laden (bedingt) und die Werte auslesen."""
+    return mariana_values(_sheet.refresh(deadline).grid)
+
+
+def _apply_anbauverband(fetched, result, now):
+    """Schreibt das Ergebnis (ohne Commit). Gibt die zu merkenden Validatoren zurück."""
+    if fetched is None:
+        # 304: Stand bestätigen, sonst nichts tun
+        db.session.execute(update(MarketStat).values(last_scraped=now))
+        result.status = RESULT_NOT_MODIFIED
+        return {}
+
+    _store_raw(fetched.content)
+    if fetched.rows is None:
+        # Server ohne (passende) Validatoren, aber gleicher Inhalt
+        db.session.execute(update(MarketStat).values(last_scraped=now))
+        result.status = RESULT_UNCHANGED
+    else:
+        result.count = upsert(fetched.rows, scraped_at=now)
+        result.status = RESULT_UPDATED
+    return dict(fetched.validators, **{SETTING_HASH: fetched.digest})
+
+
+def refresh_all(force=False):
+    """
+    Anbauverband + Mariana Sheet parallel abrufen und mit EINEM Commit speichern.
+    Eine Quelle, die fehlschlägt oder ihre Deadline reißt, landet in result.errors;
+    die andere wird trotzdem übernommen.
+    force=True schickt keine Validatoren mit (kompletter Abruf + Parsen).
+    """
+    result = RefreshResult()
+    now = datetime.utcnow()
+
+    # Alles, was DB / App-Kontext braucht, vorher im Request-Thread lesen
+    headers = {} if force else conditional_headers()
+    known_hash = None if force else settings.get(SETTING_HASH)
+
+    # Eigener Pool pro Aufruf: ein hängender Worker blockiert so nie den nächsten Refresh.
+    # Die Worker halten ihre Deadline selbst ein (http_get), der Pool wird nicht abgewartet.
+    started = time.monotonic()
+    deadlines = {source: started + seconds for source, seconds in SOURCE_DEADLINES.items()}
+    pool = ThreadPoolExecutor(max_workers=len(SOURCE_DEADLINES), thread_name_prefix='stats-refresh')
+    futures = {
+        SOURCE_ANBAUVERBAND: pool.submit(_fetch_anbauverband, headers, known_hash, deadlines[SOURCE_ANBAUVERBAND]),
+        SOURCE_MARIANA: pool.submit(_fetch_mariana, deadlines[SOURCE_MARIANA]),
+    }
+    pool.shutdown(wait=False)
+    fetched = {}
+    for source, future in futures.items():
+        remaining = deadlines[source] + DEADLINE_GRACE - time.monotonic()
+        try:
+            fetched[source] = future.result(timeout=max(remaining, 0))
+        except (FutureTimeout, requests.Timeout):
+            result.errors[source] = f"Keine Antwort nach {SOURCE_DEADLINES[source]} Sekunden."
+        except Exception as e:
+            result.errors[source] = str(e)
+
+    validators = {}
+    try:
+        if SOURCE_ANBAUVERBAND in fetched:
+            validators = _apply_anbauverband(fetched[SOURCE_ANBAUVERBAND], result, now)
+        if SOURCE_MARIANA in fetched:
+            result.mariana_count = update_mariana_applied(fetched[SOURCE_MARIANA])
+        history.record_snapshots(now)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    summary.invalidate()
+
+    # Validatoren erst nach erfolgreichem Speichern merken, sonst gäbe es beim
+    # nächsten Mal ein 304 ohne Daten in der DB
+    if any(settings.get(k) != v for k, v in validators.items()):
+        settings.set_many(validators)
+    return result
+
+
+def find_cells(grid, term, limit=50):
+    """
+    Zellen, deren Inhalt term enthält (ohne Groß-/Kleinschreibung).
+    Gibt ([(Zeile, Spalte, Wert)], gekürzt?) zurück - Suche endet nach limit Treffern.
+    """
+    needle = (term or '').strip().casefold()
+    if not needle:
+        return [], False
+    matches = []
+    for r_idx, row in enumerate(grid):
+        for c_idx, value in enumerate(row):
+            if needle in value.casefold():
+                if len(matches) == limit:
+                    return matches, True
+                matches.append((r_idx, c_idx, value.strip()))
+    return matches, False
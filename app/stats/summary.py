@@ -0,0 +1,115 @@
+"""
+Öffentliche Statistik (stats.index, /stats/api/summary und /stats/api/history).
+
+Die Seite wird extern geteilt und bekommt Lastspitzen. Zahlen, Summen, JSON,
+der Verlauf pro Bundesland (den das Diagramm bei jedem Aufruf lädt) und das
+fertige HTML für nicht eingeloggte Besucher liegen deshalb im Prozess-Cache und
+werden erst nach dem nächsten Sync / Mariana-Update neu aufgebaut. Ein Treffer
+kostet so weder DB-Abfrage noch Rendering.
+"""
+import hashlib
+import json
+from app.cache import GenerationCache
+from app.extensions import db
+from app.models import MarketStat
+from app.stats.history import NATIONAL
+
+# Browser / Proxies dürfen so lange (Sekunden) ohne Nachfrage ausliefern
+MAX_AGE = 60
+
+STAT_FIELDS = ('applied', 'approved', 'rejected', 'withdrawn')
+MARIANA_FIELDS = ('mariana_applied', 'mariana_approved', 'mariana_rejected', 'mariana_withdrawn')
+COLUMNS = ('id', 'state_name', 'data_date', 'last_scraped') + STAT_FIELDS + MARIANA_FIELDS
+
+
+def _open(values, prefix=''):
+    return values[f'{prefix}applied'] - (
+        values[f'{prefix}approved'] + values[f'{prefix}rejected'] + values[f'{prefix}withdrawn'])
+
+
+def _etag(content):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:20]
+
+
+def json_entry(payload):
+    """(JSON, ETag) - dieselbe Serialisierung wie im Cache."""
+    body = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return body, _etag(body)
+
+
+def _load():
+    rows = db.session.query(*[getattr(MarketStat, c) for c in COLUMNS]).all()
+
+    # Dicts mit denselben Namen wie am Model -> das Template bleibt unverändert
+    stats = []
+    for row in rows:
+        s = row._asdict()
+        for f in STAT_FIELDS + MARIANA_FIELDS:
+            s[f] = s[f] or 0
+        s['open_applications'] = _open(s)
+        s['mariana_open'] = _open(s, 'mariana_')
+        stats.append(s)
+
+    totals = {f: sum(s[f] for s in stats) for f in STAT_FIELDS + MARIANA_FIELDS}
+    totals['open_applications'] = _open(totals)
+    totals['mariana_open'] = _open(totals, 'mariana_')
+
+    last_update = max((s['last_scraped'] for s in stats if s['last_scraped']), default=None)
+    payload = {
+        'last_update': last_update.isoformat() + 'Z' if last_update else None,
+        'totals': totals,
+        'open_applications': totals['open_applications'],
+        'states': [
+            {k: v for k, v in s.items() if k not in ('id', 'last_scraped')}
+            for s in sorted(stats, key=lambda s: s['state_name'] or '')
+        ],
+    }
+    body, etag = json_entry(payload)
+    return {
+        'stats': stats,
+        'last_update': last_update,
+        'json': body,
+        'json_etag': etag,
+        'html': {},  # (Pfad, Version) -> (HTML, ETag), nur für anonyme Besucher
+        'states': {s['state_name'] for s in stats},
+        'history': {},  # Bundesland -> (JSON, ETag), Standard-Zeitraum
+    }
+
+
+_summary = GenerationCache('stats_public', _load)
+
+
+def get():
+    return _summary.get()
+
+
+def invalidate():
+    _summary.invalidate()
+
+
+def rendered(key, render):
+    """
+    Fertiges HTML (+ ETag) für anonyme Besucher, pro Schlüssel einmal gerendert.
+    render() wird nur beim ersten Aufruf nach einer Invalidierung ausgeführt.
+    """
+    cache = _summary.get()['html']
+    entry = cache.get(key)
+    if entry is None:
+        html = render()
+        entry = cache[key] = (html, _etag(html))
+    return entry
+
+
+def history(state, build):
+    """
+    Verlauf als JSON (+ ETag) für ein Bundesland, gebaut mit build() - pro Stand
+    einmal. Gecacht wird nur für bekannte Bundesländer (und die Summe), damit
+    beliebige ?state=-Werte den Cache nicht aufblähen. Sonst: None.
+    """
+    data = _summary.get()
+    if state not in data['states'] and state != NATIONAL:
+        return None
+    entry = data['history'].get(state)
+    if entry is None:
+        entry = data['history'][state] = json_entry(build())
+    return entry
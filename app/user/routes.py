@@ -1,6 +1,7 @@
 from flask import render_template, redirect, url_for, flash, request, Blueprint, jsonify
 from flask_login import login_required, current_user
 from werkzeug.security import generate_password_hash
+from sqlalchemy.orm import selectinload
 from app.extensions import db
 from datetime import datetime
 from app.models import User, Permission, Inspection, InspectionLog, Verein
@@ -66,7 +67,7 @@ def list_users():
 
     # last_visit übergeben
     return render_template('admin/users.html',
-                           users=User.query.all(),
+                           users=User.query.options(selectinload(User.permissions)).all(),
                            vereine=Verein.query.order_by(Verein.name).all(),
                            all_permissions=Permission.query.all(),
                            last_visit=last_visit)
@@ -0,0 +1,122 @@
+"""
+Zwischenspeicher für den eingeloggten User.
+
+Der User-Loader liefert statt des ORM-Objekts einen CachedUser: Stammdaten und
+Berechtigungen (als Bitmaske) liegen im Prozess-Cache (TTL + Versionsstempel
+pro User). Alles andere (Relationen, Passwort ...) wird erst beim Zugriff aus
+der DB nachgeladen. Normale Seitenaufrufe brauchen so keine Auth-Queries.
+"""
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.cache import KeyedGenerationCache
+from app.extensions import db, login_manager
+from app.models import User, Permission
+
+# Felder, die ohne DB-Zugriff verfügbar sind
+SNAPSHOT_FIELDS = (
+    'id', 'username', 'first_name', 'last_name', 'email', 'is_admin', 'created_at', 'verein_id', 'permission_mask',
+    'last_projects_visit', 'last_users_visit', 'last_roadmap_visit', 'onboarding_confirmed_at',
+)
+
+
+def _load_snapshot(user_id):
+    """Lädt Stammdaten inkl. Permission-Bitmaske mit EINER Abfrage."""
+    columns = [getattr(User, f) for f in SNAPSHOT_FIELDS]
+    row = db.session.query(*columns).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    return dict(zip(SNAPSHOT_FIELDS, row))
+
+
+class _UserCache(KeyedGenerationCache):
+    def get(self, key):
+        # TTL aus der Config (kann pro App unterschiedlich sein)
+        self.ttl = current_app.config.get('USER_CACHE_TTL', 60)
+        return super().get(key)
+
+
+_cache = _UserCache('user', _load_snapshot)
+
+
+class CachedUser(UserMixin):
+    """
+    Leichtgewichtiger Ersatz für das User-Objekt in current_user.
+    Schreibzugriffe und unbekannte Attribute gehen an das ORM-Objekt (lazy geladen).
+    """
+
+    def __init__(self, snapshot):
+        object.__setattr__(self, '_snapshot', dict(snapshot))
+        object.__setattr__(self, '_model', None)
+
+    @property
+    def model(self):
+        """Das echte ORM-Objekt (erst beim ersten Zugriff aus der DB)."""
+        if self._model is None:
+            object.__setattr__(self, '_model', db.session.get(User, self._snapshot['id']))
+        return self._model
+
+    def __getattr__(self, name):
+        snapshot = object.__getattribute__(self, '_snapshot')
+        if name in snapshot:
+            return snapshot[name]
+        return getattr(self.model, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.model, name, value)
+        if name in self._snapshot:
+            self._snapshot[name] = value
+
+    def get_id(self):
+        return str(self._snapshot['id'])
+
+    def has_permission(self, slug_name):
+        return self.has_mask(Permission.flag_for(slug_name))
+
+    def has_mask(self, flags):
+        if self._snapshot['is_admin']:
+            return True
+        return bool((self._snapshot['permission_mask'] or 0) & flags)
+
+    # Gleiche Logik wie am Model, greift aber auf den Snapshot zu
+    display_name = User.display_name
+    full_name = User.full_name
+
+
+@login_manager.user_loader
+def load_cached_user(user_id):
+    snapshot = _cache.get(int(user_id))
+    if snapshot is None:
+        return None
+    return CachedUser(snapshot)
+
+
+def invalidate_user(user_id):
+    _cache.invalidate(user_id)
+
+
+# --- Invalidierung ---
+# Jede Änderung an einem User (Profil, Rechte, Besuchszeitpunkte, Löschen ...) wird
+# nach dem Commit invalidiert - egal aus welcher Route sie kommt.
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault('changed_user_ids', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            changed.add(obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    changed = session.info.pop('changed_user_ids', ())
+    if not has_app_context():
+        return
+    for user_id in changed:
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_user_ids', None)
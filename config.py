@@ -29,6 +29,35 @@ class Config:
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'app', 'static', 'uploads')
     STATIC_FOLDER = os.path.join(BASE_DIR, 'app', 'static')
 
+    # Generationszähler für die In-Process-Caches (muss für alle Worker gleich sein)
+    CACHE_DIR = os.environ.get('CACHE_DIR') or os.path.join(BASE_DIR, 'instance', 'cache')
+
+    # Wie lange der eingeloggte User (inkl. Rechte) im Prozess gecacht wird (Sekunden)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 60)
+
+    # Import (Bereichsleitung): so viele Zeilen pro Bulk-Schreibvorgang + Commit
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE') or 500)
+
+    # Mariana Google Sheet: so oft (Sekunden) wird im Hintergrund neu abgerufen
+    MARIANA_SHEET_TTL = int(os.environ.get('MARIANA_SHEET_TTL') or 300)
+
+    # Formbuilder-Sicherungen: die letzten N immer, danach stündlich für so viele Stunden,
+    # dann täglich für so viele Tage
+    FORM_BACKUP_KEEP_LATEST = int(os.environ.get('FORM_BACKUP_KEEP_LATEST') or 20)
+    FORM_BACKUP_KEEP_HOURS = int(os.environ.get('FORM_BACKUP_KEEP_HOURS') or 24)
+    FORM_BACKUP_KEEP_DAYS = int(os.environ.get('FORM_BACKUP_KEEP_DAYS') or 30)
+
+    # Mail-Outbox: Mails pro SMTP-Verbindung, Versuche bis zum Aufgeben, Prüfintervall (Sekunden)
+    MAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('MAIL_OUTBOX_BATCH_SIZE') or 20)
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('MAIL_OUTBOX_MAX_ATTEMPTS') or 6)
+    MAIL_OUTBOX_POLL = int(os.environ.get('MAIL_OUTBOX_POLL') or 30)
+    # Socket-Timeout (Sekunden) für SMTP - deutlich unter der Reservierung eines Batches (5 Minuten)
+    MAIL_OUTBOX_SMTP_TIMEOUT = int(os.environ.get('MAIL_OUTBOX_SMTP_TIMEOUT') or 30)
+    # Verschickte / aufgegebene Mails werden nach so vielen Tagen gelöscht (der Text sofort)
+    MAIL_OUTBOX_KEEP_DAYS = int(os.environ.get('MAIL_OUTBOX_KEEP_DAYS') or 7)
+    # False = kein Hintergrund-Thread, Versand nur über `flask commands mail-send` (z.B. Cron)
+    MAIL_OUTBOX_THREAD = os.environ.get('MAIL_OUTBOX_THREAD', 'True') == 'True'
+
     # MAIL SETTINGS
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
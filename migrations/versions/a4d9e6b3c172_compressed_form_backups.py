@@ -0,0 +1,78 @@
+"""compressed form backups
+
+Revision ID: a4d9e6b3c172
+Revises: f2a7c3e9d514
+Create Date: 2026-10-19 19:12:44.518203
+
+"""
+import hashlib
+import json
+import zlib
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d9e6b3c172'
+down_revision = 'f2a7c3e9d514'
+branch_labels = None
+depends_on = None
+
+
+def _encode(data_json):
+    # Wie app.formbuilder.backups.encode (kanonisch, damit gleiche Stände zusammenfallen)
+    try:
+        raw = json.dumps(json.loads(data_json), ensure_ascii=False, sort_keys=True,
+                         separators=(',', ':')).encode('utf-8')
+    except (TypeError, ValueError):
+        raw = (data_json or 'null').encode('utf-8')
+    return hashlib.sha256(raw).hexdigest(), zlib.compress(raw, 6), len(raw)
+
+
+def upgrade():
+    blob = op.create_table('immo_backup_blob',
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('content_hash')
+    )
+    with op.batch_alter_table('immo_backup', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+    # Bestehende Sicherungen komprimieren (gleiche Inhalte nur einmal)
+    bind = op.get_bind()
+    blobs = {}
+    for backup_id, data_json in bind.execute(sa.text("SELECT id, data_json FROM immo_backup")).fetchall():
+        content_hash, data, size = _encode(data_json)
+        blobs.setdefault(content_hash, {'content_hash': content_hash, 'data': data, 'size': size})
+        bind.execute(sa.text("UPDATE immo_backup SET content_hash = :h WHERE id = :id"),
+                     {'h': content_hash, 'id': backup_id})
+    if blobs:
+        op.bulk_insert(blob, list(blobs.values()))
+
+    with op.batch_alter_table('immo_backup', schema=None) as batch_op:
+        batch_op.alter_column('content_hash', existing_type=sa.String(length=64), nullable=False)
+        batch_op.create_foreign_key('fk_immo_backup_content_hash', 'immo_backup_blob',
+                                    ['content_hash'], ['content_hash'])
+        batch_op.create_index(batch_op.f('ix_immo_backup_created_at'), ['created_at'], unique=False)
+        batch_op.drop_column('data_json')
+
+
+def downgrade():
+    with op.batch_alter_table('immo_backup', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_json', sa.TEXT(), nullable=True))
+
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT b.id, x.data FROM immo_backup b JOIN immo_backup_blob x ON x.content_hash = b.content_hash"
+    )).fetchall()
+    for backup_id, data in rows:
+        bind.execute(sa.text("UPDATE immo_backup SET data_json = :d WHERE id = :id"),
+                     {'d': zlib.decompress(data).decode('utf-8'), 'id': backup_id})
+
+    with op.batch_alter_table('immo_backup', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_immo_backup_created_at'))
+        batch_op.drop_constraint('fk_immo_backup_content_hash', type_='foreignkey')
+        batch_op.drop_column('content_hash')
+
+    op.drop_table('immo_backup_blob')
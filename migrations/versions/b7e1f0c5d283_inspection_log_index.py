@@ -0,0 +1,26 @@
+"""inspection log index
+
+Revision ID: b7e1f0c5d283
+Revises: a4d9e6b3c172
+Create Date: 2026-10-19 20:03:26.771940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e1f0c5d283'
+down_revision = 'a4d9e6b3c172'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('inspection_log', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_inspection_log_inspection_id'), ['inspection_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('inspection_log', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_inspection_log_inspection_id'))
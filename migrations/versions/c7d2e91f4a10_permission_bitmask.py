@@ -0,0 +1,56 @@
+"""permission bitmask
+
+Revision ID: c7d2e91f4a10
+Revises: aa67eeef5c45
+Create Date: 2026-10-19 10:12:44.120331
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d2e91f4a10'
+down_revision = 'aa67eeef5c45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # permission_mask ist ein vorzeichenbehafteter 64-Bit-Integer -> höchstens 63 Bits
+    count = op.get_bind().execute(sa.text("SELECT COUNT(*) FROM permission")).scalar()
+    if count > 63:
+        raise RuntimeError(f"{count} Permissions passen nicht in permission_mask (maximal 63).")
+
+    with op.batch_alter_table('permission', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('bit', sa.Integer(), nullable=True))
+        batch_op.create_unique_constraint('uq_permission_bit', ['bit'])
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('permission_mask', sa.BigInteger(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('user_permissions', schema=None) as batch_op:
+        batch_op.create_index('ix_user_permissions_permission_id', ['permission_id'], unique=False)
+
+    # Bestehende Daten: Bits lückenlos nach id vergeben (Lücken in den ids würden sonst
+    # schnell über Bit 62 hinausführen), Maske aus der Zuordnungstabelle berechnen
+    op.execute("UPDATE permission SET bit = (SELECT COUNT(*) FROM permission p2 WHERE p2.id < permission.id)")
+    op.execute(
+        'UPDATE "user" SET permission_mask = ('
+        '  SELECT COALESCE(SUM(1 << p.bit), 0) FROM user_permissions up'
+        '  JOIN permission p ON p.id = up.permission_id'
+        '  WHERE up.user_id = "user".id'
+        ')'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user_permissions', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_permissions_permission_id')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('permission_mask')
+
+    with op.batch_alter_table('permission', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_permission_bit', type_='unique')
+        batch_op.drop_column('bit')
@@ -0,0 +1,36 @@
+"""search prefix indexes
+
+Revision ID: d3a8f5b21c47
+Revises: c7d2e91f4a10
+Create Date: 2026-10-19 14:03:27.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a8f5b21c47'
+down_revision = 'c7d2e91f4a10'
+branch_labels = None
+depends_on = None
+
+# (Index, Tabelle, Spalte) - NOCASE, damit SQLite LIKE 'abc%' über den Index auflöst
+INDEXES = [
+    ('ix_anbaustelle_name_nocase', 'anbaustelle', 'name'),
+    ('ix_ausgabestelle_address_nocase', 'ausgabestelle', 'address'),
+    ('ix_ausgabestelle_name_nocase', 'ausgabestelle', 'name'),
+    ('ix_user_username_nocase', 'user', 'username'),
+    ('ix_user_first_name_nocase', 'user', 'first_name'),
+    ('ix_user_last_name_nocase', 'user', 'last_name'),
+]
+
+
+def upgrade():
+    for name, table, column in INDEXES:
+        op.create_index(name, table, [sa.text(f'{column} COLLATE NOCASE')], unique=False)
+
+
+def downgrade():
+    for name, table, column in INDEXES:
+        op.drop_index(name, table_name=table)
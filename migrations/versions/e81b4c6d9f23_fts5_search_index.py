@@ -0,0 +1,84 @@
+"""fts5 search index
+
+Revision ID: e81b4c6d9f23
+Revises: d3a8f5b21c47
+Create Date: 2026-10-19 16:41:09.772310
+
+"""
+import json
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81b4c6d9f23'
+down_revision = 'd3a8f5b21c47'
+branch_labels = None
+depends_on = None
+
+# rowid = id * 8 + Art (1 Projekt, 2 Verein, 3 Anbaustelle, 4 Ausgabestelle)
+SOURCES = {
+    'verein': (
+        2, 'name, city, zip_code, board_member, prev_officer',
+        "{p}name",
+        "coalesce({p}city, '') || ' ' || coalesce({p}zip_code, '') || ' ' || "
+        "coalesce({p}board_member, '') || ' ' || coalesce({p}prev_officer, '')",
+    ),
+    'anbaustelle': (
+        3, 'name, address, state',
+        "{p}name",
+        "coalesce({p}address, '') || ' ' || coalesce({p}state, '')",
+    ),
+    'ausgabestelle': (
+        4, 'name, address, state',
+        "coalesce({p}name, {p}address, '')",
+        "coalesce({p}address, '') || ' ' || coalesce({p}state, '') || ' ' || coalesce({p}name, '')",
+    ),
+}
+
+
+def upgrade():
+    op.execute(
+        "CREATE VIRTUAL TABLE search_index USING fts5("
+        "title, body, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+
+    for table, (kind, columns, title, body) in SOURCES.items():
+        values = f"(new.id * 8 + {kind}, {title.format(p='new.')}, {body.format(p='new.')})"
+        delete = f"DELETE FROM search_index WHERE rowid = old.id * 8 + {kind};"
+        insert = f"INSERT INTO search_index(rowid, title, body) VALUES {values};"
+        op.execute(f"CREATE TRIGGER search_{table}_ai AFTER INSERT ON {table} BEGIN {insert} END")
+        op.execute(f"CREATE TRIGGER search_{table}_au AFTER UPDATE OF {columns} ON {table} BEGIN {delete} {insert} END")
+        op.execute(f"CREATE TRIGGER search_{table}_ad AFTER DELETE ON {table} BEGIN {delete} END")
+
+        # Bestand übernehmen
+        op.execute(
+            f"INSERT INTO search_index(rowid, title, body) "
+            f"SELECT id * 8 + {kind}, {title.format(p='')}, {body.format(p='')} FROM {table}"
+        )
+
+    # Projekte: Name, Typ und Antworten auf Metadaten-Fragen (aus dem JSON)
+    bind = op.get_bind()
+    meta_ids = [r[0] for r in bind.execute(sa.text("SELECT id FROM immo_question WHERE is_metadata = 1"))]
+    rows = []
+    for id, csc_name, inspection_type, data_json in bind.execute(
+            sa.text("SELECT id, csc_name, inspection_type, data_json FROM inspection")):
+        try:
+            responses = json.loads(data_json or '{}').get('form_responses', {})
+        except (ValueError, AttributeError):
+            responses = {}
+        parts = [inspection_type or '']
+        for q_id in meta_ids:
+            val = responses.get(q_id)
+            values = val if isinstance(val, list) else [val]
+            parts.extend(str(v) for v in values if isinstance(v, (str, int, float)) and not isinstance(v, bool))
+        rows.append({'r': id * 8 + 1, 'title': csc_name, 'body': ' '.join(p for p in parts if p)})
+    if rows:
+        bind.execute(sa.text("INSERT INTO search_index(rowid, title, body) VALUES (:r, :title, :body)"), rows)
+
+
+def downgrade():
+    for table in SOURCES:
+        for suffix in ('ai', 'au', 'ad'):
+            op.execute(f"DROP TRIGGER IF EXISTS search_{table}_{suffix}")
+    op.execute("DROP TABLE IF EXISTS search_index")
@@ -0,0 +1,65 @@
+"""market stat snapshots
+
+Revision ID: f2a7c3e9d514
+Revises: e81b4c6d9f23
+Create Date: 2026-10-19 17:41:08.302716
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a7c3e9d514'
+down_revision = 'e81b4c6d9f23'
+branch_labels = None
+depends_on = None
+
+FIELDS = ('applied', 'approved', 'rejected', 'withdrawn',
+          'mariana_applied', 'mariana_approved', 'mariana_rejected', 'mariana_withdrawn')
+
+
+def upgrade():
+    snapshot = op.create_table('market_stat_snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('state_name', sa.String(length=50), nullable=False),
+    sa.Column('data_date', sa.Date(), nullable=False),
+    sa.Column('recorded_at', sa.DateTime(), nullable=True),
+    sa.Column('applied', sa.Integer(), nullable=True),
+    sa.Column('approved', sa.Integer(), nullable=True),
+    sa.Column('rejected', sa.Integer(), nullable=True),
+    sa.Column('withdrawn', sa.Integer(), nullable=True),
+    sa.Column('mariana_applied', sa.Integer(), nullable=True),
+    sa.Column('mariana_approved', sa.Integer(), nullable=True),
+    sa.Column('mariana_rejected', sa.Integer(), nullable=True),
+    sa.Column('mariana_withdrawn', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('market_stat_snapshot', schema=None) as batch_op:
+        batch_op.create_index('ix_market_stat_snapshot_state_date', ['state_name', 'data_date'], unique=False)
+
+    # Der aktuelle Stand ist der erste Punkt im Verlauf
+    now = datetime.utcnow()
+    rows = []
+    for row in op.get_bind().execute(sa.text(
+            f"SELECT state_name, data_date, last_scraped, {', '.join(FIELDS)} FROM market_stat "
+            f"WHERE state_name IS NOT NULL")).mappings():
+        recorded_at = row['last_scraped'] or now
+        if isinstance(recorded_at, str):
+            recorded_at = datetime.fromisoformat(recorded_at)
+        try:
+            data_date = datetime.strptime((row['data_date'] or '').strip(), '%d.%m.%Y').date()
+        except ValueError:
+            data_date = recorded_at.date()
+        rows.append(dict({f: row[f] or 0 for f in FIELDS},
+                         state_name=row['state_name'], data_date=data_date, recorded_at=recorded_at))
+    if rows:
+        op.bulk_insert(snapshot, rows)
+
+
+def downgrade():
+    with op.batch_alter_table('market_stat_snapshot', schema=None) as batch_op:
+        batch_op.drop_index('ix_market_stat_snapshot_state_date')
+
+    op.drop_table('market_stat_snapshot')
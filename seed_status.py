@@ -37,6 +37,7 @@ def seed():
                 counter += 1
 
         db.session.commit()
+        StatusDefinition.invalidate_registry()
         print(f"Fertig! {counter} Status-Einträge erstellt.")
 
 
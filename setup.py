@@ -1,6 +1,7 @@
 from app import create_app
 from app.extensions import db
 from app.models import Permission, DashboardTile, User
+from app.main.dashboard import invalidate_tiles
 from werkzeug.security import generate_password_hash
 
 app = create_app()
@@ -43,6 +44,7 @@ def seed():
             perm.icon = icon
 
         db.session.commit()
+        Permission.invalidate_flags()
 
         # ---------------------------------------------------------
         # 3. Admin User anlegen (Falls keiner existiert)
@@ -107,6 +109,7 @@ def seed():
             tile.required_permission = perm
 
         db.session.commit()
+        invalidate_tiles()
         print("✅ Fertig! Datenbank wurde befüllt und aktualisiert.")
 
 
@@ -0,0 +1,143 @@
+"""
+Gemeinsame Fixtures: App mit In-Memory-SQLite, je ein Admin und ein
+Bereichsleiter (bl_user), Login über die Session, ein Query-Zähler und ein
+lokaler HTTP-Server als Ersatz für externe Quellen.
+"""
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from sqlalchemy import event
+from config import Config
+from app import create_app
+from app.extensions import db
+from app.models import Permission, User
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        CACHE_DIR = str(tmp_path / 'cache')
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        MAIL_DEFAULT_SENDER = 'noreply@example.org'
+        # Versand nur explizit über outbox.drain() im Test
+        MAIL_OUTBOX_THREAD = False
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Permission(name='Bereichsleitung', slug='bl_user'))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _create_user(app, username, is_admin=False, permissions=()):
+    with app.app_context():
+        user = User(username=username, email=f'{username}@example.org', is_admin=is_admin)
+        user.set_password('passwort')
+        user.permissions = Permission.query.filter(Permission.slug.in_(permissions)).all()
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def admin_id(app):
+    return _create_user(app, 'admin', is_admin=True)
+
+
+@pytest.fixture
+def manager_id(app):
+    return _create_user(app, 'manager', permissions=['bl_user'])
+
+
+@pytest.fixture
+def login(client):
+    def _login(user_id):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+    return _login
+
+
+@pytest.fixture
+def count_queries(app):
+    """Zählt alle SQL-Statements innerhalb des with-Blocks."""
+    @contextmanager
+    def _count():
+        statements = []
+
+        def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', _before_cursor_execute)
+    return _count
+
+
+# --- Lokaler HTTP-Server ---
+
+class FixtureServer(ThreadingHTTPServer):
+    """
+    routes: Pfad -> Funktion(Request-Header) -> (Status, Header-Dict, Body-Bytes).
+    requests: Liste aller Anfragen als (Pfad, Header-Dict).
+    """
+    daemon_threads = True
+    # Laufende (z.B. hängende) Antworten nicht beim Beenden abwarten
+    block_on_close = False
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _FixtureHandler)
+        self.routes = {}
+        self.requests = []
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        headers = dict(self.headers)
+        self.server.requests.append((self.path, headers))
+        route = self.server.routes.get(self.path)
+        if route is None:
+            status, response_headers, body = 404, {}, b''
+        else:
+            status, response_headers, body = route(headers)
+        self.send_response(status)
+        for name, value in response_headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    server = FixtureServer()
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
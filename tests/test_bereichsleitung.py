@@ -0,0 +1,46 @@
+import pytest
+from app.extensions import db
+from app.models import Verein, Anbaustelle, Ausgabestelle, StatusDefinition, User
+
+
+def _add_vereine(app, count, manager_id):
+    """Legt Vereine inkl. Status, Anbaustelle, Abgabestellen und Bereichsleitung an."""
+    with app.app_context():
+        status = StatusDefinition.query.filter_by(context=StatusDefinition.CONTEXT_VEREIN).first()
+        if status is None:
+            status = StatusDefinition(name='Gegründet', context=StatusDefinition.CONTEXT_VEREIN, position=0)
+            db.session.add(status)
+        manager = db.session.get(User, manager_id)
+        offset = Verein.query.count()
+        for i in range(offset, offset + count):
+            anbau = Anbaustelle(name=f'Anbau {i}', state='BE', status_rel=status)
+            verein = Verein(name=f'Verein {i:03d}', state_seat='BE', status_rel=status, anbaustelle=anbau)
+            verein.managers.append(manager)
+            verein.ausgabestellen.extend([
+                Ausgabestelle(address=f'Straße {i}a', state='BE', status_rel=status),
+                Ausgabestelle(address=f'Straße {i}b', state='BE', status_rel=status),
+            ])
+            db.session.add(verein)
+        db.session.commit()
+
+
+def _overview_queries(client, count_queries):
+    client.get('/bl/')  # Prozess-Caches (Status-Registry, User ...) füllen
+    with count_queries() as statements:
+        response = client.get('/bl/')
+    assert response.status_code == 200
+    return len(statements), response.get_data(as_text=True)
+
+
+@pytest.mark.parametrize('as_admin', [True, False], ids=['admin', 'manager'])
+def test_overview_query_count_is_constant(app, client, login, count_queries, admin_id, manager_id, as_admin):
+    login(admin_id if as_admin else manager_id)
+
+    _add_vereine(app, 5, manager_id)
+    few, _ = _overview_queries(client, count_queries)
+
+    _add_vereine(app, 10, manager_id)
+    many, page = _overview_queries(client, count_queries)
+
+    assert 'Verein 014' in page
+    assert many == few
@@ -0,0 +1,131 @@
+import socket
+from datetime import datetime, timedelta
+import pytest
+from app import outbox
+from app.extensions import db, mail
+from app.models import MailOutbox
+
+controller_module = pytest.importorskip('aiosmtpd.controller')
+
+
+class Sink:
+    """SMTP-Senke: merkt sich jede Mail samt Client-Adresse (eine pro Verbindung); reject != None lehnt DATA ab."""
+
+    def __init__(self):
+        self.messages = []
+        self.reject = None
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.reject:
+            return self.reject
+        self.messages.append((session.peer, envelope.rcpt_tos, envelope.content))
+        return '250 OK'
+
+    @property
+    def connections(self):
+        return len({peer for peer, _, _ in self.messages})
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def sink(app):
+    handler = Sink()
+    controller = controller_module.Controller(handler, hostname='127.0.0.1', port=_free_port())
+    controller.start()
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=controller.port, MAIL_USE_TLS=False,
+                      MAIL_USE_SSL=False, MAIL_USERNAME=None, MAIL_PASSWORD=None,
+                      MAIL_SUPPRESS_SEND=False)
+    mail.init_app(app)
+    with app.app_context():
+        yield handler
+    controller.stop()
+
+
+def _enqueue(count):
+    return [outbox.enqueue(f'Betreff {i}', [f'user{i}@example.org'], f'Text {i}').id for i in range(count)]
+
+
+def _rows():
+    db.session.expire_all()
+    return MailOutbox.query.order_by(MailOutbox.id).all()
+
+
+def test_batch_is_sent_over_one_connection(sink):
+    _enqueue(3)
+
+    assert outbox.drain() == (3, 0)
+
+    assert len(sink.messages) == 3
+    assert sink.connections == 1
+    assert [r.status for r in _rows()] == [MailOutbox.STATUS_SENT] * 3
+    assert all(r.body is None for r in _rows())
+
+
+def test_transient_failure_is_retried_with_backoff(sink):
+    sink.reject = '451 4.3.0 Bitte später erneut versuchen'
+    _enqueue(1)
+    before = datetime.utcnow()
+
+    assert outbox.drain() == (0, 1)
+
+    row = _rows()[0]
+    assert row.status == MailOutbox.STATUS_PENDING
+    assert row.attempts == 1
+    assert '451' in row.last_error
+    assert before + outbox.backoff(1) <= row.next_attempt_at <= datetime.utcnow() + outbox.backoff(1)
+    # Noch nicht fällig -> kein neuer Versuch
+    assert outbox.drain() == (0, 0)
+
+
+def test_gives_up_after_max_attempts(app, sink):
+    app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = 2
+    sink.reject = '451 4.3.0 Bitte später erneut versuchen'
+    _enqueue(1)
+
+    outbox.drain()
+    _rows()[0].next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    outbox.drain()
+
+    row = _rows()[0]
+    assert row.status == MailOutbox.STATUS_FAILED
+    assert row.attempts == 2
+    assert row.body is None
+    assert sink.messages == []
+
+
+def test_claimed_batch_is_not_sent_twice(sink):
+    ids = _enqueue(2)
+    # Ein anderer Sender hat den Batch reserviert
+    claimed = outbox._claim(10, datetime.utcnow())
+    assert [r.id for r in claimed] == ids
+
+    assert outbox.drain() == (0, 0)
+    assert sink.messages == []
+
+    # Lease abgelaufen (Sender abgestürzt) -> genau einmal verschickt
+    for row in _rows():
+        row.locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert outbox.drain() == (2, 0)
+    assert outbox.drain() == (0, 0)
+    assert len(sink.messages) == 2
+
+
+def test_sender_prunes_at_most_once_per_interval(app):
+    old = datetime.utcnow() - timedelta(days=app.config['MAIL_OUTBOX_KEEP_DAYS'] + 1)
+    sender = outbox.OutboxSender()
+    with app.app_context():
+        db.session.add(MailOutbox(subject='alt', recipients='[]', status=MailOutbox.STATUS_SENT, created_at=old))
+        db.session.commit()
+        assert sender.prune_if_due() == 1
+
+        db.session.add(MailOutbox(subject='alt', recipients='[]', status=MailOutbox.STATUS_SENT, created_at=old))
+        db.session.commit()
+        assert sender.prune_if_due() == 0
+        assert MailOutbox.query.count() == 1
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+from app.extensions import db
+from app.models import MarketStat, MarketStatSnapshot
+from app.stats import history
+
+NOW = datetime(2026, 10, 1, 12, 0)
+
+
+def _record(app, days=0, **values):
+    with app.app_context():
+        stat = MarketStat.query.filter_by(state_name='Berlin').first() or MarketStat(state_name='Berlin')
+        for field, value in values.items():
+            setattr(stat, field, value)
+        db.session.add(stat)
+        db.session.flush()
+        count = history.record_snapshots(NOW + timedelta(days=days))
+        db.session.commit()
+        return count
+
+
+def _snapshots(app):
+    with app.app_context():
+        return [(s.data_date.isoformat(), s.applied) for s in MarketStatSnapshot.query.order_by(MarketStatSnapshot.id)]
+
+
+def test_unchanged_values_are_not_recorded_again(app):
+    assert _record(app, applied=10, data_date='30.09.2026') == 1
+    assert _record(app, days=1) == 0
+    assert _record(app, days=2, applied=12, data_date='01.10.2026') == 1
+
+    assert _snapshots(app) == [('2026-09-30', 10), ('2026-10-01', 12)]
+
+
+def test_missing_source_date_compares_values_only(app):
+    assert _record(app, applied=10, data_date=None) == 1
+    assert _record(app, days=1) == 0
+    assert _record(app, days=2, data_date='Stand: gestern') == 0
+    assert _record(app, days=3, applied=11) == 1
+
+    # Ohne Stichtag gilt der Tag der Aufnahme
+    assert _snapshots(app) == [('2026-10-01', 10), ('2026-10-04', 11)]
@@ -0,0 +1,18 @@
+from app.stats import summary
+
+
+def test_public_page_is_cached_once_regardless_of_host(app, client):
+    first = client.get('/stats/', base_url='http://stats.example.org')
+    second = client.get('/stats/', base_url='https://other.example.net')
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers['Cache-Control'].startswith('public')
+    assert first.headers['ETag'] == second.headers['ETag']
+    with app.app_context():
+        assert len(summary.get()['html']) == 1
+
+
+def test_public_page_answers_if_none_match(client):
+    etag = client.get('/stats/').headers['ETag']
+
+    assert client.get('/stats/', headers={'If-None-Match': etag}).status_code == 304
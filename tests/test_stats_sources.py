@@ -0,0 +1,229 @@
+import time
+import pytest
+import requests
+from app import settings
+from app.extensions import db
+from app.models import GERMAN_STATES, MarketStat
+from app.stats import sources
+
+STATES = [name for _, name in GERMAN_STATES]
+
+
+def _page(applied=100, table=True):
+    """Nachbau der anbauverband.de-Seite: Tabelle mit allen Ländern + Summenzeile."""
+    rows = ''.join(
+        f"<tr><td>{name}</td><td>{applied + i}</td><td>{i}</td><td>1</td><td>-</td><td>01.10.2026</td></tr>"
+        for i, name in enumerate(STATES)
+    )
+    rows += "<tr><td>Summe</td><td>1.600</td><td>0</td><td>0</td><td>0</td><td></td></tr>"
+    body = f"<table><tr><th>Land</th></tr>{rows}</table>" if table else "<p>Wartungsarbeiten</p>"
+    return f"<html><head><title>Zahlen</title></head><body><nav>Menü</nav>{body}</body></html>".encode()
+
+
+class Upstream:
+    """Anbauverband-Seite mit ETag / Last-Modified; validators=False -> 200 ohne Validatoren."""
+
+    def __init__(self, body, validators=True):
+        self.body = body
+        self.validators = validators
+        self.etag = '"v1"'
+        self.last_modified = 'Thu, 01 Oct 2026 08:00:00 GMT'
+
+    def __call__(self, headers):
+        if not self.validators:
+            return 200, {'Content-Type': 'text/html'}, self.body
+        if headers.get('If-None-Match') == self.etag:
+            return 304, {'ETag': self.etag}, b''
+        return 200, {'Content-Type': 'text/html', 'ETag': self.etag, 'Last-Modified': self.last_modified}, self.body
+
+
+@pytest.fixture
+def upstream(app, http_server, monkeypatch):
+    page = Upstream(_page())
+    http_server.routes['/zahlen/'] = page
+    http_server.routes['/sheet.csv'] = lambda headers: (200, {'Content-Type': 'text/csv'}, b'a,b\n1,2\n')
+    monkeypatch.setattr(sources, 'URL_SOURCE', http_server.url('/zahlen/'))
+    monkeypatch.setattr(sources, '_sheet', sources.SheetCache(http_server.url('/sheet.csv')))
+    with app.app_context():
+        for state in STATES:
+            db.session.add(MarketStat(state_name=state))
+        db.session.commit()
+        yield page
+
+
+def _source_requests(http_server):
+    return [headers for path, headers in http_server.requests if path == '/zahlen/']
+
+
+def _spy(monkeypatch, name):
+    calls = []
+    original = getattr(sources, name)
+
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+    monkeypatch.setattr(sources, name, wrapper)
+    return calls
+
+
+def test_sends_validators_of_the_last_response(upstream, http_server):
+    sources.refresh_all()
+    sources.refresh_all()
+
+    first, second = _source_requests(http_server)
+    assert 'If-None-Match' not in first
+    assert second['If-None-Match'] == upstream.etag
+    assert second['If-Modified-Since'] == upstream.last_modified
+
+
+def test_not_modified_skips_parse_and_upsert(upstream, monkeypatch):
+    assert sources.refresh_all().status == sources.RESULT_UPDATED
+    parsed, upserted = _spy(monkeypatch, 'parse'), _spy(monkeypatch, 'upsert')
+
+    result = sources.refresh_all()
+
+    assert result.status == sources.RESULT_NOT_MODIFIED
+    assert result.errors == {}
+    assert parsed == [] and upserted == []
+
+
+def test_same_body_without_validators_is_not_parsed(upstream, monkeypatch):
+    upstream.validators = False
+    assert sources.refresh_all().status == sources.RESULT_UPDATED
+    parsed, upserted = _spy(monkeypatch, 'parse'), _spy(monkeypatch, 'upsert')
+
+    result = sources.refresh_all()
+
+    assert result.status == sources.RESULT_UNCHANGED
+    assert parsed == [] and upserted == []
+
+
+def test_changed_body_upserts_all_states_in_one_statement(upstream, count_queries):
+    sources.refresh_all()
+    upstream.body = _page(applied=500)
+    upstream.etag = '"v2"'
+
+    with count_queries() as statements:
+        result = sources.refresh_all()
+
+    assert result.status == sources.RESULT_UPDATED
+    assert result.count == len(STATES)
+    upserts = [s for s in statements if s.startswith('INSERT INTO market_stat ')]
+    assert len(upserts) == 1
+    db.session.expire_all()
+    assert {s.state_name: s.applied for s in MarketStat.query} == {name: 500 + i for i, name in enumerate(STATES)}
+    assert settings.get(sources.SETTING_ETAG) == '"v2"'
+
+
+def test_page_without_table_reports_error(upstream):
+    upstream.body = _page(table=False)
+
+    result = sources.refresh_all()
+
+    assert 'Keine Tabelle' in result.errors[sources.SOURCE_ANBAUVERBAND]
+    assert result.status is None
+    assert all(s.applied == 0 for s in MarketStat.query)
+    # Ohne gespeicherte Daten kein Validator - sonst käme beim nächsten Mal ein 304
+    assert not settings.get(sources.SETTING_ETAG)
+
+
+# --- Mariana Sheet (SheetCache) ---
+
+class Sheet:
+    """CSV-Export des Sheets mit ETag; delay hält die Antwort zurück, status != 200 simuliert Ausfälle."""
+
+    def __init__(self, body=b'a,b\n1,2\n', etag='"s1"'):
+        self.body = body
+        self.etag = etag
+        self.status = 200
+        self.delay = 0
+
+    def __call__(self, headers):
+        time.sleep(self.delay)
+        if self.status != 200:
+            return self.status, {}, b''
+        if headers.get('If-None-Match') == self.etag:
+            return 304, {'ETag': self.etag}, b''
+        return 200, {'Content-Type': 'text/csv', 'ETag': self.etag}, self.body
+
+
+@pytest.fixture
+def sheet(http_server, monkeypatch):
+    monkeypatch.setattr(sources, 'SHEET_FIRST_WAIT', 0.5)
+    upstream = Sheet()
+    http_server.routes['/sheet.csv'] = upstream
+    return upstream, sources.SheetCache(http_server.url('/sheet.csv'))
+
+
+def _sheet_requests(http_server):
+    return [headers for path, headers in http_server.requests if path == '/sheet.csv']
+
+
+def test_first_get_is_loaded_by_the_refresher(sheet):
+    upstream, cache = sheet
+
+    entry = cache.get(ttl=300)
+
+    assert entry.grid == [['a', 'b'], ['1', '2']]
+    assert entry.etag == upstream.etag
+    assert cache._thread.is_alive()
+    # Weitere Aufrufe kommen aus dem Speicher
+    assert cache.get(ttl=300) is entry
+
+
+def test_not_modified_keeps_the_parsed_grid(sheet, http_server):
+    upstream, cache = sheet
+    first = cache.get(ttl=300)
+
+    refreshed = cache.refresh()
+
+    assert _sheet_requests(http_server)[-1]['If-None-Match'] == upstream.etag
+    assert refreshed.grid is first.grid
+    assert refreshed.fetched_at >= first.fetched_at
+
+
+def test_changed_sheet_replaces_the_grid(sheet):
+    upstream, cache = sheet
+    cache.get(ttl=300)
+    upstream.body, upstream.etag = b'a,b\n3,4\n', '"s2"'
+
+    cache.refresh()
+
+    entry = cache.get(ttl=300)
+    assert entry.grid == [['a', 'b'], ['3', '4']]
+    assert entry.etag == '"s2"'
+
+
+def test_slow_sheet_does_not_block_requests(sheet):
+    upstream, cache = sheet
+    upstream.delay = 3
+
+    started = time.monotonic()
+    with pytest.raises(sources.SheetUnavailable, match='wird noch geladen'):
+        cache.get(ttl=300)
+    assert time.monotonic() - started < 1
+
+
+def test_failed_first_fetch_is_reported_without_refetching(sheet, http_server):
+    upstream, cache = sheet
+    upstream.status = 404
+
+    with pytest.raises(sources.SheetUnavailable, match='nicht erreichbar'):
+        cache.get(ttl=300)
+    started = time.monotonic()
+    with pytest.raises(sources.SheetUnavailable, match='nicht erreichbar'):
+        cache.get(ttl=300)
+
+    assert time.monotonic() - started < 0.1
+    assert len(_sheet_requests(http_server)) == 1
+
+
+def test_failed_refresh_keeps_the_last_grid(sheet):
+    upstream, cache = sheet
+    entry = cache.get(ttl=300)
+    upstream.status = 404
+
+    with pytest.raises(requests.HTTPError):
+        cache.refresh()
+
+    assert cache.get(ttl=300) is entry